@@ -0,0 +1,43 @@
+import sys
+import time
+
+from array import array
+from pathlib import Path
+
+from cpuemulator.blockjit import BlockJIT
+from cpuemulator.hackcpu import HackCPU
+from hackassembler.assembler import assemble, read_instructions, to_words
+
+PONG_PATH: Path = Path(__file__).resolve().parent.parent / "projects" / "06" / "pong" / "Pong.asm"
+
+
+def measure(name: str, cpu: HackCPU, cycles: int) -> float:
+    """
+    Runs cpu for the given number of cycles and prints its instructions per second.
+    :return: instructions per second
+    """
+    start: float = time.perf_counter()
+    executed: int = cpu.run(cycles)
+    run_time: float = time.perf_counter() - start
+    speed: float = executed / run_time
+    print(f"{name}: executed {executed} instructions in {run_time:.2f} s: {speed:,.0f} instructions per second")
+    return speed
+
+
+def main():
+    cycles: int = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    rom: array = to_words(assemble(read_instructions(PONG_PATH)))
+
+    start: float = time.perf_counter()
+    cpu: HackCPU = HackCPU(rom)
+    decode_time: float = time.perf_counter() - start
+    print(f"Pong: {len(rom)} instructions decoded in {decode_time * 1000:.1f} ms")
+
+    interpreter_speed: float = measure("interpreter", cpu, cycles)
+    jit: BlockJIT = BlockJIT(rom)
+    jit_speed: float = measure("block JIT  ", jit, cycles)
+    print(f"block JIT speedup: {jit_speed / interpreter_speed:.1f}x, {sum(block is not None for block in jit.blocks)} blocks compiled")
+
+
+if __name__ == "__main__":
+    main()
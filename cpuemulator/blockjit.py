@@ -0,0 +1,153 @@
+from array import array
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from cpuemulator.hackcpu import HackCPU, COMP_MNEMONICS, DEST_A, DEST_D, DEST_M
+
+# Python condition on the masked comp result o for every jump field
+JUMP_CONDITIONS: Dict[int, str] = {
+    1: "0 < o < 32768",
+    2: "o == 0",
+    3: "o < 32768",
+    4: "o >= 32768",
+    5: "o != 0",
+    6: "o == 0 or o >= 32768",
+    7: "True",
+}
+
+# Longest straight-line run compiled into a single block
+MAX_BLOCK_LENGTH: int = 256
+
+# (block(ram, a, d) -> (pc, a, d), number of instructions). A block that reaches the halting loop returns ~pc.
+Block = Tuple[Callable[[array, int, int], Tuple[int, int, int]], int]
+
+
+class BlockJIT(HackCPU):
+    """
+    Hack CPU that executes basic blocks instead of single instructions.
+
+    A block starts at a jump target (or right after a jump) and runs up to and including the next jump.
+    On first entry it is translated to Python source, compile()d and cached by its start address in a ROM sized list,
+    so straight-line code runs as one Python frame. While translating, the value of A is tracked
+    through @constants: M accesses after them index RAM with a literal address, and A itself is
+    only assigned when the block returns.
+    """
+
+    def __init__(self, rom: array):
+        super().__init__(rom)
+        self.blocks: List[Optional[Block]] = [None] * len(rom)
+        self.leaders: Set[int] = self._find_leaders()
+
+    def run(self, max_cycles: int) -> int:
+        """
+        Executes whole blocks while they fit into max_cycles, then finishes the budget one instruction at a time.
+        :param max_cycles: cycle budget for this call
+        :return: number of cycles executed
+        """
+        ram: array = self.ram
+        blocks: List[Optional[Block]] = self.blocks
+        rom_size: int = len(self.rom)
+
+        a: int = self.a
+        d: int = self.d
+        pc: int = self.pc
+        cycles: int = 0
+        while pc < rom_size:
+            block: Optional[Block] = blocks[pc]
+            if block is None:
+                block = self._compile_block(pc)
+            function, length = block
+            if cycles + length > max_cycles:
+                break
+            pc, a, d = function(ram, a, d)
+            cycles += length
+            if pc < 0:
+                pc = ~pc
+                self.halted = True
+                break
+
+        self.a = a
+        self.d = d
+        self.pc = pc
+        self.cycles += cycles
+        if not self.halted and cycles < max_cycles and pc < rom_size:
+            cycles += HackCPU.run(self, max_cycles - cycles)
+        return cycles
+
+    def _find_leaders(self) -> Set[int]:
+        """
+        Addresses where a block has to start: 0, every instruction following a jump,
+        and the value of every A-instruction that directly precedes a jump.
+        """
+        rom: array = self.rom
+        leaders: Set[int] = {0}
+        for pc in range(len(rom)):
+            if self.jump[pc] and rom[pc] >= 0x8000:
+                leaders.add(pc + 1)
+                if pc > 0 and rom[pc - 1] < 0x8000:
+                    leaders.add(rom[pc - 1])
+        return leaders
+
+    def _compile_block(self, start: int) -> Block:
+        rom: array = self.rom
+        rom_size: int = len(rom)
+
+        lines: List[str] = ["def block(ram, a, d):"]
+        known_a: Optional[int] = None
+        next_pc: int = start
+        while next_pc < rom_size and next_pc - start < MAX_BLOCK_LENGTH:
+            if next_pc != start and next_pc in self.leaders:
+                break
+            pc: int = next_pc
+            next_pc += 1
+            word: int = rom[pc]
+            if word < 0x8000:
+                # A is only materialised when the block returns
+                known_a = word
+                continue
+
+            address: str = str(known_a) if known_a is not None else "a & 0x7FFF"
+            mnemonic: str = COMP_MNEMONICS[self.comp[pc]]
+            expression: str = (mnemonic.replace("D", "d")
+                               .replace("A", str(known_a) if known_a is not None else "a")
+                               .replace("M", f"ram[{address}]")
+                               .replace("!", "~"))
+            if len(mnemonic) > 1:
+                expression = f"({expression}) & 0xFFFF"
+            elif mnemonic == "1" or mnemonic == "0":
+                expression = mnemonic
+
+            destination: int = self.dest[pc]
+            condition: int = self.jump[pc]
+            # the jump target is the value A had before this instruction wrote to it
+            target: str = str(known_a) if known_a is not None else "t"
+            lines.append(f"    o = {expression}")
+            if condition and known_a is None:
+                lines.append("    t = a")
+            if destination & DEST_M:
+                lines.append(f"    ram[{address}] = o")
+            if destination & DEST_D:
+                lines.append("    d = o")
+            if destination & DEST_A:
+                lines.append("    a = o")
+                known_a = None
+            if condition == 7 and pc > 0 and rom[pc - 1] == pc - 1:
+                # the halting loop of HackCPU.run, an unconditional jump to the @n right before it at address n:
+                # pc stays on the jump, like in the interpreter
+                result: str = f"{~pc}, {known_a if known_a is not None else 'a'}, d"
+                if target == str(pc - 1):
+                    lines.append(f"    return {result}")
+                    break
+                if target == "t":
+                    lines.append(f"    if t == {pc - 1}:")
+                    lines.append(f"        return {result}")
+            if condition:
+                lines.append(f"    if {JUMP_CONDITIONS[condition]}:")
+                lines.append(f"        return {target}, {known_a if known_a is not None else 'a'}, d")
+                break
+
+        lines.append(f"    return {next_pc}, {known_a if known_a is not None else 'a'}, d")
+        namespace: Dict[str, Callable] = {}
+        exec(compile("\n".join(lines), f"<hack block {start}>", "exec"), namespace)
+        block: Block = (namespace["block"], next_pc - start)
+        self.blocks[start] = block
+        return block
@@ -0,0 +1,51 @@
+import argparse
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cpuemulator.blockjit import BlockJIT
+from cpuemulator.hackcpu import HackCPU, load_rom
+from hackassembler.assembler import LABEL, VARIABLE, Symbol, load_symbols
+
+
+def describe_address(symbols: Dict[str, Symbol], pc: int) -> str:
+    """
+    :return: str pc as the closest label at or before it, e.g. LOOP+2, empty without one
+    """
+    labels: List[Tuple[int, str]] = [(symbol.address, name) for name, symbol in symbols.items()
+                           if symbol.kind == LABEL and symbol.address <= pc]
+    if not labels:
+        return ""
+    address, name = max(labels)
+    return name if address == pc else f"{name}+{pc - address}"
+
+
+def cpu_emulator():
+    argument_parser = argparse.ArgumentParser(description="Runs a Hack program headless")
+    argument_parser.add_argument("path", help="program in .hack, .bin or .npy format")
+    argument_parser.add_argument("--cycles", type=int, default=10_000_000, help="cycle budget")
+    argument_parser.add_argument("--ram", type=int, default=16, help="number of RAM words to print after the run")
+    argument_parser.add_argument("--jit", action="store_true", help="execute compiled basic blocks")
+    argument_parser.add_argument("--symbols", default=None,
+                                 help=".sym file of the assembler, defaults to the one next to the program")
+    arguments = argument_parser.parse_args()
+    path: Path = Path(arguments.path)
+    symbols_path: Path = Path(arguments.symbols) if arguments.symbols else path.with_suffix(".sym")
+    symbols: Optional[Dict[str, Symbol]] = load_symbols(symbols_path) if symbols_path.is_file() else None
+
+    cpu_class = BlockJIT if arguments.jit else HackCPU
+    cpu: HackCPU = cpu_class(load_rom(path))
+    cpu.run(arguments.cycles)
+
+    label: str = describe_address(symbols, cpu.pc) if symbols else ""
+    print(f"cycles: {cpu.cycles} pc: {cpu.pc}{f' ({label})' if label else ''} halted: {cpu.halted}")
+    for address in range(arguments.ram):
+        print(f"RAM[{address}] = {cpu.ram[address]}")
+    if symbols:
+        for name, symbol in symbols.items():
+            if symbol.kind == VARIABLE:
+                print(f"{name} = RAM[{symbol.address}] = {cpu.ram[symbol.address]}")
+
+
+if __name__ == "__main__":
+    cpu_emulator()
@@ -0,0 +1,188 @@
+import sys
+
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from hackassembler.assembler import COMP_TABLE
+
+RAM_SIZE: int = 32768
+SCREEN: int = 16384
+SCREEN_WORDS: int = 8192
+SCREEN_WORDS_PER_ROW: int = 32
+KBD: int = 24576
+
+# Python expression for every comp mnemonic, e.g. "D+M" -> "d+m", "!A" -> "~a".
+COMP_EXPRESSIONS: Dict[str, str] = {
+    mnemonic: mnemonic.replace("D", "d").replace("A", "a").replace("M", "m").replace("!", "~")
+    for mnemonic in COMP_TABLE
+}
+
+# Handler index of every 7 bit comp field (a c1 c2 c3 c4 c5 c6), in COMP_TABLE order.
+COMP_MNEMONICS: List[str] = list(COMP_TABLE)
+COMP_INDEX: Dict[int, int] = {int(bits, 2): index for index, bits in enumerate(COMP_TABLE.values())}
+
+# handler(d, a, m) -> unmasked result of the comp field
+COMP_HANDLERS: List[Callable[[int, int, int], int]] = [
+    eval(f"lambda d, a, m: {COMP_EXPRESSIONS[mnemonic]}") for mnemonic in COMP_MNEMONICS
+]
+
+DEST_M: int = 1
+DEST_D: int = 2
+DEST_A: int = 4
+
+JUMP_GT: int = 1
+JUMP_EQ: int = 2
+JUMP_LT: int = 4
+
+
+def load_rom(path: Path) -> array:
+    """
+    Reads a Hack program into an array of unsigned 16 bit words.
+    Accepts the .hack text format as well as the .bin and .npy images written by the assembler.
+    :param path: Path
+    :return: array of typecode 'H'
+    """
+    if path.suffix == ".hack":
+        with open(path, "r") as hack_file:
+            return array("H", [int(line, 2) for line in hack_file.read().split()])
+
+    data: bytes = path.read_bytes()
+    if path.suffix == ".npy":
+        header_length: int = int.from_bytes(data[8:10], "little")
+        data = data[10 + header_length:]
+    elif path.suffix != ".bin":
+        raise Exception(f"unsupported ROM format | {path.suffix}")
+
+    words: array = array("H")
+    words.frombytes(data)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words
+
+
+class HackCPU:
+    """
+    Hack computer with the ROM decoded once into handler tables.
+
+    Every C-instruction is split into a comp handler index, a dest mask and a jump mask at load time,
+    so the run loop only indexes arrays and never looks at instruction bits.
+    """
+    rom: array
+    ram: array
+
+    def __init__(self, rom: array):
+        self.rom = rom
+        self.ram = array("H", bytes(2 * RAM_SIZE))
+        self.comp = array("H", bytes(2 * len(rom)))
+        self.dest = array("H", bytes(2 * len(rom)))
+        self.jump = array("H", bytes(2 * len(rom)))
+        self.reads_m = array("H", bytes(2 * len(rom)))
+        self._decode()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Resets the registers and the cycle counter. RAM is left untouched, as on the real machine.
+        :return: None
+        """
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def run(self, max_cycles: int) -> int:
+        """
+        Executes instructions until max_cycles have run, the program counter leaves the ROM,
+        or the program reaches the conventional halting loop (@n, 0;JMP at address n).
+        :param max_cycles: cycle budget for this call
+        :return: number of cycles executed
+        """
+        rom: array = self.rom
+        ram: array = self.ram
+        comp: array = self.comp
+        dest: array = self.dest
+        jump: array = self.jump
+        reads_m: array = self.reads_m
+        handlers: List[Callable[[int, int, int], int]] = COMP_HANDLERS
+        rom_size: int = len(rom)
+
+        a: int = self.a
+        d: int = self.d
+        pc: int = self.pc
+        cycles: int = 0
+        while cycles < max_cycles and pc < rom_size:
+            cycles += 1
+            word: int = rom[pc]
+            if word < 0x8000:
+                a = word
+                pc += 1
+                continue
+
+            out: int = handlers[comp[pc]](d, a, ram[a & 0x7FFF] if reads_m[pc] else 0) & 0xFFFF
+            target: int = a
+            destination: int = dest[pc]
+            if destination:
+                if destination & DEST_M:
+                    ram[a & 0x7FFF] = out
+                if destination & DEST_D:
+                    d = out
+                if destination & DEST_A:
+                    a = out
+
+            condition: int = jump[pc]
+            if condition and condition & (JUMP_EQ if out == 0 else JUMP_GT if out < 0x8000 else JUMP_LT):
+                if target == pc - 1 and rom[target] == target and condition == 7:
+                    self.halted = True
+                    break
+                pc = target
+            else:
+                pc += 1
+
+        self.a = a
+        self.d = d
+        self.pc = pc
+        self.cycles += cycles
+        return cycles
+
+    def set_key(self, key_code: int) -> None:
+        """
+        Simulates holding down a key; 0 means no key is pressed.
+        :param key_code: Hack character set code
+        :return: None
+        """
+        self.ram[KBD] = key_code
+
+    def screen(self) -> memoryview:
+        """
+        Returns the 8K word screen memory map without copying it.
+        :return: memoryview over RAM[SCREEN:KBD]
+        """
+        return memoryview(self.ram)[SCREEN:SCREEN + SCREEN_WORDS]
+
+    def screen_rows(self) -> List[str]:
+        """
+        Renders the headless screen as 256 rows of 512 characters, '#' for a black pixel.
+        :return: List[str]
+        """
+        rows: List[str] = []
+        screen: memoryview = self.screen()
+        for row in range(SCREEN_WORDS // SCREEN_WORDS_PER_ROW):
+            words = screen[row * SCREEN_WORDS_PER_ROW:(row + 1) * SCREEN_WORDS_PER_ROW]
+            # pixel 0 of each word is its least significant bit
+            rows.append("".join(format(word, "016b")[::-1] for word in words).replace("0", " ").replace("1", "#"))
+        return rows
+
+    def _decode(self) -> None:
+        for pc, word in enumerate(self.rom):
+            if word < 0x8000:
+                continue
+            comp_bits: int = (word >> 6) & 0x7F
+            index: Optional[int] = COMP_INDEX.get(comp_bits)
+            if index is None:
+                raise Exception(f"invalid comp field at ROM[{pc}] | {word:016b}")
+            self.comp[pc] = index
+            self.dest[pc] = (word >> 3) & 0x7
+            self.jump[pc] = word & 0x7
+            self.reads_m[pc] = comp_bits >> 6
@@ -0,0 +1,5 @@
+from pathlib import Path
+
+# The assembler is a course project in projects/06/Assembler. Its modules are the submodules of this package,
+# e.g. hackassembler.assembler, so the rest of the toolchain imports them without touching sys.path.
+__path__ = [str(Path(__file__).resolve().parent.parent / "projects" / "06" / "Assembler")]
@@ -0,0 +1,145 @@
+import random
+import time
+
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from hdlsimulator.netlist import Netlist, build_netlist
+from hdlsimulator.simulator import ChipSimulator, exhaustive_slices, from_slices, to_slices
+
+PROJECTS_PATH: Path = Path(__file__).resolve().parent.parent / "projects"
+
+# Our own chips of projects/01 and 02, so everything is flattened down to Nand gates
+SEARCH_PATH: List[Path] = [PROJECTS_PATH / "01", PROJECTS_PATH / "02"]
+
+ALU_CONTROLS: List[str] = ["zx", "nx", "zy", "ny", "f", "no"]
+
+
+def reference_alu(x: int, y: int, control: int) -> int:
+    """
+    The ALU on unsigned 16 bit words, control holds zx..no from its most to its least significant bit
+    """
+    zx, nx, zy, ny, f, no = ((control >> (5 - i)) & 1 for i in range(6))
+    x = (0 if zx else x) ^ (0xFFFF if nx else 0)
+    y = (0 if zy else y) ^ (0xFFFF if ny else 0)
+    out: int = ((x + y) if f else (x & y)) & 0xFFFF
+    return out ^ (0xFFFF if no else 0)
+
+
+def run(netlist: Netlist, vectors: Dict[str, List[int]]) -> Tuple[Dict[str, List[int]], float, float]:
+    """
+    Runs simulate with separate timings of the evaluation and of the conversion from and to bit slices
+    :return: (output values, evaluation time, total time)
+    """
+    count: int = len(next(iter(vectors.values())))
+    start: float = time.perf_counter()
+    slices: Dict[str, List[int]] = {name: to_slices(vectors[name], len(wires))
+                                    for name, wires in netlist.inputs.items()}
+    evaluate_start: float = time.perf_counter()
+    output_slices: Dict[str, List[int]] = netlist.evaluate(slices, count)
+    evaluate_time: float = time.perf_counter() - evaluate_start
+    outputs: Dict[str, List[int]] = {name: from_slices(bits, count) for name, bits in output_slices.items()}
+    return outputs, evaluate_time, time.perf_counter() - start
+
+
+def check_alu(pairs: int) -> None:
+    """
+    Evaluates the ALU for all 64 control combinations on pairs random x and y at once
+    """
+    rng: random.Random = random.Random(0)
+    start: float = time.perf_counter()
+    netlist: Netlist = build_netlist(PROJECTS_PATH / "02" / "ALU.hdl", SEARCH_PATH)
+    build_time: float = time.perf_counter() - start
+
+    xs: List[int] = [0, 0xFFFF, 0x7FFF, 0x8000] + [rng.randrange(0x10000) for _ in range(pairs - 4)]
+    ys: List[int] = [0xFFFF, 0, 0x8000, 0x7FFF] + [rng.randrange(0x10000) for _ in range(pairs - 4)]
+    vectors: Dict[str, List[int]] = {"x": xs * 64, "y": ys * 64}
+    for i, name in enumerate(ALU_CONTROLS):
+        vectors[name] = [(control >> (5 - i)) & 1 for control in range(64) for _ in range(pairs)]
+    outputs, evaluate_time, run_time = run(netlist, vectors)
+
+    for k in range(64 * pairs):
+        out: int = reference_alu(xs[k % pairs], ys[k % pairs], k // pairs)
+        if (outputs["out"][k], outputs["zr"][k], outputs["ng"][k]) != (out, int(out == 0), out >> 15):
+            raise Exception(f"ALU differs from the reference | control {k // pairs:06b} x {xs[k % pairs]} "
+                            f"y {ys[k % pairs]}")
+    print(f"ALU: {len(netlist.gates)} gates flattened in {build_time * 1000:.1f} ms, {64 * pairs} vectors "
+          f"evaluated in {evaluate_time * 1000:.1f} ms, "
+          f"{run_time * 1000:.1f} ms with the conversion from and to bit slices")
+
+
+def check_mux8way16(words: int) -> None:
+    """
+    Evaluates Mux8Way16 for every select on words random sets of inputs at once
+    """
+    rng: random.Random = random.Random(1)
+    start: float = time.perf_counter()
+    netlist: Netlist = build_netlist(PROJECTS_PATH / "01" / "Mux8Way16.hdl", SEARCH_PATH)
+    build_time: float = time.perf_counter() - start
+
+    buses: str = "abcdefgh"
+    vectors: Dict[str, List[int]] = {name: [rng.randrange(0x10000) for _ in range(8 * words)] for name in buses}
+    vectors["sel"] = [k // words for k in range(8 * words)]
+    outputs, evaluate_time, run_time = run(netlist, vectors)
+
+    for k in range(8 * words):
+        if outputs["out"][k] != vectors[buses[vectors["sel"][k]]][k]:
+            raise Exception(f"Mux8Way16 selects the wrong input | vector {k}")
+    print(f"Mux8Way16: {len(netlist.gates)} gates flattened in {build_time * 1000:.1f} ms, {8 * words} vectors "
+          f"evaluated in {evaluate_time * 1000:.1f} ms, "
+          f"{run_time * 1000:.1f} ms with the conversion from and to bit slices")
+
+
+def check_exhaustive(chip: str, project: str) -> None:
+    """
+    Evaluates every input combination of a chip, without converting vectors to bit slices
+    """
+    netlist: Netlist = build_netlist(PROJECTS_PATH / project / f"{chip}.hdl", SEARCH_PATH)
+    count: int = 1 << sum(len(wires) for wires in netlist.inputs.values())
+    start: float = time.perf_counter()
+    netlist.evaluate(exhaustive_slices(netlist), count)
+    print(f"{chip}: all {count} input combinations evaluated in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def check_ram16k(cycles: int) -> None:
+    """
+    Writes random words to random addresses of RAM16K of projects/03, down to its DFFs, and reads them back.
+    The chip is recognized as one memory, so every cycle is one call of the compiled netlist per tick and tock.
+    """
+    rng: random.Random = random.Random(2)
+    start: float = time.perf_counter()
+    netlist: Netlist = build_netlist(PROJECTS_PATH / "03" / "b" / "RAM16K.hdl", [PROJECTS_PATH / "03" / "a"])
+    chip: ChipSimulator = ChipSimulator(netlist)
+    build_time: float = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected: Dict[int, int] = {}
+    chip.set("load", 1)
+    for _ in range(cycles):
+        address, value = rng.randrange(0x4000), rng.randrange(0x10000)
+        chip.set("address", address)
+        chip.set("in", value)
+        chip.tick()
+        chip.tock()
+        expected[address] = value
+    chip.set("load", 0)
+    for address, value in expected.items():
+        chip.set("address", address)
+        chip.eval()
+        if chip.get("out") != value:
+            raise Exception(f"RAM16K does not read back what was written | address {address}")
+    print(f"RAM16K: {len(netlist.memories)} memory and {len(netlist.gates)} gates built in {build_time * 1000:.1f} ms, "
+          f"{cycles} writes and {len(expected)} reads in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def main():
+    check_alu(1024)
+    check_mux8way16(1024)
+    check_exhaustive("DMux8Way", "01")
+    check_exhaustive("Or8Way", "01")
+    check_exhaustive("Inc16", "02")
+    check_ram16k(10000)
+
+
+if __name__ == "__main__":
+    main()
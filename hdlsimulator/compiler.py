@@ -0,0 +1,84 @@
+from array import array
+from typing import Callable, Dict, List, Sequence, Set, Tuple
+
+from hdlsimulator.netlist import Netlist
+from hdlsimulator.primitives import AND, FALSE, MUX, NAND, NOT, OR, TRUE, XOR, Memory
+
+# (output pin values, (load, address, data_in) of every memory) = evaluate(input pin values, words of every memory)
+Evaluator = Callable[[Sequence[int], Sequence[array]], Tuple[Tuple[int, ...], Tuple[Tuple[int, int, int], ...]]]
+
+# Python expression of every gate on single bits
+EXPRESSIONS: Dict[int, str] = {
+    NAND: "1 ^ ({a} & {b})",
+    AND: "{a} & {b}",
+    OR: "{a} | {b}",
+    XOR: "{a} ^ {b}",
+    NOT: "1 ^ {a}",
+    MUX: "{b} if {s} else {a}",
+}
+
+
+def operand(wire: int) -> str:
+    return "0" if wire == FALSE else "1" if wire == TRUE else f"w{wire}"
+
+
+def word(wires: List[int]) -> str:
+    """
+    :return: str expression of the value of a bus, least significant wire first
+    """
+    terms: List[str] = [operand(wire) if bit == 0 else f"{operand(wire)} << {bit}"
+                        for bit, wire in enumerate(wires) if wire != FALSE]
+    return " | ".join(terms) or "0"
+
+
+def generate_source(netlist: Netlist) -> str:
+    """
+    Writes the netlist as one Python function of straight-line code in the order of its schedule, one local
+    variable per wire. The function reads every input pin bit, every gate and every memory read once, and returns
+    the output pins and what every memory would write at the next clock.
+    :param netlist: Netlist
+    :return: str source of def evaluate(pins, memories), see Evaluator
+    """
+    used: Set[int] = {wire for bits in netlist.outputs.values() for wire in bits}
+    for node in netlist.schedule:
+        if isinstance(node, Memory):
+            used.update(node.data_in + node.address + [node.load])
+        else:
+            op, out, a, b, s = node
+            used.update((a,) if op == NOT else (a, b, s) if op == MUX else (a, b))
+
+    lines: List[str] = ["def evaluate(pins, memories):"]
+    if netlist.inputs:
+        lines.append(f"    {''.join(f'p{index}, ' for index in range(len(netlist.inputs)))}= pins")
+    if netlist.memories:
+        lines.append(f"    {''.join(f'm{index}, ' for index in range(len(netlist.memories)))}= memories")
+    for index, bits in enumerate(netlist.inputs.values()):
+        lines += [f"    w{wire} = p{index} >> {bit} & 1" for bit, wire in enumerate(bits) if wire in used]
+
+    numbers: Dict[int, int] = {id(memory): index for index, memory in enumerate(netlist.memories)}
+    for node in netlist.schedule:
+        if isinstance(node, Memory):
+            bits: List[Tuple[int, int]] = [(bit, wire) for bit, wire in enumerate(node.out) if wire in used]
+            if bits:
+                lines.append(f"    r = m{numbers[id(node)]}[{word(node.address)}]")
+                lines += [f"    w{wire} = r >> {bit} & 1" for bit, wire in bits]
+        else:
+            op, out, a, b, s = node
+            expression: str = EXPRESSIONS[op].format(a=operand(a), b=operand(b), s=operand(s))
+            lines.append(f"    w{out} = {expression}")
+
+    outputs: str = "".join(f"{word(bits)}, " for bits in netlist.outputs.values())
+    writes: str = "".join(f"({operand(memory.load)}, {word(memory.address)}, {word(memory.data_in)}), "
+                          if memory.load != FALSE else "(0, 0, 0), " for memory in netlist.memories)
+    lines.append(f"    return ({outputs}), ({writes})")
+    return "\n".join(lines) + "\n"
+
+
+def compile_netlist(netlist: Netlist) -> Evaluator:
+    """
+    :param netlist: Netlist
+    :return: Evaluator compiled from generate_source
+    """
+    namespace: Dict[str, Evaluator] = {}
+    exec(compile(generate_source(netlist), f"<netlist {netlist.name}>", "exec"), namespace)
+    return namespace["evaluate"]
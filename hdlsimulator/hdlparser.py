@@ -0,0 +1,213 @@
+import re
+
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# One alternative per token kind, comments and whitespace are dropped by the scanner
+TOKEN_PATTERN: re.Pattern = re.compile(r"""
+    (?P<newline>\n)
+    |(?P<space>[ \t\r\f\v]+)
+    |(?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<number>\d+)
+    |(?P<word>[A-Za-z_][A-Za-z0-9_.]*)
+    |(?P<symbol>\.\.|[{}()\[\];,=:])
+    |(?P<error>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Names of the constant buses, which are as wide as the pin they are connected to
+CONSTANTS: Tuple[str, str] = ("false", "true")
+
+# (name, first bit, last bit) of one side of a connection; the bits are None for the whole pin
+PinReference = Tuple[str, Optional[int], Optional[int]]
+
+
+class Connection:
+    """
+    One pin=bus assignment of a part, e.g. out[0..7]=low
+    """
+    __slots__ = ("pin", "bus")
+    pin: PinReference
+    bus: PinReference
+
+    def __init__(self, pin: PinReference, bus: PinReference):
+        self.pin = pin
+        self.bus = bus
+
+
+class Part:
+    """
+    One chip used in the PARTS section of another, with its connections in source order
+    """
+    __slots__ = ("chip", "connections", "line")
+    chip: str
+    connections: List[Connection]
+    line: int
+
+    def __init__(self, chip: str, connections: List[Connection], line: int):
+        self.chip = chip
+        self.connections = connections
+        self.line = line
+
+
+class ChipDefinition:
+    """
+    A parsed .hdl file. A chip either has parts or is builtin, then clocked lists its clocked input pins.
+    inputs and outputs map the pin names to their widths in declaration order.
+    """
+    name: str
+    inputs: Dict[str, int]
+    outputs: Dict[str, int]
+    parts: List[Part]
+    builtin: Optional[str]
+    clocked: List[str]
+    path: Optional[Path]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.inputs = {}
+        self.outputs = {}
+        self.parts = []
+        self.builtin = None
+        self.clocked = []
+        self.path = None
+
+
+def scan(source: str) -> Iterator[Tuple[str, str, int]]:
+    """
+    Yields the (kind, text, line) of every token of an .hdl source
+    :param source: str
+    :return: Iterator[Tuple[str, str, int]]
+    """
+    line: int = 1
+    for match in TOKEN_PATTERN.finditer(source):
+        kind: str = match.lastgroup
+        if kind == "newline":
+            line += 1
+        elif kind == "comment":
+            line += match.group().count("\n")
+        elif kind == "error":
+            raise Exception(f"unexpected character at line {line} | {match.group()}")
+        elif kind != "space":
+            yield kind, match.group(), line
+
+
+class HDLParser:
+    """
+    Recursive descent parser of the HDL grammar of the course:
+    CHIP name { IN pins; OUT pins; PARTS: part(pin=bus, ...); ... } or BUILTIN name; [CLOCKED pins;] instead of PARTS
+    """
+
+    def __init__(self, source: str):
+        self.tokens: List[Tuple[str, str, int]] = list(scan(source))
+        self.index: int = 0
+
+    def parse_chip(self) -> ChipDefinition:
+        """
+        Parses the single chip of the source
+        :return: ChipDefinition
+        """
+        self._expect("CHIP")
+        chip: ChipDefinition = ChipDefinition(self._expect_kind("word"))
+        self._expect("{")
+        if self._accept("IN"):
+            chip.inputs = self._parse_pin_declarations()
+        if self._accept("OUT"):
+            chip.outputs = self._parse_pin_declarations()
+        if self._accept("BUILTIN"):
+            chip.builtin = self._expect_kind("word")
+            self._expect(";")
+            if self._accept("CLOCKED"):
+                chip.clocked = [name for name, _ in self._parse_pin_list()]
+        else:
+            self._expect("PARTS")
+            self._expect(":")
+            while self._peek() != "}":
+                chip.parts.append(self._parse_part())
+        self._expect("}")
+        if self.index != len(self.tokens):
+            raise Exception(f"unexpected text after the chip at line {self.tokens[self.index][2]}")
+        return chip
+
+    def _parse_pin_declarations(self) -> Dict[str, int]:
+        return {name: width for name, width in self._parse_pin_list()}
+
+    def _parse_pin_list(self) -> List[Tuple[str, int]]:
+        pins: List[Tuple[str, int]] = []
+        while True:
+            name: str = self._expect_kind("word")
+            width: int = 1
+            if self._accept("["):
+                width = int(self._expect_kind("number"))
+                self._expect("]")
+            pins.append((name, width))
+            if not self._accept(","):
+                break
+        self._expect(";")
+        return pins
+
+    def _parse_part(self) -> Part:
+        line: int = self.tokens[self.index][2] if self.index < len(self.tokens) else 0
+        chip: str = self._expect_kind("word")
+        self._expect("(")
+        connections: List[Connection] = []
+        while True:
+            pin: PinReference = self._parse_pin_reference()
+            self._expect("=")
+            connections.append(Connection(pin, self._parse_pin_reference()))
+            if not self._accept(","):
+                break
+        self._expect(")")
+        self._expect(";")
+        return Part(chip, connections, line)
+
+    def _parse_pin_reference(self) -> PinReference:
+        name: str = self._expect_kind("word")
+        if not self._accept("["):
+            return name, None, None
+        first: int = int(self._expect_kind("number"))
+        last: int = first
+        if self._accept(".."):
+            last = int(self._expect_kind("number"))
+        self._expect("]")
+        if last < first:
+            raise Exception(f"bit range runs backwards | {name}[{first}..{last}]")
+        return name, first, last
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.index][1] if self.index < len(self.tokens) else None
+
+    def _accept(self, text: str) -> bool:
+        if self._peek() == text:
+            self.index += 1
+            return True
+        return False
+
+    def _expect(self, text: str) -> None:
+        if not self._accept(text):
+            raise Exception(f"expected '{text}' | {self._describe()}")
+
+    def _expect_kind(self, kind: str) -> str:
+        if self.index >= len(self.tokens) or self.tokens[self.index][0] != kind:
+            raise Exception(f"expected a {kind} | {self._describe()}")
+        self.index += 1
+        return self.tokens[self.index - 1][1]
+
+    def _describe(self) -> str:
+        if self.index >= len(self.tokens):
+            return "end of file"
+        _, text, line = self.tokens[self.index]
+        return f"'{text}' at line {line}"
+
+
+def parse_hdl(path: Path) -> ChipDefinition:
+    """
+    Parses an .hdl file
+    :param path: Path
+    :return: ChipDefinition
+    """
+    try:
+        chip: ChipDefinition = HDLParser(path.read_text(encoding="latin-1")).parse_chip()
+    except Exception as exception:
+        raise Exception(f"{path}: {exception}")
+    chip.path = path
+    return chip
@@ -0,0 +1,563 @@
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from hdlsimulator.hdlparser import CONSTANTS, ChipDefinition, Part, PinReference, parse_hdl
+from hdlsimulator.primitives import (AND, FALSE, MUX, NAND, NOT, OR, PRIMITIVES, SEQUENTIAL_PRIMITIVES, TRUE, XOR,
+                                     Memory, Pins)
+
+BUILTIN_CHIPS_PATH: Path = Path(__file__).resolve().parent.parent / "tools" / "builtInChips"
+
+# (op, out, a, b, s), see hdlsimulator.primitives for the opcodes
+Gate = Tuple[int, int, int, int, int]
+
+# A step of the evaluation order: a gate, or the read of a memory at its address
+Node = Union[Gate, Memory]
+
+# Most select bits of a bank of memories that recognize_memory checks exhaustively
+MAX_SELECT_BITS: int = 8
+
+
+class ChipLibrary:
+    """
+    Finds and parses the .hdl file of every chip name, looking through the directories of search_path in order
+    and then through tools/builtInChips, the way the hardware simulator of the course does
+    """
+
+    def __init__(self, search_path: Sequence[Path]):
+        self.search_path: List[Path] = list(search_path) + [BUILTIN_CHIPS_PATH]
+        self.definitions: Dict[str, ChipDefinition] = {}
+        # Whether each chip with the pins of a memory behaves as one, see NetlistBuilder.is_memory
+        self.memories: Dict[str, bool] = {}
+
+    def get(self, name: str) -> ChipDefinition:
+        """
+        :param name: chip name, e.g. Mux16
+        :return: ChipDefinition of the first <name>.hdl on the search path
+        """
+        if name not in self.definitions:
+            for directory in self.search_path:
+                path: Path = directory / f"{name}.hdl"
+                if path.is_file():
+                    definition: ChipDefinition = parse_hdl(path)
+                    if definition.name != name:
+                        raise Exception(f"chip name does not match its file | {definition.name} in {path}")
+                    self.definitions[name] = definition
+                    break
+            else:
+                raise Exception(f"chip not found | {name}")
+        return self.definitions[name]
+
+
+class Netlist:
+    """
+    A chip flattened into gates and memories between numbered wires. The schedule is levelized: every gate and
+    memory read comes after everything driving its inputs, so evaluating it in order computes every output and
+    every memory input from the input pins and the memory contents.
+    """
+    name: str
+    inputs: Pins
+    outputs: Pins
+    schedule: List[Node]
+    gates: List[Gate]
+    memories: List[Memory]
+    wire_count: int
+
+    def __init__(self, name: str, inputs: Pins, outputs: Pins, schedule: List[Node], wire_count: int):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.schedule = schedule
+        self.gates = [node for node in schedule if isinstance(node, tuple)]
+        self.memories = [node for node in schedule if isinstance(node, Memory)]
+        self.wire_count = wire_count
+
+    def evaluate(self, slices: Dict[str, List[int]], count: int) -> Dict[str, List[int]]:
+        """
+        Evaluates count input vectors at once. Every pin bit is given as a bit slice, an int whose bit k is the
+        value of that pin bit in vector k, and every gate computes the slice of its output with one int operation.
+        :param slices: bit slices of every input pin, least significant pin bit first
+        :param count: number of vectors
+        :return: Dict[str, List[int]] bit slices of every output pin
+        """
+        if self.memories:
+            raise Exception(f"a clocked chip is simulated one cycle at a time, see ChipSimulator | {self.name}")
+        mask: int = (1 << count) - 1
+        wires: List[int] = [0] * self.wire_count
+        wires[TRUE] = mask
+        for name, bits in self.inputs.items():
+            for wire, value in zip(bits, slices[name]):
+                wires[wire] = value & mask
+        run_gates(self.gates, wires, mask)
+        return {name: [wires[wire] for wire in bits] for name, bits in self.outputs.items()}
+
+
+def run_gates(gates: List[Gate], wires: List[int], mask: int) -> None:
+    """
+    Computes the bit slice of every gate output in wires, see Netlist.evaluate
+    """
+    for op, out, a, b, s in gates:
+        if op == NAND:
+            wires[out] = mask ^ (wires[a] & wires[b])
+        elif op == AND:
+            wires[out] = wires[a] & wires[b]
+        elif op == OR:
+            wires[out] = wires[a] | wires[b]
+        elif op == XOR:
+            wires[out] = wires[a] ^ wires[b]
+        elif op == NOT:
+            wires[out] = mask ^ wires[a]
+        else:
+            a_value: int = wires[a]
+            wires[out] = a_value ^ ((a_value ^ wires[b]) & wires[s])
+
+
+class NetlistBuilder:
+    """
+    Flattens a chip and all of its parts into gates. Every chip instance gets its own wires for its outputs and
+    internal pins, a part output is tied to the wires it drives with an alias, and the aliases are resolved
+    before the gates are sorted. Clocked builtins become memories, and so do the chips of a project that are
+    proven to behave as a memory, so RAM16K is one array of words instead of 262144 flip-flops and their muxes.
+    """
+
+    def __init__(self, library: ChipLibrary):
+        self.library: ChipLibrary = library
+        self.gates: List[Gate] = []
+        self.memories: List[Memory] = []
+        self.aliases: Dict[int, int] = {}
+        self.wire_count: int = 2
+
+    def new_wires(self, count: int) -> List[int]:
+        self.wire_count += count
+        return list(range(self.wire_count - count, self.wire_count))
+
+    def gate(self, op: int, a: int, b: int, s: int) -> int:
+        out: int = self.new_wires(1)[0]
+        self.gates.append((op, out, a, b, s))
+        return out
+
+    def memory(self, name: str, width: int, words: int) -> Memory:
+        element: Memory = Memory(name, width, words, self.new_wires(width))
+        self.memories.append(element)
+        return element
+
+    def alias(self, wire: int, source: int, where: str) -> None:
+        if wire in self.aliases:
+            raise Exception(f"pin is driven more than once | {where}")
+        self.aliases[wire] = source
+
+    def build(self, name: str) -> Netlist:
+        """
+        :param name: chip name
+        :return: Netlist of the chip, pruned to its memories and the gates they and its outputs depend on
+        """
+        chip: ChipDefinition = self.library.get(name)
+        inputs: Pins = {pin: self.new_wires(width) for pin, width in chip.inputs.items()}
+        outputs: Pins = self.instantiate(chip, inputs)
+        self.merge_memories()
+        outputs = {pin: [self.resolve(wire) for wire in bits] for pin, bits in outputs.items()}
+        gates: List[Gate] = [(op, out, self.resolve(a), self.resolve(b), self.resolve(s))
+                             for op, out, a, b, s in self.gates]
+        return Netlist(name, inputs, outputs, sort_gates(gates, self.memories, inputs, outputs), self.wire_count)
+
+    def merge_memories(self) -> None:
+        """
+        Keeps one of every group of memories with the same inputs, since they always hold the same words; a Bit
+        often has a second DFF for its own feedback and a PC a second register. Memories without load hold
+        words the simulator loads from outside and are kept apart.
+        """
+        merged: bool = True
+        while merged:
+            merged = False
+            kept: Dict[Tuple, Memory] = {}
+            for memory in self.memories:
+                memory.data_in = [self.resolve(wire) for wire in memory.data_in]
+                memory.load = self.resolve(memory.load)
+                memory.address = [self.resolve(wire) for wire in memory.address]
+                key: Tuple = (memory.width, memory.words, tuple(memory.data_in), memory.load, tuple(memory.address))
+                if memory.load == FALSE or key not in kept:
+                    kept[key if memory.load != FALSE else id(memory)] = memory
+                    continue
+                for wire, source in zip(memory.out, kept[key].out):
+                    self.alias(wire, source, f"{memory.name} merged into an equal {memory.name}")
+                merged = True
+            self.memories = list(kept.values())
+
+    def instantiate(self, chip: ChipDefinition, inputs: Pins) -> Pins:
+        """
+        Adds the gates of one instance of chip
+        :param chip: ChipDefinition
+        :param inputs: wires of every input pin
+        :return: Pins wires of every output pin
+        """
+        if chip.builtin is not None:
+            if chip.name in SEQUENTIAL_PRIMITIVES:
+                return SEQUENTIAL_PRIMITIVES[chip.name](self.gate, partial(self.memory, chip.name), inputs)
+            if chip.name not in PRIMITIVES:
+                raise Exception(f"no implementation of builtin chip | {chip.name}")
+            return PRIMITIVES[chip.name](self.gate, inputs)
+
+        shape: Optional[Tuple[int, int]] = memory_shape(chip)
+        if shape is not None and self.is_memory(chip):
+            element: Memory = self.memory(chip.name, *shape)
+            element.data_in, element.load, element.address = inputs["in"], inputs["load"][0], inputs.get("address", [])
+            return {"out": element.out}
+
+        signals: Pins = dict(inputs)
+        outputs: Pins = {pin: self.new_wires(width) for pin, width in chip.outputs.items()}
+        signals.update(outputs)
+        part_chips: List[ChipDefinition] = [self.library.get(part.chip) for part in chip.parts]
+
+        # Internal pins get their wires from the part outputs that drive them, before any part reads them
+        for part, part_chip in zip(chip.parts, part_chips):
+            for connection in part.connections:
+                pin_name, first, last = connection.pin
+                if pin_name in part_chip.outputs:
+                    bus_name: str = connection.bus[0]
+                    if bus_name in chip.inputs or bus_name in CONSTANTS:
+                        raise Exception(f"part output drives an input or constant | {where(chip, part)}")
+                    if bus_name not in signals:
+                        width: int = pin_width(part_chip.outputs[pin_name], first, last)
+                        signals[bus_name] = self.new_wires(width)
+
+        for part, part_chip in zip(chip.parts, part_chips):
+            part_inputs: Pins = {pin: [FALSE] * width for pin, width in part_chip.inputs.items()}
+            for connection in part.connections:
+                pin_name, first, last = connection.pin
+                if pin_name in part_chip.inputs:
+                    bits: List[int] = bus_wires(signals, connection.bus, pin_width(
+                        part_chip.inputs[pin_name], first, last), where(chip, part))
+                    part_inputs[pin_name][first or 0:(first or 0) + len(bits)] = bits
+                elif pin_name not in part_chip.outputs:
+                    raise Exception(f"chip has no pin {pin_name} | {where(chip, part)}")
+
+            part_outputs: Pins = self.instantiate(part_chip, part_inputs)
+            for connection in part.connections:
+                pin_name, first, last = connection.pin
+                if pin_name in part_chip.outputs:
+                    width = part_chip.outputs[pin_name]
+                    sources: List[int] = part_outputs[pin_name][first or 0:(last if last is not None else width - 1) + 1]
+                    targets: List[int] = bus_wires(signals, connection.bus, len(sources), where(chip, part))
+                    for target, source in zip(targets, sources):
+                        self.alias(target, source, where(chip, part))
+        return outputs
+
+    def is_memory(self, chip: ChipDefinition) -> bool:
+        """
+        Checks once per chip whether it behaves as a memory, on a netlist of its own in which its parts are
+        memories already when they are one, see recognize_memory
+        """
+        if chip.name not in self.library.memories:
+            # While it is checked, the chip itself is flattened
+            self.library.memories[chip.name] = False
+            self.library.memories[chip.name] = recognize_memory(NetlistBuilder(self.library).build(chip.name))
+        return self.library.memories[chip.name]
+
+    def resolve(self, wire: int) -> int:
+        """
+        Follows the aliases of wire to the gate, input or constant that drives it
+        """
+        path: List[int] = []
+        while wire in self.aliases:
+            path.append(wire)
+            wire = self.aliases[wire]
+            if len(path) > len(self.aliases):
+                raise Exception("pins are connected in a loop without a part between them")
+        for alias in path:
+            self.aliases[alias] = wire
+        return wire
+
+
+def where(chip: ChipDefinition, part: Part) -> str:
+    return f"{part.chip} in {chip.name} at line {part.line}"
+
+
+def pin_width(width: int, first: Optional[int], last: Optional[int]) -> int:
+    """
+    :return: int number of bits of pin[first..last] of a pin with width bits
+    """
+    if first is None:
+        return width
+    if last >= width:
+        raise Exception(f"bit {last} is out of range of a {width} bit pin")
+    return last - first + 1
+
+
+def bus_wires(signals: Pins, bus: PinReference, width: int, location: str) -> List[int]:
+    """
+    Returns the wires of the bus side of a connection, which has to be width bits wide
+    :param signals: wires of the pins and internal pins of the chip
+    :param bus: (name, first bit, last bit)
+    :param width: width of the pin side
+    :param location: description of the part for errors
+    :return: List[int]
+    """
+    name, first, last = bus
+    if name in CONSTANTS:
+        if first is not None:
+            raise Exception(f"constant with a subscript | {name} of {location}")
+        return [TRUE if name == "true" else FALSE] * width
+    if name not in signals:
+        raise Exception(f"internal pin has no source | {name} of {location}")
+    wires: List[int] = signals[name]
+    if first is not None:
+        if last >= len(wires):
+            raise Exception(f"subscript out of range | {name}[{first}..{last}] of {location}")
+        wires = wires[first:last + 1]
+    if len(wires) != width:
+        raise Exception(f"width mismatch, {len(wires)} bits for {width} | {name} of {location}")
+    return wires
+
+
+def sort_gates(gates: List[Gate], memories: List[Memory], inputs: Pins, outputs: Pins) -> List[Node]:
+    """
+    Levelizes the gates that the outputs and the memory inputs depend on and the memory reads: every node comes
+    after the nodes driving its inputs, grouped by the length of the longest path to it from a pin or memory
+    without address. The other gates are dropped. Wires that nothing drives read as false.
+    :param gates: List[Gate] with resolved wires
+    :param memories: List[Memory] with resolved input wires
+    :param inputs: wires of the input pins
+    :param outputs: wires of the output pins
+    :return: List[Node]
+    """
+    drivers: Dict[int, Node] = {gate[1]: gate for gate in gates}
+    for memory in memories:
+        drivers.update((wire, memory) for wire in memory.out)
+    sources: Set[int] = {FALSE, TRUE} | {wire for bits in inputs.values() for wire in bits}
+
+    def driven(wire: int) -> int:
+        return wire if wire in drivers or wire in sources else FALSE
+
+    for pin, bits in outputs.items():
+        outputs[pin] = [driven(wire) for wire in bits]
+    for memory in memories:
+        memory.data_in = [driven(wire) for wire in memory.data_in]
+        memory.load = driven(memory.load)
+        memory.address = [driven(wire) for wire in memory.address]
+
+    def operands(node: Node) -> List[int]:
+        if isinstance(node, Memory):
+            return node.address
+        op, out, a, b, s = node
+        return [a] if op == NOT else [a, b, s] if op == MUX else [a, b]
+
+    # Depth first from the outputs and the memories, with an explicit stack since nets can be thousands of gates
+    # deep. Nodes are keyed by their first output wire.
+    order: List[Node] = []
+    state: Dict[int, bool] = {}
+    roots: List[int] = [wire for bits in outputs.values() for wire in bits]
+    roots += [wire for memory in memories for wire in memory.data_in + [memory.load, memory.out[0]]]
+    for root in roots:
+        stack: List[Tuple[int, bool]] = [(root, False)]
+        while stack:
+            wire, expanded = stack.pop()
+            if wire not in drivers:
+                continue
+            node: Node = drivers[wire]
+            key: int = first_wire(node)
+            if expanded:
+                state[key] = True
+                order.append(node)
+                continue
+            if key in state:
+                if not state[key]:
+                    raise Exception(f"combinational loop through wire {wire}")
+                continue
+            state[key] = False
+            stack.append((key, True))
+            stack.extend((operand, False) for operand in operands(node)
+                         if operand not in drivers or state.get(first_wire(drivers[operand])) is not True)
+
+    levels: Dict[int, int] = {}
+    for node in order:
+        levels[first_wire(node)] = 1 + max((levels.get(first_wire(drivers[operand]), 0) for operand in operands(node)
+                                            if operand in drivers), default=0)
+    order.sort(key=lambda node: levels[first_wire(node)])
+    return [node if isinstance(node, Memory) else (node[0], node[1], driven(node[2]), driven(node[3]), driven(node[4]))
+            for node in order]
+
+
+def first_wire(node: Node) -> int:
+    return node.out[0] if isinstance(node, Memory) else node[1]
+
+
+def memory_shape(chip: ChipDefinition) -> Optional[Tuple[int, int]]:
+    """
+    :return: (width, words) of a chip with the pins of a memory, in, load and optionally address to out,
+        None for any other chip
+    """
+    width: Optional[int] = chip.outputs.get("out")
+    if (set(chip.outputs) != {"out"} or chip.inputs.get("in") != width or chip.inputs.get("load") != 1
+            or not set(chip.inputs) <= {"in", "load", "address"}):
+        return None
+    return width, 1 << chip.inputs.get("address", 0)
+
+
+def exhaustive_pattern(position: int, count: int) -> int:
+    """
+    :return: int bit slice of bit position of the vector number, over count vectors, a power of two
+    """
+    # 0 for 2 ** position vectors and 1 for the next, repeated by doubling
+    period: int = 1 << position
+    pattern: int = ((1 << period) - 1) << period
+    length: int = 2 * period
+    while length < count:
+        pattern |= pattern << length
+        length *= 2
+    return pattern & ((1 << count) - 1)
+
+
+def cone(drivers: Dict[int, Gate], wire: int) -> Set[int]:
+    """
+    :return: Set[int] the pin and memory output wires that the value of wire depends on, without the constants
+    """
+    found: Set[int] = set()
+    seen: Set[int] = set()
+    stack: List[int] = [wire]
+    while stack:
+        wire = stack.pop()
+        if wire in seen:
+            continue
+        seen.add(wire)
+        if wire in drivers:
+            op, out, a, b, s = drivers[wire]
+            stack.extend((a,) if op == NOT else (a, b, s) if op == MUX else (a, b))
+        elif wire not in (FALSE, TRUE):
+            found.add(wire)
+    return found
+
+
+def evaluate_cone(netlist: Netlist, variables: List[int]) -> List[int]:
+    """
+    Evaluates the gates of netlist for every combination of the values of variables, pin or memory output wires;
+    the other pins and memory outputs read false. Variable i is bit i of the vector number.
+    :return: List[int] bit slice of every wire
+    """
+    count: int = 1 << len(variables)
+    wires: List[int] = [0] * netlist.wire_count
+    wires[TRUE] = (1 << count) - 1
+    for position, wire in enumerate(variables):
+        wires[wire] = exhaustive_pattern(position, count)
+    run_gates(netlist.gates, wires, wires[TRUE])
+    return wires
+
+
+def recognize_memory(netlist: Netlist) -> bool:
+    """
+    Checks that a chip with the pins of a memory behaves exactly as one: out reads the word at address and a clock
+    cycle with load writes in to it and to no other word. The chip has to be built from memories, e.g. DFFs, or
+    the Bits, Registers and RAMs that passed this check before, with combinational logic between them that is
+    checked exhaustively over the few wires it depends on. Every word of the chip has to be a word or a set of
+    bits of its memories of its own, but address bits may be decoded in any way, so a RAM16K that uses bit 11 of
+    address both to pick a RAM4K and inside of it still counts.
+    :param netlist: Netlist of the chip, see memory_shape for its pins
+    :return: bool
+    """
+    if not netlist.memories:
+        return False
+    if "address" not in netlist.inputs and all(memory.words == 1 for memory in netlist.memories):
+        return is_register(netlist)
+    return is_memory_bank(netlist)
+
+
+def is_register(netlist: Netlist) -> bool:
+    """
+    A register: every bit of out is the output of a one word memory that no other bit reads, and that memory
+    loads in of that bit exactly when load is true, e.g. a DFF behind a Mux of in and its own output
+    """
+    drivers: Dict[int, Gate] = {gate[1]: gate for gate in netlist.gates}
+    load: int = netlist.inputs["load"][0]
+    bits: Dict[int, Tuple[Memory, int]] = {wire: (memory, bit) for memory in netlist.memories
+                                           for bit, wire in enumerate(memory.out)}
+    outputs: List[int] = netlist.outputs["out"]
+    if sorted(outputs) != sorted(bits):
+        return False
+    for data_in, output in zip(netlist.inputs["in"], outputs):
+        memory, bit = bits[output]
+        variables: List[int] = [load, data_in, output]
+        if not cone(drivers, memory.load) | cone(drivers, memory.data_in[bit]) <= set(variables):
+            return False
+        wires: List[int] = evaluate_cone(netlist, variables)
+        loaded, data, kept = wires[memory.load], wires[memory.data_in[bit]], wires[output]
+        expected: int = wires[output] ^ ((wires[output] ^ wires[data_in]) & wires[load])
+        if kept ^ ((kept ^ data) & loaded) != expected:
+            return False
+    return True
+
+
+def is_memory_bank(netlist: Netlist) -> bool:
+    """
+    A bank of memories of the width of the chip that all take in and part of address: load is routed to exactly
+    one of them, chosen by the other address bits, and out reads the one chosen the same way. Different addresses
+    have to reach different words.
+    """
+    drivers: Dict[int, Gate] = {gate[1]: gate for gate in netlist.gates}
+    load: int = netlist.inputs["load"][0]
+    address: List[int] = netlist.inputs.get("address", [])
+    outputs: List[int] = netlist.outputs["out"]
+    memories: List[Memory] = netlist.memories
+    for memory in memories:
+        if (memory.width != len(outputs) or memory.data_in != netlist.inputs["in"]
+                or not set(memory.address) <= set(address) or len(set(memory.address)) != len(memory.address)):
+            return False
+
+    # The address bits that choose the memory
+    choice: Set[int] = set()
+    for memory in memories:
+        choice |= cone(drivers, memory.load)
+    if not choice <= {load} | set(address):
+        return False
+    memory_outputs: Set[int] = {wire for memory in memories for wire in memory.out}
+    for output in outputs:
+        choice |= cone(drivers, output) - memory_outputs
+    select: List[int] = [wire for wire in address if wire in choice]
+    if not choice <= {load} | set(select) or len(select) > MAX_SELECT_BITS:
+        return False
+
+    # Which memory every combination of the select bits loads, with load at bit 0 of the vector number
+    wires: List[int] = evaluate_cone(netlist, [load] + select)
+    chosen: List[int] = []
+    for value in range(1 << len(select)):
+        if any(wires[memory.load] >> (value << 1) & 1 for memory in memories):
+            return False
+        loaded: List[int] = [index for index, memory in enumerate(memories)
+                             if wires[memory.load] >> (value << 1 | 1) & 1]
+        if len(loaded) != 1:
+            return False
+        chosen.append(loaded[0])
+
+    # Addresses that choose the same memory have to differ in the address bits of that memory
+    for index, memory in enumerate(memories):
+        values: List[int] = [value for value in range(1 << len(select)) if chosen[value] == index]
+        if values and not set(address) <= set(select) | set(memory.address):
+            return False
+        others: List[int] = [position for position, wire in enumerate(select) if wire not in memory.address]
+        if len({tuple(value >> position & 1 for position in others) for value in values}) != len(values):
+            return False
+
+    for bit, output in enumerate(outputs):
+        sources: List[int] = [memory.out[bit] for memory in memories]
+        if not cone(drivers, output) <= set(select) | set(sources):
+            return False
+        wires = evaluate_cone(netlist, select + sources)
+        expected: int = 0
+        for value in range(1 << len(select)):
+            vectors: int = wires[TRUE]
+            for position, wire in enumerate(select):
+                vectors &= wires[wire] if value >> position & 1 else ~wires[wire]
+            expected |= wires[sources[chosen[value]]] & vectors
+        if wires[output] != expected:
+            return False
+    return True
+
+
+def build_netlist(hdl_file: Path, search_path: Sequence[Path] = ()) -> Netlist:
+    """
+    Parses and flattens the chip of hdl_file. Its parts come from the directory of hdl_file, then from
+    search_path and then from tools/builtInChips.
+    :param hdl_file: Path
+    :param search_path: more directories of .hdl files
+    :return: Netlist
+    """
+    library: ChipLibrary = ChipLibrary([hdl_file.parent] + list(search_path))
+    return NetlistBuilder(library).build(hdl_file.stem)
@@ -0,0 +1,247 @@
+from typing import Callable, Dict, List
+
+# Gate opcodes of a netlist. Every gate is (op, out, a, b, s): MUX computes s ? b : a, NOT only reads a.
+NAND, AND, OR, XOR, NOT, MUX = range(6)
+
+# Wires 0 and 1 always carry false and true
+FALSE: int = 0
+TRUE: int = 1
+
+# Adds a gate (op, a, b, s) to the netlist being built and returns the wire of its output
+GateFactory = Callable[[int, int, int, int], int]
+
+# Wires of every pin of a chip, least significant bit first
+Pins = Dict[str, List[int]]
+
+# Gate level implementation of a builtin chip: (gate factory, input pins) -> output pins
+Primitive = Callable[[GateFactory, Pins], Pins]
+
+
+class Memory:
+    """
+    A clocked state element of a netlist: words words of width bits. out always reads the word at address, and
+    a clock cycle writes data_in to that word when load is true; tick latches the write and tock commits it.
+    A DFF is a one word memory that is always loaded, a register one word with a load pin. The words themselves
+    live in the simulator, name is the chip the memory stands for, e.g. RAM16K, for test scripts reading RAM16K[i].
+    """
+    __slots__ = ("name", "width", "words", "data_in", "load", "address", "out")
+
+    def __init__(self, name: str, width: int, words: int, out: List[int]):
+        self.name: str = name
+        self.width: int = width
+        self.words: int = words
+        self.data_in: List[int] = [FALSE] * width
+        self.load: int = FALSE
+        self.address: List[int] = []
+        self.out: List[int] = out
+
+
+# Adds a memory (width, words) to the netlist being built, named after the chip being instantiated
+MemoryFactory = Callable[[int, int], Memory]
+
+# Implementation of a clocked builtin chip: (gate factory, memory factory, input pins) -> output pins
+SequentialPrimitive = Callable[[GateFactory, MemoryFactory, Pins], Pins]
+
+
+def nand(gate: GateFactory, a: int, b: int) -> int:
+    return gate(NAND, a, b, FALSE)
+
+
+def not_(gate: GateFactory, a: int) -> int:
+    return gate(NOT, a, FALSE, FALSE)
+
+
+def and_(gate: GateFactory, a: int, b: int) -> int:
+    return gate(AND, a, b, FALSE)
+
+
+def or_(gate: GateFactory, a: int, b: int) -> int:
+    return gate(OR, a, b, FALSE)
+
+
+def xor(gate: GateFactory, a: int, b: int) -> int:
+    return gate(XOR, a, b, FALSE)
+
+
+def mux(gate: GateFactory, a: int, b: int, sel: int) -> int:
+    return gate(MUX, a, b, sel)
+
+
+def mux_tree(gate: GateFactory, buses: List[List[int]], sel: List[int]) -> List[int]:
+    """
+    Selects buses[sel] with one level of Mux gates per bit of sel
+    :param gate: GateFactory
+    :param buses: 2 ** len(sel) buses of the same width
+    :param sel: select bits, least significant first
+    :return: List[int] wires of the selected bus
+    """
+    for bit in sel:
+        buses = [[mux(gate, a, b, bit) for a, b in zip(buses[i], buses[i + 1])] for i in range(0, len(buses), 2)]
+    return buses[0]
+
+
+def decode(gate: GateFactory, enable: int, sel: List[int]) -> List[int]:
+    """
+    Routes enable to output sel of 2 ** len(sel) outputs, the others are false
+    :param gate: GateFactory
+    :param enable: wire routed to the selected output
+    :param sel: select bits, least significant first
+    :return: List[int] wires of the outputs
+    """
+    outputs: List[int] = [enable]
+    for bit in reversed(sel):
+        low: int = not_(gate, bit)
+        outputs = [and_(gate, output, line) for output in outputs for line in (low, bit)]
+    return outputs
+
+
+def add(gate: GateFactory, a: List[int], b: List[int], carry: int) -> List[int]:
+    """
+    Ripple carry adder, the carry out of the most significant bit is dropped
+    :return: List[int] wires of a + b + carry
+    """
+    total: List[int] = []
+    for x, y in zip(a, b):
+        partial: int = xor(gate, x, y)
+        total.append(xor(gate, partial, carry))
+        carry = or_(gate, and_(gate, x, y), and_(gate, partial, carry))
+    return total
+
+
+def alu(gate: GateFactory, pins: Pins) -> Pins:
+    x: List[int] = [and_(gate, bit, not_(gate, pins["zx"][0])) for bit in pins["x"]]
+    x = [xor(gate, bit, pins["nx"][0]) for bit in x]
+    y: List[int] = [and_(gate, bit, not_(gate, pins["zy"][0])) for bit in pins["y"]]
+    y = [xor(gate, bit, pins["ny"][0]) for bit in y]
+    conjunction: List[int] = [and_(gate, a, b) for a, b in zip(x, y)]
+    result: List[int] = [mux(gate, a, b, pins["f"][0]) for a, b in zip(conjunction, add(gate, x, y, FALSE))]
+    result = [xor(gate, bit, pins["no"][0]) for bit in result]
+    nonzero: int = result[0]
+    for bit in result[1:]:
+        nonzero = or_(gate, nonzero, bit)
+    return {"out": result, "zr": [not_(gate, nonzero)], "ng": [result[-1]]}
+
+
+def half_adder(gate: GateFactory, pins: Pins) -> Pins:
+    a, b = pins["a"][0], pins["b"][0]
+    return {"sum": [xor(gate, a, b)], "carry": [and_(gate, a, b)]}
+
+
+def full_adder(gate: GateFactory, pins: Pins) -> Pins:
+    a, b, c = pins["a"][0], pins["b"][0], pins["c"][0]
+    partial: int = xor(gate, a, b)
+    return {"sum": [xor(gate, partial, c)], "carry": [or_(gate, and_(gate, a, b), and_(gate, partial, c))]}
+
+
+def inc16(gate: GateFactory, pins: Pins) -> Pins:
+    total: List[int] = []
+    carry: int = TRUE
+    for bit in pins["in"]:
+        total.append(xor(gate, bit, carry))
+        carry = and_(gate, bit, carry)
+    return {"out": total}
+
+
+def or8way(gate: GateFactory, pins: Pins) -> Pins:
+    result: int = pins["in"][0]
+    for bit in pins["in"][1:]:
+        result = or_(gate, result, bit)
+    return {"out": [result]}
+
+
+def dmux_way(names: str) -> Primitive:
+    """
+    Returns the DMux with one output per character of names
+    """
+    def dmux(gate: GateFactory, pins: Pins) -> Pins:
+        outputs: List[int] = decode(gate, pins["in"][0], pins["sel"])
+        return {name: [output] for name, output in zip(names, outputs)}
+    return dmux
+
+
+def mux_way(names: str) -> Primitive:
+    """
+    Returns the Mux of the buses named by the characters of names
+    """
+    def mux_n(gate: GateFactory, pins: Pins) -> Pins:
+        return {"out": mux_tree(gate, [pins[name] for name in names], pins["sel"])}
+    return mux_n
+
+
+def bitwise(function: Callable[..., int], *names: str) -> Primitive:
+    """
+    Returns the chip that applies function to the bits of its input pins one position at a time
+    """
+    def chip(gate: GateFactory, pins: Pins) -> Pins:
+        return {"out": [function(gate, *bits) for bits in zip(*(pins[name] for name in names))]}
+    return chip
+
+
+# Gate level implementation of every combinational chip of tools/builtInChips by chip name
+PRIMITIVES: Dict[str, Primitive] = {
+    "Nand": bitwise(nand, "a", "b"),
+    "Not": bitwise(not_, "in"),
+    "And": bitwise(and_, "a", "b"),
+    "Or": bitwise(or_, "a", "b"),
+    "Xor": bitwise(xor, "a", "b"),
+    "Mux": lambda gate, pins: {"out": [mux(gate, pins["a"][0], pins["b"][0], pins["sel"][0])]},
+    "DMux": dmux_way("ab"),
+    "DMux4Way": dmux_way("abcd"),
+    "DMux8Way": dmux_way("abcdefgh"),
+    "Not16": bitwise(not_, "in"),
+    "And16": bitwise(and_, "a", "b"),
+    "Or16": bitwise(or_, "a", "b"),
+    "Mux16": lambda gate, pins: {"out": [mux(gate, a, b, pins["sel"][0]) for a, b in zip(pins["a"], pins["b"])]},
+    "Mux4Way16": mux_way("abcd"),
+    "Mux8Way16": mux_way("abcdefgh"),
+    "Or8Way": or8way,
+    "HalfAdder": half_adder,
+    "FullAdder": full_adder,
+    "Add16": lambda gate, pins: {"out": add(gate, pins["a"], pins["b"], FALSE)},
+    "Inc16": inc16,
+    "ALU": alu,
+}
+
+
+def memory_chip(width: int, words: int) -> SequentialPrimitive:
+    """
+    Returns the chip that is a single memory on its pins in, load and address. Without load it is always loaded
+    if it has an input, like a DFF, and read only otherwise, like the ROM or the keyboard.
+    """
+    def chip(gate: GateFactory, memory: MemoryFactory, pins: Pins) -> Pins:
+        element: Memory = memory(width, words)
+        element.data_in = pins.get("in", element.data_in)
+        element.load = pins["load"][0] if "load" in pins else TRUE if "in" in pins else FALSE
+        element.address = pins.get("address", [])
+        return {"out": element.out}
+    return chip
+
+
+def program_counter(gate: GateFactory, memory: MemoryFactory, pins: Pins) -> Pins:
+    register: Memory = memory(16, 1)
+    incremented: List[int] = inc16(gate, {"in": register.out})["out"]
+    data_in: List[int] = [mux(gate, a, b, pins["inc"][0]) for a, b in zip(register.out, incremented)]
+    data_in = [mux(gate, a, b, pins["load"][0]) for a, b in zip(data_in, pins["in"])]
+    keep: int = not_(gate, pins["reset"][0])
+    register.data_in = [and_(gate, bit, keep) for bit in data_in]
+    register.load = TRUE
+    return {"out": register.out}
+
+
+# Implementation of every clocked chip of tools/builtInChips by chip name
+SEQUENTIAL_PRIMITIVES: Dict[str, SequentialPrimitive] = {
+    "DFF": memory_chip(1, 1),
+    "Bit": memory_chip(1, 1),
+    "Register": memory_chip(16, 1),
+    "ARegister": memory_chip(16, 1),
+    "DRegister": memory_chip(16, 1),
+    "PC": program_counter,
+    "RAM8": memory_chip(16, 8),
+    "RAM64": memory_chip(16, 64),
+    "RAM512": memory_chip(16, 512),
+    "RAM4K": memory_chip(16, 4096),
+    "RAM16K": memory_chip(16, 16384),
+    "ROM32K": memory_chip(16, 32768),
+    "Screen": memory_chip(16, 8192),
+    "Keyboard": memory_chip(16, 1),
+}
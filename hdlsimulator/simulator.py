@@ -0,0 +1,216 @@
+import argparse
+import time
+
+from array import array
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+from hdlsimulator.compiler import Evaluator, compile_netlist
+from hdlsimulator.netlist import Netlist, build_netlist, exhaustive_pattern
+
+OP_NAMES: List[str] = ["Nand", "And", "Or", "Xor", "Not", "Mux"]
+
+# Widest pin converted through a table of binary strings
+TABLE_WIDTH: int = 16
+
+
+@lru_cache(maxsize=None)
+def binary_strings(width: int) -> List[str]:
+    """
+    :return: List[str] the width digit binary string of every value of a width bit pin
+    """
+    return [format(value, f"0{width}b") for value in range(1 << width)]
+
+
+def to_slices(values: Sequence[int], width: int) -> List[int]:
+    """
+    Transposes one value per vector into one bit slice per pin bit, see Netlist.evaluate
+    :param values: value of a pin in every vector, negative values are taken as two's complement
+    :param width: width of the pin
+    :return: List[int] bit slices, least significant pin bit first
+    """
+    mask: int = (1 << width) - 1
+    if width <= TABLE_WIDTH:
+        table: List[str] = binary_strings(width)
+        rows: str = "".join([table[value & mask] for value in reversed(values)])
+    else:
+        rows = "".join([format(value & mask, f"0{width}b") for value in reversed(values)])
+    # One string of every vector, last vector first, so every width-th digit is the slice of one pin bit
+    return [int(rows[width - 1 - bit::width] or "0", 2) for bit in range(width)]
+
+
+def from_slices(slices: Sequence[int], count: int) -> List[int]:
+    """
+    Transposes the bit slices of a pin back into its value in each of count vectors
+    :param slices: bit slices, least significant pin bit first
+    :param count: number of vectors
+    :return: List[int] unsigned values
+    """
+    width: int = len(slices)
+    digits: bytearray = bytearray(count * width)
+    for bit, value in enumerate(slices):
+        digits[width - 1 - bit::width] = format(value, f"0{count}b")[::-1].encode()
+    return [int(digits[start:start + width], 2) for start in range(0, count * width, width)]
+
+
+def exhaustive_slices(netlist: Netlist) -> Dict[str, List[int]]:
+    """
+    Returns the bit slices of every combination of the input pins, in the row order of the truth tables of the
+    course: the inputs read as one binary number, first pin most significant, count up from 0 row by row
+    :param netlist: Netlist
+    :return: Dict[str, List[int]] of 2 ** (number of input bits) vectors
+    """
+    bits: List[int] = [wire for wires in netlist.inputs.values() for wire in reversed(wires)]
+    count: int = 1 << len(bits)
+    by_wire: Dict[int, int] = {wire: exhaustive_pattern(position, count)
+                               for position, wire in enumerate(reversed(bits))}
+    return {name: [by_wire[wire] for wire in wires] for name, wires in netlist.inputs.items()}
+
+
+def simulate(netlist: Netlist, vectors: Dict[str, Sequence[int]]) -> Dict[str, List[int]]:
+    """
+    Evaluates the netlist once for every vector
+    :param netlist: Netlist
+    :param vectors: values of every input pin, one per vector
+    :return: Dict[str, List[int]] unsigned values of every output pin, one per vector
+    """
+    count: int = len(next(iter(vectors.values()))) if vectors else 1
+    slices: Dict[str, List[int]] = {name: to_slices(vectors[name], len(wires))
+                                    for name, wires in netlist.inputs.items()}
+    outputs: Dict[str, List[int]] = netlist.evaluate(slices, count)
+    return {name: from_slices(bits, count) for name, bits in outputs.items()}
+
+
+class ChipSimulator:
+    """
+    One chip driven pin by pin, the way test scripts do: set input pins, eval, tick and tock, read any pin.
+    Pin values are unsigned ints of the width of the pin. The netlist is compiled to one Python function, which
+    also returns what every memory writes; tick latches those writes and tock commits them, so the output pins
+    show the new contents only after the tock. Reading a memory part shows them after the tick already, like in the
+    hardware simulator of the course.
+    """
+    netlist: Netlist
+    values: Dict[str, int]
+    widths: Dict[str, int]
+    memories: List[array]
+    writes: Tuple[Tuple[int, int, int], ...]
+    latched: Tuple[Tuple[int, int, int], ...]
+
+    def __init__(self, netlist: Netlist):
+        self.netlist = netlist
+        self.widths = {name: len(wires) for name, wires in {**netlist.inputs, **netlist.outputs}.items()}
+        self.values = {name: 0 for name in self.widths}
+        self.memories = [array("H", bytes(2 * memory.words)) for memory in netlist.memories]
+        self.writes = ()
+        self.latched = ()
+        self.evaluate: Evaluator = compile_netlist(netlist)
+        self.eval()
+
+    def set(self, pin: str, value: int) -> None:
+        if pin not in self.netlist.inputs:
+            raise Exception(f"not an input pin of {self.netlist.name} | {pin}")
+        self.values[pin] = value & ((1 << self.widths[pin]) - 1)
+
+    def get(self, pin: str) -> int:
+        if pin not in self.values:
+            raise Exception(f"not a pin of {self.netlist.name} | {pin}")
+        return self.values[pin]
+
+    def memory(self, part: str) -> int:
+        """
+        :param part: chip name of a memory, e.g. RAM16K
+        :return: int index of the first memory of that chip
+        """
+        for index, memory in enumerate(self.netlist.memories):
+            if memory.name == part:
+                return index
+        raise Exception(f"no memory part in {self.netlist.name} | {part}")
+
+    def read(self, part: str, address: int) -> int:
+        index: int = self.memory(part)
+        if index < len(self.latched) and self.latched[index][0] and self.latched[index][1] == address:
+            return self.latched[index][2]
+        return self.memories[index][address]
+
+    def write(self, part: str, address: int, value: int) -> None:
+        index: int = self.memory(part)
+        self.memories[index][address] = value & ((1 << self.netlist.memories[index].width) - 1)
+
+    def load(self, part: str, words: Sequence[int]) -> None:
+        """
+        Replaces the contents of a memory part, e.g. the program of ROM32K; the rest of it reads 0
+        """
+        data: array = self.memories[self.memory(part)]
+        if len(words) > len(data):
+            raise Exception(f"{len(words)} words do not fit into {part}")
+        data[:] = array("H", words) + array("H", bytes(2 * (len(data) - len(words))))
+
+    def eval(self) -> None:
+        """
+        Recomputes the output pins from the input pins and the memories
+        :return: None
+        """
+        outputs, self.writes = self.evaluate([self.values[name] for name in self.netlist.inputs], self.memories)
+        self.values.update(zip(self.netlist.outputs, outputs))
+
+    def tick(self) -> None:
+        self.eval()
+        self.latched = self.writes
+
+    def tock(self) -> None:
+        for data, (load, address, value) in zip(self.memories, self.latched):
+            if load:
+                data[address] = value
+        self.latched = ()
+        self.eval()
+
+
+def truth_table(netlist: Netlist) -> List[str]:
+    """
+    Returns the truth table of the netlist over all of its inputs in the layout of a .cmp file
+    :param netlist: Netlist
+    :return: List[str] header and one line per row
+    """
+    count: int = 1 << sum(len(wires) for wires in netlist.inputs.values())
+    slices: Dict[str, List[int]] = exhaustive_slices(netlist)
+    columns: Dict[str, List[int]] = {name: from_slices(bits, count) for name, bits in slices.items()}
+    outputs: Dict[str, List[int]] = netlist.evaluate(slices, count)
+    columns.update({name: from_slices(bits, count) for name, bits in outputs.items()})
+    widths: Dict[str, int] = {name: len(wires) for name, wires in {**netlist.inputs, **netlist.outputs}.items()}
+    lines: List[str] = ["|" + "|".join(f"{name:^{widths[name] + 6}}" for name in columns) + "|"]
+    for row in range(count):
+        lines.append("|" + "|".join(f"{format(values[row], f'0{widths[name]}b'):^{widths[name] + 6}}"
+                                    for name, values in columns.items()) + "|")
+    return lines
+
+
+def hdl_simulator():
+    argument_parser = argparse.ArgumentParser(description="Flattens an .hdl chip into gates and memories")
+    argument_parser.add_argument("path", help="an .hdl file")
+    argument_parser.add_argument("--search", nargs="*", default=[],
+                                 help="more directories with the .hdl files of parts, e.g. projects/01")
+    argument_parser.add_argument("--table", type=int, default=8,
+                                 help="print the truth table of chips with up to this many input bits")
+    arguments = argument_parser.parse_args()
+
+    start: float = time.perf_counter()
+    netlist: Netlist = build_netlist(Path(arguments.path), [Path(directory) for directory in arguments.search])
+    build_time: float = time.perf_counter() - start
+    counts: Counter = Counter(OP_NAMES[gate[0]] for gate in netlist.gates)
+    print(f"{netlist.name}: {len(netlist.gates)} gates ({', '.join(f'{op} {n}' for op, n in counts.items())}) "
+          f"flattened in {build_time * 1000:.1f} ms")
+    for memory in netlist.memories:
+        print(f"  {memory.name}: {memory.words} x {memory.width} bit memory")
+
+    input_bits: int = sum(len(wires) for wires in netlist.inputs.values())
+    if input_bits <= arguments.table and not netlist.memories:
+        start = time.perf_counter()
+        lines: List[str] = truth_table(netlist)
+        print("\n".join(lines))
+        print(f"{len(lines) - 1} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    hdl_simulator()
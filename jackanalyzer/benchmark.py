@@ -0,0 +1,124 @@
+import io
+import time
+import tracemalloc
+
+from pathlib import Path
+from typing import Callable, List, TextIO
+
+from jackanalyzer.compilationengine import CompilationEngine
+from jackanalyzer.jackanalyzer import Token, legacy_tokenize, tokenize
+from jackanalyzer.jacktokenizer import scan
+from jackanalyzer.symboltable import Kind, SymbolTable
+from jackanalyzer.tokenstream import TokenStream, token_stream
+
+PROJECTS_PATH: Path = Path(__file__).resolve().parent.parent / "projects"
+
+
+def measure(name: str, tokenizer: Callable[[TextIO], List[Token]], jack_files: List[Path], rounds: int) -> float:
+    """
+    Tokenizes every file rounds times and prints the tokens per second.
+    :return: tokens per second
+    """
+    tokens: int = 0
+    start: float = time.perf_counter()
+    for _ in range(rounds):
+        for jack_file in jack_files:
+            with open(jack_file) as input_file:
+                tokens += len(tokenizer(input_file))
+    run_time: float = time.perf_counter() - start
+    speed: float = tokens / run_time
+    print(f"{name}: {tokens} tokens in {run_time:.2f} s: {speed:,.0f} tokens per second")
+    return speed
+
+
+def generate_source(functions: int) -> str:
+    """
+    Returns one Jack class with the given number of functions, as a stand-in for large generated sources
+    """
+    body: str = """
+    function int f{0}(int a, int b) {{
+        var int i, sum;
+        var Array values;
+        let values = Array.new(10);
+        let i = 0;
+        while (i < 10) {{
+            let values[i] = (a * i) + (b / 2) - {0};
+            if ((values[i] > 100) & ~(i = 3)) {{
+                let sum = sum + values[i];
+            }} else {{
+                do Output.printString("small value");
+            }}
+            let i = i + 1;
+        }}
+        return sum;
+    }}
+"""
+    return "class Generated {\n" + "".join(body.format(n) for n in range(functions)) + "}\n"
+
+
+def measure_memory(name: str, build: Callable[[], object]) -> int:
+    """
+    Prints the memory held by the result of build
+    :return: bytes
+    """
+    tracemalloc.start()
+    result = build()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name}: {size / 1024:,.0f} KiB")
+    del result
+    return size
+
+
+def measure_symbol_table(declarations: int) -> float:
+    """
+    Declares the given number of locals in one subroutine, looks every one of them up and counts them.
+    Prints the time per declaration, which should not grow with the number of declarations.
+    :return: seconds per declaration
+    """
+    names: List[str] = [f"v{n}" for n in range(declarations)]
+    symbol_table: SymbolTable = SymbolTable()
+    symbol_table.define("field", "int", Kind.FIELD)
+    start: float = time.perf_counter()
+    for _ in range(max(1, 100_000 // declarations)):
+        symbol_table.reset_subroutine_vars()
+        for name in names:
+            symbol_table.define(name, "int", Kind.VAR)
+            symbol_table.kind_of(name)
+            symbol_table.index_of(name)
+            symbol_table.var_count(Kind.VAR)
+    per_declaration: float = (time.perf_counter() - start) / (max(1, 100_000 // declarations) * declarations)
+    print(f"symbol table with {declarations:>5} locals: {per_declaration * 1e9:,.0f} ns per declaration and lookup")
+    return per_declaration
+
+
+def main():
+    jack_files: List[Path] = sorted(path for project in ("09", "10", "11")
+                                    for path in (PROJECTS_PATH / project).glob("**/*.jack"))
+    for jack_file in jack_files:
+        with open(jack_file) as legacy_file, open(jack_file) as input_file:
+            if [vars(token) for token in legacy_tokenize(legacy_file)] != [vars(token) for token in tokenize(input_file)]:
+                raise Exception(f"Tokenizers disagree | {jack_file}")
+    print(f"{len(jack_files)} files of projects 09-11 tokenize identically")
+
+    legacy_speed: float = measure("JackTokenizer", legacy_tokenize, jack_files, 5)
+    scanner_speed: float = measure("regex scanner", tokenize, jack_files, 5)
+    print(f"regex scanner speedup: {scanner_speed / legacy_speed:.1f}x")
+
+    source: str = generate_source(2000)
+    stream: TokenStream = token_stream(scan(source))
+    print(f"generated source: {len(source):,} characters, {len(stream):,} tokens")
+    list_size: int = measure_memory("List[Token]", lambda: tokenize(io.StringIO(source)))
+    stream_size: int = measure_memory("TokenStream", lambda: token_stream(scan(source)))
+    print(f"TokenStream uses {list_size / stream_size:.1f}x less memory")
+    start: float = time.perf_counter()
+    CompilationEngine(io.StringIO(source), io.StringIO(), stream).compile_class()
+    run_time: float = time.perf_counter() - start
+    print(f"compiled in {run_time:.2f} s: {len(stream) / run_time:,.0f} tokens per second")
+
+    for declarations in (10, 100, 1000, 10000):
+        measure_symbol_table(declarations)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,41 @@
-from typing import TextIO, List, Optional
+from typing import TextIO, Optional, Tuple, Callable
 
+from jackanalyzer.constantfolding import TRUE_VALUE, FALSE_VALUE, doublings, fold_binary, fold_unary
 from jackanalyzer.jacktokenizer import TokenType
 from jackanalyzer.symboltable import SymbolTable, Kind
+from jackanalyzer.tokenstream import (
+    TokenStream, TokenCursor, TOKEN_TYPES, PRESET_STRINGS,
+    KEYWORD_TOKEN, SYMBOL_TOKEN, IDENTIFIER_TOKEN, INT_CONST_TOKEN, STRING_CONST_TOKEN,
+    CLASS, METHOD, FUNCTION, CONSTRUCTOR, INT, BOOLEAN, CHAR, VOID, VAR, STATIC, FIELD, LET, DO, IF, ELSE, WHILE,
+    RETURN, TRUE, FALSE, NULL, THIS,
+    LEFT_BRACE, RIGHT_BRACE, LEFT_PAREN, RIGHT_PAREN, LEFT_BRACKET, RIGHT_BRACKET, DOT, COMMA, SEMICOLON, PLUS, MINUS,
+    ASTERISK, SLASH, AMPERSAND, PIPE, LESS_THAN, GREATER_THAN, EQUALS, TILDE,
+)
 from jackanalyzer.vmwriter import VMWriter, Segment
+from vmtranslator.commands import VMCommand
+
+# Arithmetic command or OS function of every binary operator
+OPERATORS = {
+    PLUS: 'add',
+    MINUS: 'sub',
+    ASTERISK: 'Math.multiply',
+    SLASH: 'Math.divide',
+    AMPERSAND: 'and',
+    PIPE: 'or',
+    LESS_THAN: 'lt',
+    GREATER_THAN: 'gt',
+    EQUALS: 'eq',
+}
 
 
 class Token:
     type: TokenType
     content: str
 
+    def __init__(self, type: TokenType, content: str):
+        self.type = type
+        self.content = content
+
     def match(self, type: TokenType, content: Optional[str]) -> bool:
         return self.type == type and self.content == content
 
@@ -17,13 +44,19 @@ class CompilationEngine:
     symbol_table: SymbolTable
     class_name: str
     vmwriter: VMWriter
+    cursor: TokenCursor
 
-    def __init__(self, input_file: TextIO, output_file: TextIO, token_list: List[Token]):
+    def __init__(self, input_file: TextIO, output_file: Optional[TextIO], tokens: TokenStream,
+                 command_sink: Optional[Callable[[VMCommand], None]] = None):
+        """
+        :param output_file: receives the VM code as text, None when a command_sink is given
+        :param command_sink: receives the VM code as VMCommand tuples, see VMWriter
+        """
         self.input_file = input_file
         self.output_file = output_file
-        self.token_list = token_list
-        self.token_index = 0
-        self.vmwriter = VMWriter()
+        self.cursor = TokenCursor(tokens)
+        self.vmwriter = VMWriter(output_file, command_sink=command_sink)
+        self.label_number = 0
 
     def compile_class(self):
         """
@@ -32,29 +65,27 @@ class CompilationEngine:
             class className { classVarDec* subroutineDec* }
         :return:
         """
-        self._consume(TokenType.KEYWORD, "class")
-        self.class_name: str = self._peek().content
-        self._consume(TokenType.IDENTIFIER)
-        self._consume(TokenType.SYMBOL, "{")
+        self._consume(CLASS)
+        self.class_name: str = self._consume_type(IDENTIFIER_TOKEN)
+        self._consume(LEFT_BRACE)
 
         self.symbol_table = SymbolTable()
 
         finished_compiling_class_var_dec = False
-        current_token: Token = self._peek()
-        while current_token.type == TokenType.KEYWORD:
-            if finished_compiling_class_var_dec and current_token.content in ('static', 'field'):
+        while self._peek_type() == KEYWORD_TOKEN:
+            token_id: int = self._peek()
+            if finished_compiling_class_var_dec and token_id in (STATIC, FIELD):
                 raise Exception("Class variables must be declared before subroutines to conform to Jack grammar")
-            elif current_token.content in ('static', 'field'):
+            elif token_id in (STATIC, FIELD):
                 self.compile_class_var_dec()
-                current_token = self._peek()
-            elif current_token.content in ('constructor', 'function', 'method'):
+            elif token_id in (CONSTRUCTOR, FUNCTION, METHOD):
                 self.compile_subroutine_dec()
                 finished_compiling_class_var_dec = True
-                current_token = self._peek()
             else:
-                raise Exception(f"Unknown keyword in class declaration | {current_token.content}")
+                raise Exception(f"Unknown keyword in class declaration | {PRESET_STRINGS[token_id]}")
 
-        self._consume(TokenType.SYMBOL, "}")
+        self._consume(RIGHT_BRACE)
+        self.vmwriter.flush()
 
     def compile_class_var_dec(self):
         """
@@ -62,23 +93,17 @@ class CompilationEngine:
             (static | field ) type varName (, varName)* ;
         :return:
         """
-        symbol_kind: str = self._peek().content  # Should be static or field
-        self._consume(TokenType.KEYWORD, ['static', 'field'])
-        symbol_type: str = self._peek().content
-        self.compile_type()
-        symbol_name: str = self._peek().content
-        self._consume(TokenType.IDENTIFIER)
+        symbol_kind: Kind = Kind.STATIC if self._consume_one_of((STATIC, FIELD)) == STATIC else Kind.FIELD
+        symbol_type: str = self.compile_type()
+        symbol_name: str = self._consume_type(IDENTIFIER_TOKEN)
         self.symbol_table.define(symbol_name, symbol_type, symbol_kind)
 
-        next_token = self._peek()
-        while next_token.match(TokenType.SYMBOL, ','):
-            self._consume(TokenType.SYMBOL, ',')
-            symbol_name: str = self._peek().content
-            self._consume(TokenType.IDENTIFIER)
+        while self._peek() == COMMA:
+            self._consume(COMMA)
+            symbol_name: str = self._consume_type(IDENTIFIER_TOKEN)
             self.symbol_table.define(symbol_name, symbol_type, symbol_kind)
-            next_token = self._peek()
 
-        self._consume(TokenType.SYMBOL, ";")
+        self._consume(SEMICOLON)
 
     def compile_subroutine_dec(self):
         """
@@ -87,29 +112,19 @@ class CompilationEngine:
         :return:
         """
         self.symbol_table.reset_subroutine_vars()
-        subroutine_type: str = self._peek().content
-        if subroutine_type == 'method':
+        subroutine_type: int = self._consume_one_of((CONSTRUCTOR, FUNCTION, METHOD))
+        if subroutine_type == METHOD:
             self.symbol_table.define('this', self.class_name, Kind.ARG)
-        self._consume(TokenType.KEYWORD, ['constructor', 'function', 'method'])
-        next_token: Token = self._peek()
-        subroutine_return_type: str = self._peek().content
-        if next_token.match(TokenType.KEYWORD, 'void'):
-            self._consume(TokenType.KEYWORD, 'void')
+        if self._peek() == VOID:
+            self._consume(VOID)
         else:
             self.compile_type()
-        subroutine_name: str = self._peek().content
-        self._consume(TokenType.IDENTIFIER)
-        self._consume(TokenType.SYMBOL, '(')
+        subroutine_name: str = self._consume_type(IDENTIFIER_TOKEN)
+        self._consume(LEFT_PAREN)
         self.compile_parameter_list()
-        self._consume(TokenType.SYMBOL, ')')
+        self._consume(RIGHT_PAREN)
 
-        if subroutine_type == 'constructor':
-            n_field_args: int = self.symbol_table.var_count(Kind.FIELD)
-            self.vmwriter.write_push(Segment.CONST, n_field_args)
-            self.vmwriter.write_call("Memory.alloc", 1)
-            self.vmwriter.write_pop(Segment.POINTER, 0)
-
-        self.compile_subroutine_body()
+        self.compile_subroutine_body(subroutine_type, subroutine_name)
 
     def compile_parameter_list(self):
         """
@@ -117,40 +132,43 @@ class CompilationEngine:
             ( (type varName) (',' type varName)*)*
         :return:
         """
-        next_token: Token = self._peek()
         # If next token is a right parenthesis, there are no parameters
-        if next_token.match(TokenType.SYMBOL, ')'):
+        if self._peek() == RIGHT_PAREN:
             return
 
-        arg_type: str = self._peek().content
-        self.compile_type()
-        arg_name: str = self._peek().content
-        self._consume(TokenType.IDENTIFIER)
+        arg_type: str = self.compile_type()
+        arg_name: str = self._consume_type(IDENTIFIER_TOKEN)
         self.symbol_table.define(arg_name, arg_type, Kind.ARG)
 
-        next_token: Token = self._peek()
-        while next_token.match(TokenType.SYMBOL, ','):
-            self._consume(TokenType.SYMBOL, ',')
-            arg_type: str = self._peek().content
-            self.compile_type()
-            arg_name: str = self._peek().content
-            self._consume(TokenType.IDENTIFIER)
+        while self._peek() == COMMA:
+            self._consume(COMMA)
+            arg_type: str = self.compile_type()
+            arg_name: str = self._consume_type(IDENTIFIER_TOKEN)
             self.symbol_table.define(arg_name, arg_type, Kind.ARG)
-            next_token = self._peek()
 
-    def compile_subroutine_body(self):
+    def compile_subroutine_body(self, subroutine_type: int, subroutine_name: str):
         """
         Jack grammar
             '{' varDec* statements '}'
+        :param subroutine_type: CONSTRUCTOR, FUNCTION or METHOD
         :return:
         """
-        self._consume(TokenType.SYMBOL, '{')
-        next_token: Token = self._peek()
-        while next_token.match(TokenType.KEYWORD, 'var'):
+        self._consume(LEFT_BRACE)
+        while self._peek() == VAR:
             self.compile_var_dec()
-            next_token = self._peek()
+
+        self.vmwriter.write_function(f"{self.class_name}.{subroutine_name}", self.symbol_table.var_count(Kind.VAR))
+        if subroutine_type == CONSTRUCTOR:
+            n_field_args: int = self.symbol_table.var_count(Kind.FIELD)
+            self.vmwriter.write_push(Segment.CONST, n_field_args)
+            self.vmwriter.write_call("Memory.alloc", 1)
+            self.vmwriter.write_pop(Segment.POINTER, 0)
+        elif subroutine_type == METHOD:
+            self.vmwriter.write_push(Segment.ARG, 0)
+            self.vmwriter.write_pop(Segment.POINTER, 0)
+
         self.compile_statements()
-        self._consume(TokenType.SYMBOL, '}')
+        self._consume(RIGHT_BRACE)
 
     def compile_var_dec(self):
         """
@@ -158,18 +176,15 @@ class CompilationEngine:
             'var' type varName (',' varName)* ';'
         :return:
         """
-        self._consume(TokenType.KEYWORD, 'var')
-        var_type: str = self._peek().content
-        self.compile_type()
-        var_name: str = self._peek().content
-        self._consume(TokenType.IDENTIFIER)
+        self._consume(VAR)
+        var_type: str = self.compile_type()
+        var_name: str = self._consume_type(IDENTIFIER_TOKEN)
         self.symbol_table.define(var_name, var_type, Kind.VAR)
-        while self._peek().match(TokenType.SYMBOL, ','):
-            self._consume(TokenType.SYMBOL, ',')
-            var_name: str = self._peek().content
-            self._consume(TokenType.IDENTIFIER)
+        while self._peek() == COMMA:
+            self._consume(COMMA)
+            var_name: str = self._consume_type(IDENTIFIER_TOKEN)
             self.symbol_table.define(var_name, var_type, Kind.VAR)
-        self._consume(TokenType.SYMBOL, ';')
+        self._consume(SEMICOLON)
 
     def compile_statements(self):
         """
@@ -181,19 +196,19 @@ class CompilationEngine:
         :return:
         """
         while True:
-            match self._peek().content:
-                case 'let':
-                    self.compile_let()
-                case 'if':
-                    self.compile_if()
-                case 'while':
-                    self.compile_while()
-                case 'do':
-                    self.compile_do()
-                case 'return':
-                    self.compile_return()
-                case _:
-                    break
+            token_id: int = self._peek()
+            if token_id == LET:
+                self.compile_let()
+            elif token_id == IF:
+                self.compile_if()
+            elif token_id == WHILE:
+                self.compile_while()
+            elif token_id == DO:
+                self.compile_do()
+            elif token_id == RETURN:
+                self.compile_return()
+            else:
+                break
 
     def compile_let(self):
         """
@@ -201,25 +216,26 @@ class CompilationEngine:
             'let' varName ('[' expression ']')? '=' expression ';'
         :return:
         """
-        self._consume(TokenType.KEYWORD, 'let')
-        var_name: str = self._peek().content
-        var_type: str = self.symbol_table.type_of(var_name)
+        self._consume(LET)
+        var_name: str = self._consume_type(IDENTIFIER_TOKEN)
+        var_kind: Kind = self._kind_of_declared(var_name)
         var_index: int = self.symbol_table.index_of(var_name)
-        self.vmwriter.write_push(var_type, var_index)
-        self._consume(TokenType.IDENTIFIER)
-        if self._peek().match(TokenType.SYMBOL, '['):
-            self._consume(TokenType.SYMBOL, '[')
+        if self._peek() == LEFT_BRACKET:
+            self.vmwriter.write_push(var_kind, var_index)
+            self._consume(LEFT_BRACKET)
+            self._compile_operand(PLUS)
+            self._consume(RIGHT_BRACKET)
+            self._consume(EQUALS)
             self.compile_expression()
-            self._consume(TokenType.SYMBOL, ']')
-            self.vmwriter.write_arithmetic('add')
             self.vmwriter.write_pop(Segment.TEMP, 0)
             self.vmwriter.write_pop(Segment.POINTER, 1)
             self.vmwriter.write_push(Segment.TEMP, 0)
             self.vmwriter.write_pop(Segment.THAT, 0)
-        self._consume(TokenType.SYMBOL, '=')
-        self.compile_expression()
-        self.vmwriter.write_pop(Segment.POINTER, 1)
-        self._consume(TokenType.SYMBOL, ';')
+        else:
+            self._consume(EQUALS)
+            self.compile_expression()
+            self.vmwriter.write_pop(var_kind, var_index)
+        self._consume(SEMICOLON)
 
     def compile_if(self):
         """
@@ -227,18 +243,25 @@ class CompilationEngine:
             'if' '(' expression ')' '{' statements '}' (else '{' statements '}' )?
         :return:
         """
-        self._consume(TokenType.KEYWORD, 'if')
-        self._consume(TokenType.SYMBOL, '(')
-        self.compile_expression()
-        self._consume(TokenType.SYMBOL, ')')
-        self._consume(TokenType.SYMBOL, '{')
+        else_label: str = self._create_label("IF_ELSE")
+        end_label: str = self._create_label("IF_END")
+        self._consume(IF)
+        self._consume(LEFT_PAREN)
+        self._compile_condition(else_label)
+        self._consume(RIGHT_PAREN)
+        self._consume(LEFT_BRACE)
         self.compile_statements()
-        self._consume(TokenType.SYMBOL, '}')
-        if self._peek().match(TokenType.KEYWORD, 'else'):
-            self._consume(TokenType.KEYWORD, 'else')
-            self._consume(TokenType.SYMBOL, '{')
+        self._consume(RIGHT_BRACE)
+        if self._peek() == ELSE:
+            self.vmwriter.write_goto(end_label)
+            self.vmwriter.write_label(else_label)
+            self._consume(ELSE)
+            self._consume(LEFT_BRACE)
             self.compile_statements()
-            self._consume(TokenType.SYMBOL, '}')
+            self._consume(RIGHT_BRACE)
+            self.vmwriter.write_label(end_label)
+        else:
+            self.vmwriter.write_label(else_label)
 
     def compile_while(self):
         """
@@ -246,22 +269,29 @@ class CompilationEngine:
             while '(' expression ')' '{' statements '}'
         :return:
         """
-        self._consume(TokenType.KEYWORD, 'while')
-        self._consume(TokenType.SYMBOL, '(')
-        self.compile_expression()
-        self._consume(TokenType.SYMBOL, ')')
-        self._consume(TokenType.SYMBOL, '{')
+        start_label: str = self._create_label("WHILE_EXP")
+        end_label: str = self._create_label("WHILE_END")
+        self.vmwriter.write_label(start_label)
+        self._consume(WHILE)
+        self._consume(LEFT_PAREN)
+        self._compile_condition(end_label)
+        self._consume(RIGHT_PAREN)
+        self._consume(LEFT_BRACE)
         self.compile_statements()
-        self._consume(TokenType.SYMBOL, '}')
+        self._consume(RIGHT_BRACE)
+        self.vmwriter.write_goto(start_label)
+        self.vmwriter.write_label(end_label)
 
     def compile_do(self):
         """
         jack grammar
-            'do' subroutineCall
+            'do' subroutineCall ';'
         :return:
         """
-        self._consume(TokenType.KEYWORD, 'do')
+        self._consume(DO)
         self.compile_subroutine_call()
+        self.vmwriter.write_pop(Segment.TEMP, 0)
+        self._consume(SEMICOLON)
 
     def compile_return(self):
         """
@@ -269,42 +299,24 @@ class CompilationEngine:
             return expression? ;
         :return:
         """
-        self._consume(TokenType.KEYWORD, 'return')
-        if not self._peek().match(TokenType.SYMBOL, ';'):
+        self._consume(RETURN)
+        if self._peek() != SEMICOLON:
             self.compile_expression()
-        self._consume(TokenType.SYMBOL, ';')
+        else:
+            self.vmwriter.write_push(Segment.CONST, 0)
+        self.vmwriter.write_return()
+        self._consume(SEMICOLON)
 
     def compile_expression(self):
         """
         Jack Grammar
             term (op term)*
+        Leaves the value of the expression on the stack
         :return:
         """
-        OP_SYMBOLS = ['+', '-', '*', '/', '&', '|', '<', '>', '=']
-        self.compile_term()
-        op_symbol: Token = self._peek()
-        if op_symbol.content in OP_SYMBOLS:
-            self._consume(TokenType.SYMBOL, OP_SYMBOLS)
-            self.compile_term()
-            match op_symbol.content:
-                case '+':
-                    self.vmwriter.write_arithmetic('add')
-                case '-':
-                    self.vmwriter.write_arithmetic('sub')
-                case '*':
-                    self.vmwriter.write_call('Math.multiply', 2)
-                case '/':
-                    self.vmwriter.write_call('Math.divide', 2)
-                case '&':
-                    self.vmwriter.write_arithmetic('and')
-                case '|':
-                    self.vmwriter.write_arithmetic('or')
-                case '<':
-                    self.vmwriter.write_arithmetic('lt')
-                case '>':
-                    self.vmwriter.write_arithmetic('gt')
-                case '=':
-                    self.vmwriter.write_arithmetic('eq')
+        value: Optional[int] = self._compile_folded_expression()
+        if value is not None:
+            self._write_constant(value)
 
     def compile_term(self):
         """
@@ -317,90 +329,219 @@ class CompilationEngine:
             subroutineCall
             '(' expression ')'
             unaryOp term
+        Leaves the value of the term on the stack
         :return:
         """
-        token: Token = self._peek()
-        match token.type:
-            case TokenType.INT_CONST:
-                self._consume(TokenType.INT_CONST)
-                self.vmwriter.write_push(Segment.CONST, int(token.content))
-            case TokenType.STRING_CONST:
-                self._consume(TokenType.STRING_CONST)
-                self.vmwriter.write_push(Segment.CONST, len(token.content))
-                self.vmwriter.write_call('String.new')
-                for char in token.content:
-                    self.vmwriter.write_push(Segment.CONST, ord(char))
-                    self.vmwriter.write_call('String.appendChar', 2)
-
-            case TokenType.KEYWORD:
-                self._consume(TokenType.KEYWORD, ['true', 'false', 'null', 'this'])
-                match token.content:
-                    case 'true':
-                        self.vmwriter.write_push(Segment.CONST, 1)
-                        self.vmwriter.write_call('neg', 1)
-                    case 'false':
-                        self.vmwriter.write_push(Segment.CONST, 0)
-                    case 'null':
-                        self.vmwriter.write_push(Segment.CONST, 0)
-                    case 'this':
-                        self.vmwriter.write_push(Segment.POINTER, 0)
-                    case _:
-                        raise Exception
-
-            case TokenType.SYMBOL:
-                if self._peek().content == '(':
-                    #compile parenth expression
-                    self._consume(TokenType.SYMBOL, '(')
-                    self.compile_expression()
-                    self._consume(TokenType.SYMBOL, ')')
-                else:
-                    #compile unaryOp term
-                    self._consume(TokenType.SYMBOL, ['-', '~'])
-                    self.vmwriter.write_call('neg', -1)
-            case TokenType.IDENTIFIER:
-                self._consume(TokenType.IDENTIFIER)
-                var_kind = self.symbol_table.kind_of(token.content)
-                if not var_kind:
-                    raise Exception("Variable referenced before declaration")
-                var_index = self.symbol_table.index_of(token.content)
-                self.vmwriter.write_push(var_kind, var_index)
-
-                if self._peek().content in ['(', '.']:
-                    self.compile_subroutine_call()
-                elif self._peek().match(TokenType.SYMBOL, '['):
-                    self._consume(TokenType.SYMBOL, '[')
-                    self.compile_expression()
-                    self._consume(TokenType.SYMBOL, ']')
-                    self.vmwriter.write_arithmetic('add')
-                    self.vmwriter.write_pop(Segment.TEMP, 0)
-                    self.vmwriter.write_pop(Segment.POINTER, 1)
-                    self.vmwriter.write_push(Segment.TEMP, 0)
-                    self.vmwriter.write_pop(Segment.THAT, 0)
-
-    def compile_expression_list(self):
+        value: Optional[int] = self._compile_folded_term()
+        if value is not None:
+            self._write_constant(value)
+
+    def _compile_folded_expression(self) -> Optional[int]:
+        """
+        Compiles an expression, evaluating the parts made only of constants at compile time.
+        Jack has no operator precedence, so the value so far is always the left operand of the next operator.
+        :return: the value of the expression if it is constant, in which case no code was written for it;
+            otherwise None and the code leaves the value on the stack
+        """
+        left: Optional[int] = self._compile_folded_term()
+        operator: int = self._peek()
+        while operator in OPERATORS:
+            self.cursor.index += 1
+            right: Optional[int] = self._compile_folded_term()
+            if left is None and right is None:
+                self._write_operator(operator)
+            elif left is None:
+                self._write_operator_with_constant(operator, right)
+            elif right is None:
+                # only the right operand is on the stack, the constant left operand has to go to its other side
+                self._write_constant_operator(left, operator)
+                left = None
+            else:
+                left_value: int = left
+                left = fold_binary(operator, left_value, right)
+                if left is None:
+                    self._write_constant(left_value)
+                    self._write_constant(right)
+                    self._write_operator(operator)
+            operator = self._peek()
+        return left
+
+    def _compile_folded_term(self) -> Optional[int]:
+        """
+        Compiles a term like _compile_folded_expression: constant terms return their value and write no code
+        :return: Optional[int]
+        """
+        token_type: int = self._peek_type()
+        if token_type == INT_CONST_TOKEN:
+            return int(self._consume_type(INT_CONST_TOKEN))
+        elif token_type == STRING_CONST_TOKEN:
+            string: str = self._consume_type(STRING_CONST_TOKEN)
+            self.vmwriter.write_push(Segment.CONST, len(string))
+            self.vmwriter.write_call('String.new', 1)
+            for char in string:
+                self.vmwriter.write_push(Segment.CONST, ord(char))
+                self.vmwriter.write_call('String.appendChar', 2)
+
+        elif token_type == KEYWORD_TOKEN:
+            keyword: int = self._consume_one_of((TRUE, FALSE, NULL, THIS))
+            if keyword == TRUE:
+                return TRUE_VALUE
+            elif keyword == THIS:
+                self.vmwriter.write_push(Segment.POINTER, 0)
+            else:
+                return FALSE_VALUE
+
+        elif token_type == SYMBOL_TOKEN:
+            if self._peek() == LEFT_PAREN:
+                #compile parenth expression
+                self._consume(LEFT_PAREN)
+                value: Optional[int] = self._compile_folded_expression()
+                self._consume(RIGHT_PAREN)
+                return value
+            else:
+                #compile unaryOp term
+                unary_op: int = self._consume_one_of((MINUS, TILDE))
+                value: Optional[int] = self._compile_folded_term()
+                if value is not None:
+                    return fold_unary(unary_op, value)
+                self.vmwriter.write_arithmetic('neg' if unary_op == MINUS else 'not')
+        elif token_type == IDENTIFIER_TOKEN:
+            cursor: TokenCursor = self.cursor
+            if cursor.index + 1 < len(cursor.ids) and cursor.ids[cursor.index + 1] in (LEFT_PAREN, DOT):
+                self.compile_subroutine_call()
+                return None
+
+            var_name: str = self._consume_type(IDENTIFIER_TOKEN)
+            self.vmwriter.write_push(self._kind_of_declared(var_name), self.symbol_table.index_of(var_name))
+            if self._peek() == LEFT_BRACKET:
+                self._consume(LEFT_BRACKET)
+                self._compile_operand(PLUS)
+                self._consume(RIGHT_BRACKET)
+                self.vmwriter.write_pop(Segment.POINTER, 1)
+                self.vmwriter.write_push(Segment.THAT, 0)
+        return None
+
+    def _compile_operand(self, operator: int):
+        """
+        Compiles the expression that is the right operand of operator, whose left operand is on the stack
+        """
+        value: Optional[int] = self._compile_folded_expression()
+        if value is None:
+            self._write_operator(operator)
+        else:
+            self._write_operator_with_constant(operator, value)
+
+    def _compile_condition(self, false_label: str):
+        """
+        Compiles the condition of an if or while statement and jumps to false_label if it is false.
+        A constant condition writes either nothing or an unconditional jump.
+        """
+        value: Optional[int] = self._compile_folded_expression()
+        if value is None:
+            self.vmwriter.write_arithmetic('not')
+            self.vmwriter.write_if(false_label)
+        elif value == FALSE_VALUE:
+            self.vmwriter.write_goto(false_label)
+
+    def _write_constant(self, value: int):
+        """
+        Pushes a signed 16 bit constant, push constant only takes 0 to 32767
+        """
+        if value >= 0:
+            self.vmwriter.write_push(Segment.CONST, value)
+        elif value == TRUE_VALUE:
+            self.vmwriter.write_push(Segment.CONST, 0)
+            self.vmwriter.write_arithmetic('not')
+        elif value == -0x8000:
+            self.vmwriter.write_push(Segment.CONST, 0x7FFF)
+            self.vmwriter.write_arithmetic('not')
+        else:
+            self.vmwriter.write_push(Segment.CONST, -value)
+            self.vmwriter.write_arithmetic('neg')
+
+    def _write_operator(self, operator: int):
+        """
+        Applies operator to the two values on top of the stack
+        """
+        command: str = OPERATORS[operator]
+        if '.' in command:
+            self.vmwriter.write_call(command, 2)
+        else:
+            self.vmwriter.write_arithmetic(command)
+
+    def _write_operator_with_constant(self, operator: int, value: int):
+        """
+        Applies operator to the value on the stack and the constant right operand value.
+        Operations with their identity element write nothing, multiplications by small powers of two
+        are doubled with add instead of calling Math.multiply.
+        """
+        if (operator in (PLUS, MINUS, PIPE) and value == 0) or (operator in (ASTERISK, SLASH) and value == 1) \
+                or (operator == AMPERSAND and value == TRUE_VALUE):
+            return
+        if operator in (ASTERISK, SLASH) and value == -1:
+            self.vmwriter.write_arithmetic('neg')
+        elif operator == ASTERISK and value == 0:
+            # x * 0 still evaluates x for its side effects, x & 0 replaces it by 0
+            self.vmwriter.write_push(Segment.CONST, 0)
+            self.vmwriter.write_arithmetic('and')
+        elif operator == ASTERISK and doublings(value) is not None:
+            for _ in range(doublings(value)):
+                self.vmwriter.write_pop(Segment.TEMP, 0)
+                self.vmwriter.write_push(Segment.TEMP, 0)
+                self.vmwriter.write_push(Segment.TEMP, 0)
+                self.vmwriter.write_arithmetic('add')
+            if value < 0:
+                self.vmwriter.write_arithmetic('neg')
+        elif operator in (PLUS, MINUS) and -0x8000 < value < 0:
+            self.vmwriter.write_push(Segment.CONST, -value)
+            self.vmwriter.write_arithmetic('sub' if operator == PLUS else 'add')
+        else:
+            self._write_constant(value)
+            self._write_operator(operator)
+
+    def _write_constant_operator(self, value: int, operator: int):
+        """
+        Applies operator to the constant left operand value and the right operand on the stack
+        """
+        if operator in (PLUS, ASTERISK, AMPERSAND, PIPE, EQUALS):
+            self._write_operator_with_constant(operator, value)
+        elif operator == MINUS:
+            self.vmwriter.write_arithmetic('neg')
+            self._write_operator_with_constant(PLUS, value)
+        else:
+            # c < x is not x > c on the Hack CPU: lt and gt test the sign of the wrapped difference, which is
+            # -32768 both ways round when c - x overflows, so comparisons keep their operand order
+            self.vmwriter.write_pop(Segment.TEMP, 0)
+            self._write_constant(value)
+            self.vmwriter.write_push(Segment.TEMP, 0)
+            self._write_operator(operator)
+
+    def compile_expression_list(self) -> int:
         """
         Jack Grammar
             (expression (',' expression)* )?
         :return:
         """
-        if self._peek().match(TokenType.SYMBOL, ')'):
-            return
+        if self._peek() == RIGHT_PAREN:
+            return 0
         self.compile_expression()
-        while self._peek().match(TokenType.SYMBOL, ','):
-            self._consume(TokenType.SYMBOL, ',')
+        n_expressions: int = 1
+        while self._peek() == COMMA:
+            self._consume(COMMA)
             self.compile_expression()
+            n_expressions += 1
+        return n_expressions
 
 
-    def compile_type(self):
+    def compile_type(self) -> str:
         """
         Jack grammar of type
             int | char | boolean | className
-        :return:
+        :return: the name of the type
         """
-        if self._peek().type == TokenType.KEYWORD:
-            self._consume(TokenType.KEYWORD, ['int', 'char', 'boolean'])
-        else:
-            self._consume(TokenType.IDENTIFIER)
+        if self._peek_type() == KEYWORD_TOKEN:
+            return PRESET_STRINGS[self._consume_one_of((INT, CHAR, BOOLEAN))]
+        return self._consume_type(IDENTIFIER_TOKEN)
 
     def compile_subroutine_call(self):
         """
@@ -409,39 +550,92 @@ class CompilationEngine:
             (className | varName) '.' subroutineName '(' expressionList ')'
         :return:
         """
-        self._consume(TokenType.IDENTIFIER)
-        if self._peek().match(TokenType.SYMBOL, '.'):
-            self._consume(TokenType.SYMBOL, '.')
-            self._consume(TokenType.IDENTIFIER)
-        self._consume(TokenType.SYMBOL, '(')
-        self.compile_expression_list()
-        self._consume(TokenType.SYMBOL, ')')
+        name: str = self._consume_type(IDENTIFIER_TOKEN)
+        n_args: int = 0
+        if self._peek() == DOT:
+            self._consume(DOT)
+            subroutine_name: str = self._consume_type(IDENTIFIER_TOKEN)
+            var_kind: Optional[Kind] = self.symbol_table.kind_of(name)
+            if var_kind:
+                # method call on an object: the object is the hidden first argument
+                self.vmwriter.write_push(var_kind, self.symbol_table.index_of(name))
+                full_name: str = f"{self.symbol_table.type_of(name)}.{subroutine_name}"
+                n_args = 1
+            else:
+                full_name: str = f"{name}.{subroutine_name}"
+        else:
+            # method of the current class called on this
+            self.vmwriter.write_push(Segment.POINTER, 0)
+            full_name: str = f"{self.class_name}.{name}"
+            n_args = 1
+        self._consume(LEFT_PAREN)
+        n_args += self.compile_expression_list()
+        self._consume(RIGHT_PAREN)
+        self.vmwriter.write_call(full_name, n_args)
 
-    def _consume(self, type: TokenType, content: Optional = None) -> None:
+    def _consume(self, token_id: int) -> None:
         """
-        Consumes the next token expecting it to be of type with content.
-
-        content accepted as a list or string
+        Consumes the next token expecting it to be the keyword or symbol token_id.
 
         Raises the token index if successfully conforms to grammar
         Raises Exception if token is not as expected
         """
-        token: Token = self.token_list[self.token_index]
-        if isinstance(content, str):
-            is_expected_token: bool = token.match(type, content)
-        elif isinstance(content, list):
-            is_expected_token: bool = token.type == type and token.content in content
-        else:
-            is_expected_token: bool = token.type == type
+        cursor: TokenCursor = self.cursor
+        if cursor.index >= len(cursor.ids) or cursor.ids[cursor.index] != token_id:
+            self._unexpected(f"'{PRESET_STRINGS[token_id]}'")
+        cursor.index += 1
 
-        if not is_expected_token:
-            raise Exception("Does not conform to Jack grammar")
+    def _consume_one_of(self, token_ids: Tuple[int, ...]) -> int:
+        """
+        Consumes the next token expecting it to be one of the keywords or symbols token_ids
+        :return: the id of the consumed token
+        """
+        cursor: TokenCursor = self.cursor
+        if cursor.index >= len(cursor.ids) or cursor.ids[cursor.index] not in token_ids:
+            self._unexpected(" or ".join(f"'{PRESET_STRINGS[token_id]}'" for token_id in token_ids))
+        cursor.index += 1
+        return cursor.ids[cursor.index - 1]
 
-        self.token_index += 1
+    def _consume_type(self, token_type: int) -> str:
+        """
+        Consumes the next token expecting it to be of token_type
+        :return: the content of the consumed token
+        """
+        cursor: TokenCursor = self.cursor
+        if cursor.index >= len(cursor.types) or cursor.types[cursor.index] != token_type:
+            self._unexpected(TOKEN_TYPES[token_type].value)
+        cursor.index += 1
+        return cursor.strings[cursor.ids[cursor.index - 1]]
+
+    def _unexpected(self, expected: str):
+        raise Exception(f"Does not conform to Jack grammar | expected {expected}, got {self.cursor.describe()}")
+
+    def _kind_of_declared(self, name: str) -> Kind:
+        """
+        Returns the kind of a variable, raising if it was never declared
+        """
+        var_kind: Optional[Kind] = self.symbol_table.kind_of(name)
+        if not var_kind:
+            raise Exception(f"Variable referenced before declaration | {name}")
+        return var_kind
+
+    def _create_label(self, prefix: str) -> str:
+        label: str = f"{prefix}{self.label_number}"
+        self.label_number += 1
+        return label
+
+    def _peek(self) -> int:
+        """
+        Returns the id of the current token without advancing, -1 at the end of the stream
+        :return: int
+        """
+        cursor: TokenCursor = self.cursor
+        return cursor.ids[cursor.index] if cursor.index < len(cursor.ids) else -1
 
-    def _peek(self) -> Token:
+    def _peek_type(self) -> int:
         """
-        Returns the current token without advancing the index of current token
-        :return: Token
+        Returns the type of the current token without advancing, -1 at the end of the stream
+        :return: int
         """
-        return self.token_list[self.token_index]
+        cursor: TokenCursor = self.cursor
+        return cursor.types[cursor.index] if cursor.index < len(cursor.types) else -1
@@ -0,0 +1,83 @@
+from typing import Optional
+
+from jackanalyzer.tokenstream import (
+    PLUS, MINUS, ASTERISK, SLASH, AMPERSAND, PIPE, LESS_THAN, GREATER_THAN, EQUALS,
+)
+
+# Jack booleans
+TRUE_VALUE: int = -1
+FALSE_VALUE: int = 0
+
+# Multiplications by up to 2 ** MAX_DOUBLINGS are compiled to additions, larger ones still call Math.multiply
+# because every doubling costs about as much ROM as the call
+MAX_DOUBLINGS: int = 4
+
+
+def to_word(value: int) -> int:
+    """
+    Wraps value to a signed 16 bit Hack word
+    :param value: int
+    :return: int in [-32768, 32767]
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+def fold_unary(operator: int, value: int) -> int:
+    """
+    Evaluates a unary operator on a constant
+    :param operator: MINUS or TILDE
+    :param value: signed 16 bit value
+    :return: int
+    """
+    return to_word(-value) if operator == MINUS else ~value
+
+
+def fold_binary(operator: int, left: int, right: int) -> Optional[int]:
+    """
+    Evaluates a binary operator on two constants like the Hack VM and the OS do at run time.
+    Returns None for the divisions that are left to Math.divide: by zero, which is a run time error,
+    and of -32768, whose absolute value the OS cannot represent. Returns None as well for < and > when left - right
+    overflows 16 bits: the translated VM code compares the sign of the wrapped difference, e.g. 20000 < -20000
+    is true on the Hack CPU, so such comparisons are left to run time.
+    :param operator: token id of the operator
+    :param left: signed 16 bit value
+    :param right: signed 16 bit value
+    :return: Optional[int]
+    """
+    if operator == PLUS:
+        return to_word(left + right)
+    elif operator == MINUS:
+        return to_word(left - right)
+    elif operator == ASTERISK:
+        return to_word(left * right)
+    elif operator == SLASH:
+        if right == 0 or left == -0x8000 or right == -0x8000:
+            return None
+        quotient: int = abs(left) // abs(right)
+        return quotient if (left < 0) == (right < 0) else -quotient
+    elif operator == AMPERSAND:
+        return left & right
+    elif operator == PIPE:
+        return left | right
+    elif operator in (LESS_THAN, GREATER_THAN) and to_word(left - right) != left - right:
+        return None
+    elif operator == LESS_THAN:
+        return TRUE_VALUE if left < right else FALSE_VALUE
+    elif operator == GREATER_THAN:
+        return TRUE_VALUE if left > right else FALSE_VALUE
+    elif operator == EQUALS:
+        return TRUE_VALUE if left == right else FALSE_VALUE
+    raise Exception(f"Unknown binary operator | {operator}")
+
+
+def doublings(value: int) -> Optional[int]:
+    """
+    Returns k if the absolute value of value is 2 ** k with 1 <= k <= MAX_DOUBLINGS, else None
+    :param value: int
+    :return: Optional[int]
+    """
+    magnitude: int = abs(value)
+    if magnitude < 2 or magnitude & (magnitude - 1):
+        return None
+    k: int = magnitude.bit_length() - 1
+    return k if k <= MAX_DOUBLINGS else None
@@ -1,21 +1,125 @@
-# 2. create an output file named filename.xml and prepare it for writing
+# 1. tokenize the input .jack file with the jacktokenizer
+# 2. create an output file named filename.vm and prepare it for writing
 # 3. create and use compilation enginge to compile input from jacktokenizer into the output file
-from sys import argv
+import argparse
+import io
+import sys
 
-from jackanalyzer.compilationengine import CompilationEngine
-from jackanalyzer.jacktokenizer import JackTokenizer
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, TextIO, TypedDict, Optional, Callable
 
+from jackanalyzer.compilationengine import CompilationEngine, Token
+from jackanalyzer.jacktokenizer import JackTokenizer, scan_file
+from jackanalyzer.tokenstream import TokenStream, token_stream
+from vmtranslator.commands import VMCommand
 
-def jack_analyzer():
-    input_path = argv[1]
-    output_path = input_path.replace(".jack", ".vm")
-    input_file = open(input_path)
+
+def tokenize(input_file: TextIO) -> List[Token]:
+    """
+    Scans the whole input with the regex scanner and returns its tokens in order
+    :param input_file: TextIO
+    :return: List[Token]
+    """
+    return [Token(token_type, text) for token_type, text, line, column in scan_file(input_file)]
+
+
+def legacy_tokenize(input_file: TextIO) -> List[Token]:
+    """
+    Runs the character by character JackTokenizer over the whole input and returns its tokens in order
+    :param input_file: TextIO
+    :return: List[Token]
+    """
     jack_tokenizer = JackTokenizer(input_file)
-    tokens = []  # Build from jack_tokenizer
-    output_file = open(output_path)
+    tokens: List[Token] = []
+    jack_tokenizer.advance()
+    while jack_tokenizer.has_more_tokens():
+        tokens.append(Token(jack_tokenizer.token_type(), jack_tokenizer.string_val()))
+        jack_tokenizer.advance()
+    return tokens
+
+
+def compile_class(input_file: TextIO, output_file: TextIO) -> None:
+    """
+    Compiles the single Jack class in input_file into VM commands written to output_file
+    :param input_file: TextIO
+    :param output_file: TextIO
+    :return: None
+    """
+    tokens: TokenStream = token_stream(scan_file(input_file))
     compilation_engine = CompilationEngine(input_file, output_file, tokens)
     compilation_engine.compile_class()
 
 
+def compile_commands(input_file: TextIO, command_sink: Callable[[VMCommand], None]) -> None:
+    """
+    Compiles the single Jack class in input_file and passes its VM commands to command_sink as tuples,
+    e.g. to vmtranslator.main.write_vm_command, so the VM code is never written or parsed as text
+    :param input_file: TextIO
+    :param command_sink: Callable[[VMCommand], None]
+    :return: None
+    """
+    tokens: TokenStream = token_stream(scan_file(input_file))
+    compilation_engine = CompilationEngine(input_file, None, tokens, command_sink)
+    compilation_engine.compile_class()
+
+
+class CompileResult(TypedDict):
+    path: str
+    vm: Optional[str]
+    error: Optional[str]
+
+
+def compile_file(jack_file: Path) -> CompileResult:
+    """
+    Compiles one .jack file in memory. Errors are returned as a diagnostic instead of raised,
+    so one bad class does not hide the diagnostics of the others.
+    :param jack_file: Path
+    :return: CompileResult
+    """
+    output_file = io.StringIO()
+    try:
+        with open(jack_file) as input_file:
+            compile_class(input_file, output_file)
+    except Exception as exception:
+        return {'path': str(jack_file), 'vm': None, 'error': f"{jack_file}: {exception}"}
+    return {'path': str(jack_file), 'vm': output_file.getvalue(), 'error': None}
+
+
+def compile_project(jack_files: List[Path], jobs: Optional[int] = None) -> List[CompileResult]:
+    """
+    Compiles every class in a worker process, one tokenizer and compilation engine per file.
+    Results are returned in the order of jack_files whichever worker finishes first.
+    :param jack_files: List[Path]
+    :param jobs: number of worker processes, None for one per core, 1 to compile in this process
+    :return: List[CompileResult]
+    """
+    if jobs == 1 or len(jack_files) < 2:
+        return [compile_file(jack_file) for jack_file in jack_files]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(compile_file, jack_files))
+
+
+def jack_analyzer():
+    argument_parser = argparse.ArgumentParser(description="Compiles Jack classes into VM code")
+    argument_parser.add_argument("path", help="a .jack file or a directory of .jack files")
+    argument_parser.add_argument("--jobs", type=int, default=None,
+                                 help="worker processes, defaults to one per core")
+    arguments = argument_parser.parse_args()
+
+    input_path: Path = Path(arguments.path)
+    jack_files: List[Path] = sorted(input_path.glob("*.jack")) if input_path.is_dir() else [input_path]
+    results: List[CompileResult] = compile_project(jack_files, arguments.jobs)
+
+    errors: List[str] = [result['error'] for result in results if result['error']]
+    for result in results:
+        if result['vm'] is not None:
+            Path(result['path']).with_suffix(".vm").write_text(result['vm'])
+    for error in errors:
+        print(error, file=sys.stderr)
+    if errors:
+        sys.exit(f"{len(errors)} of {len(results)} classes failed to compile")
+
+
 if __name__ == "__main__":
     jack_analyzer()
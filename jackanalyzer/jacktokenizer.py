@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import TextIO, List, Callable
+from typing import TextIO, List, Callable, Iterator, Tuple, Pattern, FrozenSet
 import re
 
 
@@ -48,7 +48,7 @@ SYMBOLS = [
     ']',
     '.',
     ',',
-    '; ',
+    ';',
     '+',
     '-',
     '*',
@@ -61,6 +61,66 @@ SYMBOLS = [
     '~',
 ]
 
+KEYWORD_SET: FrozenSet[str] = frozenset(KEYWORDS)
+
+# One alternative per token class, tried in this order at every position of the source.
+# Comments come before symbols so that / only matches when it does not start a comment;
+# a block comment without its closing */ runs to the end of the source like in JackTokenizer.
+TOKEN_PATTERN: Pattern = re.compile(
+    r"(?P<newline>\n)"
+    r"|(?P<space>[ \t\r\f\v]+)"
+    r"|(?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))"
+    r"|(?P<SYMBOL>[" + re.escape("".join(SYMBOLS)) + r"])"
+    r"|(?P<INT_CONST>\d+)"
+    r'|"(?P<STRING_CONST>[^"\n]*)"'
+    r"|(?P<word>[A-Za-z_]\w*)"
+    r"|(?P<error>.)",
+    re.DOTALL | re.ASCII,
+)
+
+# (token type, text, line, column), line and column start at 1; string constants come without their quotes
+ScannedToken = Tuple[TokenType, str, int, int]
+
+
+def scan(source: str) -> Iterator[ScannedToken]:
+    """
+    Scans a whole Jack source with TOKEN_PATTERN and lazily yields its tokens.
+    :param source: contents of a .jack file
+    :return: Iterator[ScannedToken]
+    """
+    line: int = 1
+    line_start: int = 0
+    for match in TOKEN_PATTERN.finditer(source):
+        kind: str = match.lastgroup
+        if kind == "word":
+            word: str = match.group()
+            yield (TokenType.KEYWORD if word in KEYWORD_SET else TokenType.IDENTIFIER,
+                   word, line, match.start() - line_start + 1)
+        elif kind == "SYMBOL" or kind == "INT_CONST":
+            yield TokenType[kind], match.group(), line, match.start() - line_start + 1
+        elif kind == "newline":
+            line += 1
+            line_start = match.end()
+        elif kind == "STRING_CONST":
+            yield TokenType.STRING_CONST, match.group(kind), line, match.start() - line_start + 1
+        elif kind == "comment":
+            newlines: int = match.group().count("\n")
+            if newlines:
+                line += newlines
+                line_start = source.rindex("\n", match.start(), match.end()) + 1
+        elif kind == "error":
+            raise Exception(f"Unexpected character in Jack source | {match.group()!r} at line {line}, "
+                            f"column {match.start() - line_start + 1}")
+
+
+def scan_file(input_file: TextIO) -> Iterator[ScannedToken]:
+    """
+    Reads the whole file at once and scans it, see scan
+    :param input_file: TextIO
+    :return: Iterator[ScannedToken]
+    """
+    return scan(input_file.read())
+
 
 class JackTokenizer:
     input_file: TextIO
@@ -72,6 +132,8 @@ class JackTokenizer:
 
     def __init__(self, input_file: TextIO):
         self.input_file = input_file
+        self._current_line = input_file.readline()
+        self._current_line_index = 0
 
     def has_more_tokens(self) -> bool:
         return not self._eof
@@ -93,16 +155,19 @@ class JackTokenizer:
             token: str = self._builds_token_and_sets_index(starting_character, matcher)
             self._set_current_token(token, TokenType.INT_CONST)
         elif starting_character == '"':
-            matcher: Callable = lambda x: x != '"'
-            token: str = self._builds_token_and_sets_index(starting_character, matcher)
+            end_index: int = self._current_line.index('"', self._current_line_index + 1)
+            token: str = self._current_line[self._current_line_index + 1:end_index]
+            self._current_line_index = end_index + 1
             self._set_current_token(token, TokenType.STRING_CONST)
-        elif starting_character.isalpha():
-            matcher: Callable = lambda x: re.match("^[a-zA-Z0-9_]*$", x)
+        elif starting_character.isalpha() or starting_character == "_":
+            matcher: Callable = lambda x: re.match("^[a-zA-Z0-9_]$", x)
             token: str = self._builds_token_and_sets_index(starting_character, matcher)
             if token in KEYWORDS:
                 self._set_current_token(token, TokenType.KEYWORD)
             else:
                 self._set_current_token(token, TokenType.IDENTIFIER)
+        else:
+            raise Exception(f"Unexpected character in Jack source | {starting_character}")
 
     def token_type(self) -> TokenType:
         return self._current_token_type
@@ -129,37 +194,39 @@ class JackTokenizer:
     def _builds_token_and_sets_index(self, starting_character: str, matcher: Callable):
         token: str = starting_character
         index: int = self._current_line_index + 1
-        next_character: str = self._current_line[index]
 
-        while matcher(next_character):
-            starting_character += next_character
+        while index < len(self._current_line) and matcher(self._current_line[index]):
+            token += self._current_line[index]
             index += 1
-            next_character = self._current_line[index]
 
-        self._current_line_index = index - 1
+        self._current_line_index = index
         return token
 
     def _get_starting_character(self):
-        try:
-            char: str = self._current_line[self._current_line_index]
-        except IndexError:
-            raise EOFReached
+        if self._current_line_index >= len(self._current_line):
+            self._current_line = self.input_file.readline()
+            self._current_line_index = 0
+            if not self._current_line:
+                raise EOFReached
+            return self._get_starting_character()
+
+        char: str = self._current_line[self._current_line_index]
+        next_char: str = self._current_line[self._current_line_index + 1:self._current_line_index + 2]
 
         if char.isspace():
             self._current_line_index += 1
             return self._get_starting_character()
-        elif char == "\\":
-            self._current_line = self.input_file.readline()
-            self._current_line_index = 0
+        elif char == "/" and next_char == "/":
+            self._current_line_index = len(self._current_line)
             return self._get_starting_character()
-        elif char == "/":
-            if self._current_line[self._current_line_index + 1] == "/":
+        elif char == "/" and next_char == "*":
+            comment_end: int = self._current_line.find("*/", self._current_line_index + 2)
+            while comment_end == -1:
                 self._current_line = self.input_file.readline()
-                self._current_line_index = 0
-                return self._get_starting_character()
-            else:
-                next_index_location = self._current_line[self._current_line_index:].index("*/") + 2
-                self._current_line_index = next_index_location
-                return self._get_starting_character()
+                if not self._current_line:
+                    raise EOFReached
+                comment_end = self._current_line.find("*/")
+            self._current_line_index = comment_end + 2
+            return self._get_starting_character()
         else:
             return char
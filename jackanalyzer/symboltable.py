@@ -1,12 +1,12 @@
 from enum import Enum
-from typing import Optional, Literal, TypedDict, Dict
+from typing import Optional, Literal, Dict
 
 
-class Kind(Enum, str):
-    STATIC = 'static',
-    FIELD = 'this',
-    ARG = 'arg',
-    VAR = 'local',
+class Kind(str, Enum):
+    STATIC = 'static'
+    FIELD = 'this'
+    ARG = 'argument'
+    VAR = 'local'
 
 
 KIND = Literal[
@@ -17,17 +17,35 @@ KIND = Literal[
 ]
 
 
-class Symbol(TypedDict):
+# Kinds whose identifiers live as long as the class, the others only for one subroutine
+CLASS_KINDS = (Kind.STATIC, Kind.FIELD)
+
+
+class Symbol:
+    __slots__ = ("type", "kind", "index")
     type: str
-    kind: str
+    kind: Kind
     index: int
 
+    def __init__(self, type_: str, kind: Kind, index: int):
+        self.type = type_
+        self.kind = kind
+        self.index = index
+
 
 class SymbolTable:
-    table: Dict[str, Symbol]
+    """
+    Class scope and subroutine scope in two dicts, with a running count per kind.
+    Names are looked up in the subroutine scope first, so locals and arguments shadow fields and statics.
+    """
+    class_scope: Dict[str, Symbol]
+    subroutine_scope: Dict[str, Symbol]
+    counts: Dict[Kind, int]
 
     def __init__(self):
-        self.table = {}
+        self.class_scope = {}
+        self.subroutine_scope = {}
+        self.counts = {kind: 0 for kind in Kind}
 
     def define(self, name: str, type_: str, kind: KIND) -> None:
         """
@@ -41,8 +59,9 @@ class SymbolTable:
         :param kind:
         :return: None
         """
-        index: int = len([x for x in self.table.values() if x['kind'] == kind and x['type'] == type_])
-        self.table[name] = {'type': type_, 'kind': kind, 'index': index}
+        scope: Dict[str, Symbol] = self.class_scope if kind in CLASS_KINDS else self.subroutine_scope
+        scope[name] = Symbol(type_, kind, self.counts[kind])
+        self.counts[kind] += 1
 
     def var_count(self, kind: KIND) -> int:
         """
@@ -50,20 +69,20 @@ class SymbolTable:
         :param kind:
         :return: int
         """
-        return len([x for x in self.table.values() if x['kind'] == kind])
+        return self.counts[kind]
 
-    def kind_of(self, name: str) -> Optional[str]:
+    def kind_of(self, name: str) -> Optional[Kind]:
         """
         Returns the kind of the named identifier in the current scope.
         If the identfier is unknown in the current scope, returns None
         :param name:
         :return:
         """
-        symbol: Optional[Symbol] = self.table.get(name, None)
+        symbol: Optional[Symbol] = self._lookup(name)
         if not symbol:
             return None
 
-        return symbol['kind']
+        return symbol.kind
 
     def type_of(self, name: str) -> Optional[str]:
         """
@@ -71,11 +90,11 @@ class SymbolTable:
         :param name:
         :return:
         """
-        symbol: Optional[Symbol] = self.table.get(name, None)
+        symbol: Optional[Symbol] = self._lookup(name)
         if not symbol:
             return None
 
-        return symbol['type']
+        return symbol.type
 
     def index_of(self, name: str) -> Optional[int]:
         """
@@ -83,11 +102,23 @@ class SymbolTable:
         :param name:
         :return:
         """
-        symbol: Optional[Symbol] = self.table.get(name, None)
+        symbol: Optional[Symbol] = self._lookup(name)
         if not symbol:
             return None
 
-        return symbol['index']
+        return symbol.index
 
     def reset_subroutine_vars(self):
-        pass
+        """
+        Starts a new subroutine scope, dropping the ARG and VAR identifiers of the previous subroutine
+        :return:
+        """
+        self.subroutine_scope = {}
+        self.counts[Kind.ARG] = 0
+        self.counts[Kind.VAR] = 0
+
+    def _lookup(self, name: str) -> Optional[Symbol]:
+        symbol: Optional[Symbol] = self.subroutine_scope.get(name)
+        if symbol is None:
+            symbol = self.class_scope.get(name)
+        return symbol
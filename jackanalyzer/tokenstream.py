@@ -0,0 +1,111 @@
+from array import array
+from typing import Dict, Iterable, List
+
+from jackanalyzer.jacktokenizer import KEYWORDS, SYMBOLS, ScannedToken, TokenType
+
+# Token types are stored as their index in TokenType
+TOKEN_TYPES: List[TokenType] = list(TokenType)
+TYPE_CODES: Dict[TokenType, int] = {token_type: code for code, token_type in enumerate(TOKEN_TYPES)}
+KEYWORD_TOKEN: int = TYPE_CODES[TokenType.KEYWORD]
+SYMBOL_TOKEN: int = TYPE_CODES[TokenType.SYMBOL]
+IDENTIFIER_TOKEN: int = TYPE_CODES[TokenType.IDENTIFIER]
+INT_CONST_TOKEN: int = TYPE_CODES[TokenType.INT_CONST]
+STRING_CONST_TOKEN: int = TYPE_CODES[TokenType.STRING_CONST]
+
+# Keywords and symbols have fixed ids at the start of every string table, so a token id equal to one of these
+# constants is that keyword or symbol; identifiers and constants with the same text get an id of their own
+PRESET_STRINGS: List[str] = KEYWORDS + SYMBOLS
+(CLASS, METHOD, FUNCTION, CONSTRUCTOR, INT, BOOLEAN, CHAR, VOID, VAR, STATIC, FIELD, LET, DO, IF, ELSE, WHILE, RETURN,
+ TRUE, FALSE, NULL, THIS) = range(len(KEYWORDS))
+(LEFT_BRACE, RIGHT_BRACE, LEFT_PAREN, RIGHT_PAREN, LEFT_BRACKET, RIGHT_BRACKET, DOT, COMMA, SEMICOLON, PLUS, MINUS,
+ ASTERISK, SLASH, AMPERSAND, PIPE, LESS_THAN, GREATER_THAN, EQUALS, TILDE) = range(len(KEYWORDS), len(PRESET_STRINGS))
+PRESET_IDS: Dict[str, int] = {string: token_id for token_id, string in enumerate(PRESET_STRINGS)}
+
+
+class TokenStream:
+    """
+    The tokens of one source in parallel arrays instead of one object per token.
+
+    types holds the token type of every token, ids its index into strings, where equal contents are stored once.
+    lines and columns are only kept for error messages.
+    """
+    __slots__ = ("types", "ids", "lines", "columns", "strings", "_string_ids")
+    types: bytearray
+    ids: array
+    lines: array
+    columns: array
+    strings: List[str]
+
+    def __init__(self):
+        self.types = bytearray()
+        self.ids = array("I")
+        self.lines = array("I")
+        self.columns = array("I")
+        self.strings = list(PRESET_STRINGS)
+        self._string_ids: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def append(self, token_type: TokenType, content: str, line: int, column: int) -> None:
+        """
+        Adds a token, interning its content
+        :param token_type: TokenType
+        :param content: str
+        :param line: int
+        :param column: int
+        :return: None
+        """
+        if token_type is TokenType.KEYWORD or token_type is TokenType.SYMBOL:
+            token_id: int = PRESET_IDS[content]
+        else:
+            token_id: int = self._string_ids.get(content, -1)
+            if token_id == -1:
+                token_id = len(self.strings)
+                self.strings.append(content)
+                self._string_ids[content] = token_id
+        self.types.append(TYPE_CODES[token_type])
+        self.ids.append(token_id)
+        self.lines.append(line)
+        self.columns.append(column)
+
+
+def token_stream(tokens: Iterable[ScannedToken]) -> TokenStream:
+    """
+    Collects scanned tokens into a TokenStream
+    :param tokens: Iterable[ScannedToken], e.g. from jacktokenizer.scan
+    :return: TokenStream
+    """
+    stream: TokenStream = TokenStream()
+    for token_type, content, line, column in tokens:
+        stream.append(token_type, content, line, column)
+    return stream
+
+
+class TokenCursor:
+    """
+    Position in a TokenStream. The arrays of the stream are held directly to save an attribute lookup per token.
+    """
+    __slots__ = ("stream", "types", "ids", "strings", "index")
+    stream: TokenStream
+    types: bytearray
+    ids: array
+    strings: List[str]
+    index: int
+
+    def __init__(self, stream: TokenStream):
+        self.stream = stream
+        self.types = stream.types
+        self.ids = stream.ids
+        self.strings = stream.strings
+        self.index = 0
+
+    def describe(self) -> str:
+        """
+        Describes the current token for error messages
+        :return: str
+        """
+        if self.index >= len(self.types):
+            return "end of file"
+        return (f"{TOKEN_TYPES[self.types[self.index]].value} '{self.strings[self.ids[self.index]]}' "
+                f"at line {self.stream.lines[self.index]}, column {self.stream.columns[self.index]}")
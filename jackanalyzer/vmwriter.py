@@ -1,10 +1,12 @@
 from enum import Enum
-from typing import Literal
+from typing import Literal, TextIO, Optional, Callable, List
 
+from vmtranslator.commands import VMCommand
 
-class Segment(Enum, str):
-    CONST = 'const'
-    ARG = 'arg'
+
+class Segment(str, Enum):
+    CONST = 'constant'
+    ARG = 'argument'
     LOCAL = 'local'
     STATIC = 'static'
     THIS = 'this'
@@ -24,14 +26,34 @@ SEGMENT = Literal[
     Segment.TEMP,
 ]
 
+# Number of characters of VM code held in memory before it is written to the output file
+DEFAULT_BUFFER_SIZE: int = 1 << 16
 
-class VMWriter:
 
-    def __init__(self):
+class VMWriter:
+    """
+    Emits the VM commands of the compiler in one of two modes:
+    - with an output file, as VM text collected in a buffer and written once it passes buffer_size
+    - with a command sink, as VMCommand tuples passed to the sink one at a time, e.g. to the VM translator
+    """
+    output_file: Optional[TextIO]
+    command_sink: Optional[Callable[[VMCommand], None]]
+
+    def __init__(self, output_file: Optional[TextIO] = None, buffer_size: int = DEFAULT_BUFFER_SIZE,
+                 command_sink: Optional[Callable[[VMCommand], None]] = None):
         """
-        Creates a new output .vm file and prepares it for writing
+        Prepares the given .vm output file for writing, or the command sink to receive the commands
+        :param output_file: TextIO, None when a command_sink is given
+        :param buffer_size: buffered characters that trigger a write to output_file
+        :param command_sink: receives every command as a VMCommand instead of writing it as text
         """
-        pass
+        if (output_file is None) == (command_sink is None):
+            raise Exception("VMWriter needs either an output file or a command sink")
+        self.output_file = output_file
+        self.buffer_size = buffer_size
+        self.command_sink = command_sink
+        self._buffer: List[str] = []
+        self._buffered_size = 0
 
     def write_push(self, segment: Segment, index: int):
         """
@@ -40,7 +62,7 @@ class VMWriter:
         :param index:
         :return:
         """
-        pass
+        self._emit("push", segment.value, index)
 
     def write_pop(self, segment: Segment, index: int):
         """
@@ -49,7 +71,7 @@ class VMWriter:
         :param index:
         :return:
         """
-        pass
+        self._emit("pop", segment.value, index)
 
     def write_arithmetic(self, command: str):
         """
@@ -57,25 +79,53 @@ class VMWriter:
         :param command: (ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT)
         :return:
         """
-        pass
+        self._emit(command, "", 0)
 
     def write_label(self, label: str):
-        pass
+        self._emit("label", label, 0)
 
     def write_goto(self, label: str):
-        pass
+        self._emit("goto", label, 0)
 
     def write_if(self, label: str):
-        pass
+        self._emit("if-goto", label, 0)
 
     def write_call(self, name: str, n_args: int):
-        pass
+        self._emit("call", name, n_args)
 
     def write_function(self, name: str, n_locals: int):
-        pass
+        self._emit("function", name, n_locals)
 
     def write_return(self):
-        pass
+        self._emit("return", "", 0)
+
+    def flush(self):
+        """
+        Writes the buffered VM text to the output file in a single call
+        :return:
+        """
+        if self.output_file is not None and self._buffer:
+            self.output_file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+            self._buffered_size = 0
 
     def close(self):
-        pass
+        self.flush()
+        if self.output_file is not None:
+            self.output_file.close()
+
+    def _emit(self, op: str, segment: str, index: int):
+        if self.command_sink is not None:
+            self.command_sink((op, segment, index))
+            return
+        match op:
+            case "push" | "pop" | "call" | "function":
+                line: str = f"{op} {segment} {index}"
+            case "label" | "goto" | "if-goto":
+                line: str = f"{op} {segment}"
+            case _:
+                line: str = op
+        self._buffer.append(line)
+        self._buffered_size += len(line) + 1
+        if self._buffered_size >= self.buffer_size:
+            self.flush()
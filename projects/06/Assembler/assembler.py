@@ -1,8 +1,11 @@
+import argparse
+import mmap
 import os.path
 import sys
 
+from array import array
 from pathlib import Path
-from typing import List, Union, Tuple
+from typing import BinaryIO, List, Union, Tuple, Dict, Optional, Callable, Iterable, Iterator
 
 
 def strip_whitespace_and_return_instructions(path: Path) -> List[str]:
@@ -20,50 +23,56 @@ def strip_whitespace_and_return_instructions(path: Path) -> List[str]:
     return instructions
 
 
+# Kinds of symbol table entries
+PREDEFINED: str = "predefined"
+LABEL: str = "label"
+VARIABLE: str = "variable"
+
+PREDEFINED_SYMBOLS: Dict[str, int] = {
+    "SP": 0,
+    "LCL": 1,
+    "ARG": 2,
+    "THIS": 3,
+    "THAT": 4,
+    **{f"R{register}": register for register in range(16)},
+    "SCREEN": 16384,
+    "KBD": 24576,
+}
+
+
+class Symbol:
+    """
+    Entry of the symbol table: the ROM address of a label, or the RAM address of a variable or predefined symbol
+    """
+    __slots__ = ("address", "kind")
+
+    def __init__(self, address: int, kind: str):
+        self.address: int = address
+        self.kind: str = kind
+
+
 class SymbolTable:
 
     def __init__(self):
-        self.table = {
-            "SP": 0,
-            "LCL": 1,
-            "ARG": 2,
-            "THIS": 3,
-            "THAT": 4,
-            "R0": 0,
-            "R1": 1,
-            "R2": 2,
-            "R3": 3,
-            "R4": 4,
-            "R5": 5,
-            "R6": 6,
-            "R7": 7,
-            "R8": 8,
-            "R9": 9,
-            "R10": 10,
-            "R11": 11,
-            "R12": 12,
-            "R13": 13,
-            "R14": 14,
-            "R15": 15,
-            "SCREEN": 16384,
-            "KBD": 24576,
-        }
+        self.table: Dict[str, Symbol] = {name: Symbol(address, PREDEFINED)
+                                         for name, address in PREDEFINED_SYMBOLS.items()}
         self.next_variable_address = 16
 
     def add_label(self, symbol, address):
         if not self.contains(symbol):
-            self.table[symbol] = address
+            self.table[symbol] = Symbol(address, LABEL)
 
-    def add_variable(self, symbol):
+    def add_variable(self, symbol) -> Symbol:
         if not self.contains(symbol):
-            self.table[symbol] = self.next_variable_address
+            self.table[symbol] = Symbol(self.next_variable_address, VARIABLE)
             self.next_variable_address = self.next_variable_address + 1
+        return self.table[symbol]
 
     def contains(self, symbol) -> bool:
         return symbol in self.table
 
     def get_address(self, symbol) -> int:
-        return self.table[symbol]
+        return self.table[symbol].address
 
 
 def is_label(instruction) -> bool:
@@ -157,62 +166,369 @@ class CIntruction:
             return "000"
 
 
-def main():
-    filepath: str = sys.argv[1]
-    path: Path = Path(filepath)
+def legacy_assemble(instructions_with_labels: List[str]) -> List[str]:
+    """
+    Original per-instruction translation path, one AInstruction/CIntruction object per line.
+    Kept as the reference the benchmark compares the assembler engine against.
+    :param instructions_with_labels: output of strip_whitespace_and_return_instructions
+    :return: list of 16 character binary strings
+    """
+    symbol_table: SymbolTable = SymbolTable()
 
-    if not os.path.isfile(path) or path.suffix != ".asm":
-        print("Please pass absolute path to a file with .asm extension")
-        return
+    # the ROM address of a label is its index less the labels before it
+    labels: List[Tuple[int, str]] = []
+    for index, instruction in enumerate(instructions_with_labels):
+        if is_label(instruction):
+            labels.append((index - len(labels), instruction[1:-1]))
 
-    instructions_with_labels: List[str] = strip_whitespace_and_return_instructions(path)
-    print(instructions_with_labels)
+    for address, symbol in labels:
+        symbol_table.add_label(symbol, address)
 
-    if not instructions_with_labels:
-        print("no valid instructions in file")
+    binaries: List[str] = []
+    for instruction in instructions_with_labels:
+        if is_label(instruction):
+            continue
+
+        binary = None
+        if instruction[0] == "@":
+            value = instruction[1:]
+            if value.isnumeric():
+                binary = AInstruction(int(value)).as_binary()
+            else:
+                if symbol_table.contains(value):
+                    binary = AInstruction(symbol_table.get_address(value)).as_binary()
+                else:
+                    symbol_table.add_variable(value)
+                    binary = AInstruction(symbol_table.get_address(value)).as_binary()
+        else:
+            dest = None
+            jump = None
+            if "=" in instruction and ";" in instruction:
+                dest = instruction.split("=")[0]
+                jump = instruction.split(";")[1]
+                comp = instruction.split("=")[1].split(";")[0]
+            elif "=" in instruction:
+                dest = instruction.split("=")[0]
+                comp = instruction.split("=")[1]
+            else:
+                jump = instruction.split(";")[1]
+                comp = instruction.split(";")[0]
+
+            binary = CIntruction(comp, dest, jump).as_binary()
+
+        binaries.append(binary)
+
+    return binaries
+
+
+# Binary text of every A-instruction word (0 through 32767), computed once at import.
+A_INSTRUCTION_WORDS: List[str] = ["{0:016b}".format(value) for value in range(32768)]
+
+# Memo of raw C-instruction text (e.g. "AM=M-1") to its 16 bit binary string.
+_c_instruction_cache: Dict[str, str] = {}
+
+
+# Bytes of a file mapped and split into lines at a time, cut at the next line break
+CHUNK_SIZE: int = 1 << 18
+
+SLASH: int = ord("/")
+SPACE: int = ord(" ")
+TAB: int = ord("\t")
+
+
+def mapped_lines(input_file: BinaryIO) -> Iterator[bytes]:
+    """
+    Yields the lines of a binary file from a memory map of it, one chunk of about CHUNK_SIZE bytes at a time, so
+    memory stays flat however large the file is. Files that cannot be mapped, like pipes, empty files and
+    io.BytesIO, and files not at offset 0 are read line by line from where they are.
+    :param input_file: BinaryIO
+    :return: Iterator[bytes] lines without their line breaks
+    """
+    try:
+        mapped: Optional[mmap.mmap] = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ) \
+            if input_file.tell() == 0 else None
+    except (AttributeError, OSError, ValueError):
+        mapped = None
+    if mapped is None:
+        for line in input_file:
+            yield from line.splitlines()
         return
+    with mapped:
+        start: int = 0
+        size: int = len(mapped)
+        while start < size:
+            end: int = mapped.find(b"\n", min(start + CHUNK_SIZE, size))
+            end = size if end == -1 else end + 1
+            yield from mapped[start:end].splitlines()
+            start = end
+
+
+class MappedSource:
+    """
+    The instructions and labels of an .asm file, scanned from a memory map of the file every time it is iterated,
+    so the two passes of assemble need neither the whole file nor a list of its lines in memory. Comments and
+    whitespace are cut on the bytes and only the bytes of instructions are decoded.
+    """
+
+    def __init__(self, path: Path):
+        self.path: Path = path
+
+    def __iter__(self) -> Iterator[str]:
+        with open(self.path, "rb") as input_file:
+            for line in mapped_lines(input_file):
+                # Tests for single bytes are much cheaper than for a bytes substring
+                if SLASH in line:
+                    line = line.split(b"//", 1)[0]
+                if SPACE in line or TAB in line:
+                    line = line.translate(None, b" \t")
+                if line:
+                    yield line.decode()
+
+
+def read_instructions(path: Path) -> List[str]:
+    """
+    Returns the instructions and labels of an .asm file, with comments and whitespace removed, see MappedSource
+    :param path: Path to an .asm file
+    :return: List[str]
+    """
+    return list(MappedSource(path))
+
+
+def strip_instructions(lines: Iterable[str]) -> List[str]:
+    """
+    Removes comments, whitespace and empty lines from assembly source lines.
+    :param lines: assembly lines, e.g. streamed from the VM translator
+    :return: List[str]
+    """
+    instructions: List[str] = []
+    append = instructions.append
+    for line in lines:
+        if "/" in line:
+            line = line.split("//", 1)[0]
+        line = line.replace(" ", "").replace("\t", "")
+        if line:
+            append(line)
+    return instructions
+
 
+def translate_c_instruction(instruction: str) -> str:
+    """
+    Returns the binary form of a C-instruction, parsing each distinct mnemonic only once.
+    :param instruction: C-instruction text such as "D=M" or "D;JGT"
+    :return: 16 character binary string
+    """
+    binary: Optional[str] = _c_instruction_cache.get(instruction)
+    if binary is None:
+        dest, separator, rest = instruction.rpartition("=")
+        comp, separator, jump = rest.partition(";")
+        if comp not in COMP_TABLE:
+            raise Exception(f"invalid C-instruction | {instruction}")
+        binary = f"111{COMP_TABLE[comp]}{DEST_TABLE.get(dest, '000')}{JUMP_TABLE.get(jump, '000')}"
+        _c_instruction_cache[instruction] = binary
+    return binary
+
+
+def index_labels(instructions_with_labels: Iterable[str]) -> SymbolTable:
+    """
+    First pass: streams over the instructions once, counting ROM addresses, and enters every label with the
+    address of the instruction after it. A label defined twice keeps its first address.
+    :param instructions_with_labels: stripped instructions
+    :return: SymbolTable with the predefined symbols and the labels
+    """
     symbol_table: SymbolTable = SymbolTable()
+    table: Dict[str, Symbol] = symbol_table.table
+    rom_address: int = 0
+    for instruction in instructions_with_labels:
+        if instruction[0] == "(":
+            label: str = instruction[1:-1]
+            if label not in table:
+                table[label] = Symbol(rom_address, LABEL)
+        else:
+            rom_address += 1
+    if rom_address > len(A_INSTRUCTION_WORDS):
+        raise Exception(f"program does not fit into the 32K ROM | {rom_address} instructions")
+    return symbol_table
+
+
+def assemble(instructions_with_labels: Iterable[str]) -> List[str]:
+    """
+    Two pass assembly of already stripped instructions, see assemble_with_symbols
+    :param instructions_with_labels: a list, or a MappedSource to assemble a file without reading it into memory
+    :return: list of 16 character binary strings
+    """
+    return assemble_with_symbols(instructions_with_labels)[0]
+
+
+def assemble_with_symbols(instructions_with_labels: Iterable[str]) -> Tuple[List[str], SymbolTable]:
+    """
+    Two pass assembly of already stripped instructions. The first pass indexes the labels, the second emits one
+    binary string per instruction with a single dict lookup per A-instruction, which also adds new variables.
+    The binary strings are shared, so the result costs one reference per instruction.
+    :param instructions_with_labels: iterated once per pass, a list or a MappedSource
+    :return: (list of 16 character binary strings, SymbolTable of the labels and variables)
+    """
+    symbol_table: SymbolTable = index_labels(instructions_with_labels)
+
+    table: Dict[str, Symbol] = symbol_table.table
+    a_words: List[str] = A_INSTRUCTION_WORDS
+    c_cache: Dict[str, str] = _c_instruction_cache
+    binaries: List[str] = []
+    append = binaries.append
+    for instruction in instructions_with_labels:
+        first: str = instruction[0]
+        if first == "@":
+            value: str = instruction[1:]
+            # Symbols never start with a digit, so constants miss the table
+            symbol: Optional[Symbol] = table.get(value)
+            if symbol is not None:
+                append(a_words[symbol.address])
+            elif value.isdigit():
+                constant: int = int(value)
+                if constant > 0x7FFF:
+                    raise Exception(f"constant out of range | {instruction}")
+                append(a_words[constant])
+            else:
+                address: int = symbol_table.add_variable(value).address
+                if address > 0x7FFF:
+                    raise Exception(f"no RAM address left for variable | {instruction}")
+                append(a_words[address])
+        elif first != "(":
+            binary: Optional[str] = c_cache.get(instruction)
+            append(binary if binary is not None else translate_c_instruction(instruction))
+
+    return binaries, symbol_table
+
+
+def assemble_file(path: Path) -> str:
+    """
+    Assembles an .asm file and returns the contents of the matching .hack file.
+    :param path: Path
+    :return: str
+    """
+    return format_hack(assemble(MappedSource(path)))
+
+
+def format_hack(binaries: List[str]) -> str:
+    """
+    Returns the .hack text form of the assembled program, one instruction per line.
+    :param binaries: output of assemble
+    :return: str
+    """
+    if not binaries:
+        return ""
+    return "\n".join(binaries) + "\n"
+
+
+def to_words(binaries: List[str]) -> array:
+    """
+    Converts the assembled program into unsigned 16 bit machine words.
+    :param binaries: output of assemble
+    :return: array of typecode 'H'
+    """
+    return array("H", [int(binary, 2) for binary in binaries])
+
+
+def format_bin(binaries: List[str]) -> bytes:
+    """
+    Returns a raw ROM image: one little-endian uint16 per instruction.
+    :param binaries: output of assemble
+    :return: bytes
+    """
+    words: array = to_words(binaries)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return words.tobytes()
+
+
+def format_npy(binaries: List[str]) -> bytes:
+    """
+    Returns the program as a NumPy .npy file holding a one dimensional little-endian uint16 array.
+    The header is written by hand so NumPy is only needed to read the file back.
+    :param binaries: output of assemble
+    :return: bytes
+    """
+    header: str = f"{{'descr': '<u2', 'fortran_order': False, 'shape': ({len(binaries)},), }}"
+    # magic (6) + version (2) + header length (2) + header + newline must be a multiple of 64
+    padding: int = 63 - (10 + len(header)) % 64
+    header = header + " " * padding + "\n"
+    return b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header.encode("latin1") + format_bin(binaries)
+
+
+def format_symbols(symbol_table: SymbolTable) -> str:
+    """
+    Returns the .sym sidecar of a program: one "kind name address" line per label and variable, labels with their
+    ROM address and variables with their RAM address, so emulators and debuggers need not assemble again
+    :param symbol_table: SymbolTable of assemble_with_symbols
+    :return: str
+    """
+    return "".join(f"{symbol.kind} {name} {symbol.address}\n" for name, symbol in symbol_table.table.items()
+                   if symbol.kind != PREDEFINED)
+
+
+def load_symbols(path: Path) -> Dict[str, Symbol]:
+    """
+    Reads a .sym sidecar written by format_symbols
+    :param path: Path
+    :return: Dict[str, Symbol] of every label and variable by name
+    """
+    symbols: Dict[str, Symbol] = {}
+    with open(path, "r") as sym_file:
+        for number, line in enumerate(sym_file, 1):
+            fields: List[str] = line.split()
+            if len(fields) != 3 or fields[0] not in (LABEL, VARIABLE) or not fields[2].isdigit():
+                raise Exception(f"invalid symbol line {number} | {line.strip()}")
+            symbols[fields[1]] = Symbol(int(fields[2]), fields[0])
+    return symbols
+
+
+OUTPUT_FORMATS: Dict[str, Tuple[str, Callable[[List[str]], Union[str, bytes]]]] = {
+    "hack": (".hack", format_hack),
+    "bin": (".bin", format_bin),
+    "npy": (".npy", format_npy),
+}
 
-    labels: List[Tuple[int, str]] = [(index + 1, instruction[1:-1]) for index, instruction in
-                                     enumerate(instructions_with_labels) if is_label(instruction)]
 
-    for address, symbol in labels:
-        symbol_table.add_label(symbol, address)
+def write_output(binaries: List[str], path: Path, output_format: str = "hack") -> Path:
+    """
+    Writes the assembled program next to path using the extension of the given output format.
+    :param binaries: output of assemble
+    :param path: Path of the source .asm file
+    :param output_format: one of OUTPUT_FORMATS
+    :return: Path of the written file
+    """
+    suffix, formatter = OUTPUT_FORMATS[output_format]
+    output_path: Path = path.with_suffix(suffix)
+    contents: Union[str, bytes] = formatter(binaries)
+    if isinstance(contents, str):
+        output_path.write_text(contents)
+    else:
+        output_path.write_bytes(contents)
+    return output_path
 
-    with open(filepath.replace(".asm", ".hack"), "w") as hack_file:
-        for instruction in instructions_with_labels:
-            if is_label(instruction):
-                continue
 
-            binary = None
-            if instruction[0] == "@":
-                value = instruction[1:]
-                if value.isnumeric():
-                    binary = AInstruction(int(value)).as_binary()
-                else:
-                    if symbol_table.contains(value):
-                        binary = AInstruction(symbol_table.get_address(value)).as_binary()
-                    else:
-                        symbol_table.add_variable(value)
-                        binary = AInstruction(symbol_table.get_address(value)).as_binary()
-            else:
-                dest = None
-                jump = None
-                if "=" in instruction and ";" in instruction:
-                    dest = instruction.split("=")[0]
-                    jump = instruction.split(";")[1]
-                    comp = instruction.split("=")[1].split(";")[0]
-                elif "=" in instruction:
-                    dest = instruction.split("=")[0]
-                    comp = instruction.split("=")[1]
-                else:
-                    jump = instruction.split(";")[1]
-                    comp = instruction.split(";")[0]
+def main():
+    argument_parser = argparse.ArgumentParser(description="Assembles a Hack .asm file")
+    argument_parser.add_argument("path", help="path to a file with .asm extension")
+    argument_parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="hack",
+                                 help="hack: text, bin: raw little-endian uint16 ROM image, npy: NumPy array")
+    argument_parser.add_argument("--symbols", action="store_true",
+                                 help="also write the labels and variables to a .sym file")
+    arguments = argument_parser.parse_args()
+    path: Path = Path(arguments.path)
+
+    if not os.path.isfile(path) or path.suffix != ".asm":
+        print("Please pass absolute path to a file with .asm extension")
+        return
+
+    binaries, symbol_table = assemble_with_symbols(MappedSource(path))
+    if not binaries:
+        print("no valid instructions in file")
+        return
 
-                binary = CIntruction(comp, dest, jump).as_binary()
+    write_output(binaries, path, arguments.output_format)
+    if arguments.symbols:
+        path.with_suffix(".sym").write_text(format_symbols(symbol_table))
 
-            hack_file.write(binary+"\n")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,42 @@
+import sys
+import time
+
+from pathlib import Path
+from typing import Callable, List
+
+from assembler import assemble, legacy_assemble, read_instructions, strip_whitespace_and_return_instructions
+
+PONG_PATH: Path = Path(__file__).resolve().parent.parent / "pong" / "Pong.asm"
+
+
+def best_of(runs: int, function: Callable[[], List[str]]) -> float:
+    """
+    Returns the fastest wall clock time in seconds of calling function runs times.
+    :param runs: int
+    :param function: zero argument callable
+    :return: float
+    """
+    timings: List[float] = []
+    for _ in range(runs):
+        start: float = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    path: Path = Path(sys.argv[1]) if len(sys.argv) > 1 else PONG_PATH
+    runs: int = 5
+
+    legacy_time: float = best_of(runs, lambda: legacy_assemble(strip_whitespace_and_return_instructions(path)))
+    engine_time: float = best_of(runs, lambda: assemble(read_instructions(path)))
+    instruction_count: int = len(assemble(read_instructions(path)))
+
+    print(f"{path.name}: {instruction_count} instructions, best of {runs} runs")
+    print(f"legacy path: {legacy_time * 1000:.1f} ms")
+    print(f"engine:      {engine_time * 1000:.1f} ms")
+    print(f"speedup:     {legacy_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import io
+import re
+
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cpuemulator.blockjit import BlockJIT
+from cpuemulator.hackcpu import load_rom
+from hackassembler.assembler import assemble, read_instructions, strip_instructions, to_words
+from hdlsimulator.netlist import build_netlist
+from hdlsimulator.simulator import ChipSimulator
+from jackanalyzer.jackanalyzer import CompileResult, compile_file
+from toolchain.pipeline import OS_PATH, collect_sources
+from vmemulator.nativeos import BUILTINS
+from vmemulator.vmemulator import SP, STACK_BASE, VMEmulator, vm_files
+from vmtranslator.main import translate
+
+# name[index], e.g. RAM[16] or local[2]; the index is empty for a whole register part, e.g. DRegister[]
+INDEXED_PATTERN: re.Pattern = re.compile(r"(\w+)\[(\d*)]")
+
+# RAM addresses of the pointers the VM emulator names in test scripts
+VM_POINTERS: Dict[str, int] = {"sp": 0, "local": 1, "argument": 2, "this": 3, "that": 4}
+
+# Sys.init of the OS runs these before it calls Main.main
+OS_INIT_FUNCTIONS: List[str] = ["Memory.init", "Math.init", "Screen.init", "Output.init", "Keyboard.init"]
+
+# Base address of the fixed segments of the VM emulator
+VM_FIXED_SEGMENTS: Dict[str, int] = {"pointer": 3, "temp": 5}
+
+
+def to_word(value: int) -> int:
+    """
+    Reads the low 16 bits of value as a signed Hack word
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+def indexed(name: str) -> Optional[Tuple[str, str]]:
+    """
+    :return: (name, index) of name[index], None for a plain name
+    """
+    match: Optional[re.Match] = INDEXED_PATTERN.fullmatch(name)
+    return (match.group(1), match.group(2)) if match else None
+
+
+class Backend:
+    """
+    The simulator a test script drives. Variables are read as signed 16 bit words or unsigned pin values,
+    every simulator implements the commands of the course tool it replaces and rejects the others.
+    """
+    # Output format of variables listed without one
+    default_format: str = "D"
+
+    def set(self, name: str, value: int) -> None:
+        raise Exception(f"{type(self).__name__} has no variable | {name}")
+
+    def get(self, name: str) -> int:
+        raise Exception(f"{type(self).__name__} has no variable | {name}")
+
+    def width(self, name: str) -> int:
+        return 16
+
+    def eval(self) -> None:
+        raise Exception(f"{type(self).__name__} does not support eval")
+
+    def tick(self) -> None:
+        raise Exception(f"{type(self).__name__} does not support tick")
+
+    def tock(self) -> None:
+        raise Exception(f"{type(self).__name__} does not support tock")
+
+    def step(self, count: int) -> None:
+        """
+        Runs count ticktock or vmstep commands, which the runner batches for repeat blocks that hold nothing else
+        """
+        raise Exception(f"{type(self).__name__} does not support ticktock or vmstep")
+
+    def part_command(self, part: str, arguments: List[str], directory: Path) -> None:
+        raise Exception(f"{type(self).__name__} does not support part commands | {part} {' '.join(arguments)}")
+
+
+class HDLBackend(Backend):
+    """
+    Hardware simulator on a flattened netlist, see hdlsimulator. Memory parts are read and set by chip name,
+    e.g. RAM16K[3] or DRegister[], and ROM32K load Prog.hack loads a program.
+    """
+    default_format = "B"
+
+    def __init__(self, hdl_file: Path):
+        self.chip: ChipSimulator = ChipSimulator(build_netlist(hdl_file))
+
+    def set(self, name: str, value: int) -> None:
+        match indexed(name):
+            case (part, index):
+                self.chip.write(part, int(index or 0), value)
+            case _:
+                self.chip.set(name, value)
+
+    def get(self, name: str) -> int:
+        match indexed(name):
+            case (part, index):
+                return self.chip.read(part, int(index or 0))
+        return self.chip.get(name)
+
+    def width(self, name: str) -> int:
+        return self.chip.widths.get(name, 16)
+
+    def eval(self) -> None:
+        self.chip.eval()
+
+    def tick(self) -> None:
+        self.chip.tick()
+
+    def tock(self) -> None:
+        self.chip.tock()
+
+    def step(self, count: int) -> None:
+        for _ in range(count):
+            self.chip.tick()
+            self.chip.tock()
+
+    def part_command(self, part: str, arguments: List[str], directory: Path) -> None:
+        match arguments:
+            case ["load", file_name]:
+                self.chip.load(part, load_rom(directory / file_name))
+            case _:
+                super().part_command(part, arguments, directory)
+
+
+class CPUBackend(Backend):
+    """
+    CPU emulator on the block JIT. A missing .asm file of a VM test is translated from the .vm files next to it,
+    like the VM translator would write it: a single file without bootstrap code, a directory with it.
+    """
+
+    def __init__(self, program: Path):
+        if program.suffix == ".asm" and program.is_file():
+            rom = to_words(assemble(read_instructions(program)))
+        elif program.suffix == ".asm" and program.with_suffix(".vm").is_file():
+            rom = to_words(assemble(strip_instructions(translate([program.with_suffix(".vm")], False))))
+        elif program.suffix == ".asm" and vm_files(program.parent):
+            rom = to_words(assemble(strip_instructions(translate(vm_files(program.parent), True))))
+        else:
+            rom = load_rom(program)
+        self.cpu: BlockJIT = BlockJIT(rom)
+
+    def set(self, name: str, value: int) -> None:
+        cpu: BlockJIT = self.cpu
+        match indexed(name) or name:
+            case ("RAM", index) if index:
+                cpu.ram[int(index)] = value & 0xFFFF
+            case "PC":
+                cpu.pc = value
+                cpu.halted = False
+            case "A":
+                cpu.a = value & 0xFFFF
+            case "D":
+                cpu.d = value & 0xFFFF
+            case _:
+                super().set(name, value)
+
+    def get(self, name: str) -> int:
+        cpu: BlockJIT = self.cpu
+        match indexed(name) or name:
+            case ("RAM", index) if index:
+                return to_word(cpu.ram[int(index)])
+            case "PC":
+                return cpu.pc
+            case "A":
+                return to_word(cpu.a)
+            case "D":
+                return to_word(cpu.d)
+        return super().get(name)
+
+    def step(self, count: int) -> None:
+        self.cpu.run(count)
+
+
+class VMBackend(Backend):
+    """
+    VM emulator, see vmemulator. Loading a directory of a Jack program also compiles its .jack files and links the
+    tools/OS classes it does not define. The course emulator runs those as builtins, so here their init functions
+    run before the script's steps are counted, their functions with a native version use it, and the program starts
+    at Main.main like the builtin Sys.init would call it. Any other program with Sys.init starts with the bootstrap
+    call of it.
+    """
+
+    def __init__(self, path: Path):
+        sources: List[Tuple[str, io.StringIO]] = []
+        files: List[Path] = vm_files(path)
+        if path.is_dir() and any(path.glob("*.jack")):
+            jack_files, files = collect_sources(path)
+            for jack_file in jack_files:
+                result: CompileResult = compile_file(jack_file)
+                if result['error']:
+                    raise Exception(result['error'])
+                sources.append((f"{jack_file.stem}.vm", io.StringIO(result['vm'])))
+        sources += [(vm_file.name, io.StringIO(vm_file.read_text())) for vm_file in files]
+        linked: List[str] = [vm_file.stem for vm_file in files if vm_file.parent == OS_PATH]
+        self.emulator: VMEmulator = VMEmulator(sources, [name for name in BUILTINS if name.split(".")[0] in linked])
+        if "Sys" in linked:
+            self.emulator.ram[SP] = STACK_BASE
+            for function in OS_INIT_FUNCTIONS:
+                self.emulator.call(function, [])
+            self.emulator.reset()
+            self.emulator.bootstrap("Main.main")
+        elif "Sys.init" in self.emulator.functions:
+            self.emulator.bootstrap()
+
+    def address(self, name: str) -> int:
+        ram = self.emulator.ram
+        if name in VM_POINTERS:
+            return VM_POINTERS[name]
+        match indexed(name):
+            case ("RAM", index) if index:
+                return int(index)
+            case (segment, index) if index and segment in VM_POINTERS and segment != "sp":
+                return ram[VM_POINTERS[segment]] + int(index)
+            case (segment, index) if index and segment in VM_FIXED_SEGMENTS:
+                return VM_FIXED_SEGMENTS[segment] + int(index)
+        raise Exception(f"VMBackend has no variable | {name}")
+
+    def set(self, name: str, value: int) -> None:
+        self.emulator.ram[self.address(name)] = to_word(value)
+
+    def get(self, name: str) -> int:
+        return self.emulator.ram[self.address(name)]
+
+    def step(self, count: int) -> None:
+        self.emulator.run(count)
+
+
+def open_backend(directory: Path, argument: Optional[str]) -> Backend:
+    """
+    Starts the simulator for the argument of a load command, like the course tools pick theirs
+    :param directory: directory of the test script
+    :param argument: file name, None for the directory of the script
+    :return: Backend
+    """
+    if argument is None:
+        return VMBackend(directory)
+    path: Path = directory / argument
+    match path.suffix:
+        case ".hdl":
+            return HDLBackend(path)
+        case ".asm" | ".hack":
+            return CPUBackend(path)
+        case ".vm":
+            return VMBackend(path)
+    raise Exception(f"cannot load | {argument}")
@@ -0,0 +1,302 @@
+import argparse
+import re
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Optional, TypedDict
+
+from testrunner.backends import Backend, open_backend, to_word
+from testrunner.tstparser import ScriptCommand, parse_script
+
+PROJECTS_PATH: Path = Path(__file__).resolve().parent.parent / "projects"
+
+# name%<format><left padding>.<length>.<right padding>, e.g. RAM[0]%D2.6.2
+COLUMN_PATTERN: re.Pattern = re.compile(r"([^%]+)(?:%([BDXS])(\d+)\.(\d+)\.(\d+))?")
+
+# Iterations after which a while loop counts as waiting for input that never comes
+WHILE_LIMIT: int = 100_000
+
+CONDITIONS = {
+    "=": lambda a, b: a == b, "<>": lambda a, b: a != b, "<": lambda a, b: a < b,
+    ">": lambda a, b: a > b, "<=": lambda a, b: a <= b, ">=": lambda a, b: a >= b,
+}
+
+
+class OutputColumn(NamedTuple):
+    """
+    One variable of an output-list with its format: B binary, D decimal, X hexadecimal or S string
+    """
+    name: str
+    format: str
+    left: int
+    length: int
+    right: int
+
+    def header(self) -> str:
+        width: int = self.left + self.length + self.right
+        name: str = self.name[:width]
+        left: int = (width - len(name)) // 2
+        return " " * left + name + " " * (width - len(name) - left)
+
+    def cell(self, value: int, text: str) -> str:
+        """
+        :param value: value of the variable, text is used instead for the S format
+        """
+        mask: int = (1 << (4 * self.length if self.format == "X" else self.length)) - 1
+        match self.format:
+            case "B":
+                field: str = format(value & mask, f"0{self.length}b")
+            case "X":
+                field = format(value & mask, f"0{self.length}X")
+            case "S":
+                field = f"{text:<{self.length}}"
+            case _:
+                field = f"{to_word(value):>{self.length}}"
+        return " " * self.left + field[-self.length:] + " " * self.right
+
+
+class ScriptResult(TypedDict):
+    path: str
+    status: str
+    lines: int
+    message: str
+    seconds: float
+
+
+def parse_value(text: str) -> int:
+    """
+    Reads a value of a set command: %B0101, %XFF, %D-3 or plain decimal
+    """
+    match text[:2]:
+        case "%B":
+            return int(text[2:], 2)
+        case "%X":
+            return int(text[2:], 16)
+        case "%D":
+            return int(text[2:])
+    return int(text)
+
+
+def parse_column(text: str, default_format: str, width: int) -> OutputColumn:
+    match: Optional[re.Match] = COLUMN_PATTERN.fullmatch(text)
+    if match is None:
+        raise Exception(f"bad output-list entry | {text}")
+    name, column_format, left, length, right = match.groups()
+    if column_format is None:
+        return OutputColumn(name, default_format, 1, width if default_format == "B" else 6, 1)
+    return OutputColumn(name, column_format, int(left), int(length), int(right))
+
+
+class ScriptRunner:
+    """
+    Executes the commands of one .tst file against its backend and compares every output line with the
+    .cmp file as soon as it is produced, stopping at the first difference like the course tools do.
+    * in a .cmp line matches any character.
+    """
+
+    def __init__(self, script: Path):
+        self.script: Path = script
+        self.directory: Path = script.parent
+        self.backend: Optional[Backend] = None
+        self.columns: List[OutputColumn] = []
+        self.output: List[str] = []
+        self.expected: Optional[List[str]] = None
+        self.time: int = 0
+        self.ticked: bool = False
+        self.echo: str = ""
+
+    def run(self) -> None:
+        self.execute(parse_script(self.script.read_text(encoding="latin-1")))
+        if self.expected is not None and len(self.output) < len(self.expected):
+            raise ComparisonFailure(len(self.output) + 1, self.expected[len(self.output)], "<no output>")
+
+    def execute(self, commands: List[ScriptCommand]) -> None:
+        for command in commands:
+            self.execute_command(command)
+
+    def execute_command(self, command: ScriptCommand) -> None:
+        arguments: List[str] = command.arguments
+        match command.name:
+            case "load":
+                self.backend = open_backend(self.directory, arguments[0] if arguments else None)
+                self.time = 0
+                self.ticked = False
+            case "output-file":
+                pass
+            case "compare-to":
+                lines: List[str] = (self.directory / arguments[0]).read_text().splitlines()
+                self.expected = [line.strip() for line in lines if line.strip()]
+            case "output-list":
+                self.columns = [parse_column(text, self.require_backend().default_format,
+                                             self.require_backend().width(text.split("%")[0])) for text in arguments]
+                self.emit("|" + "|".join(column.header() for column in self.columns) + "|")
+            case "output":
+                self.emit("|" + "|".join(column.cell(self.read(column.name), self.time_text())
+                                         for column in self.columns) + "|")
+            case "set":
+                self.require_backend().set(arguments[0], parse_value(arguments[1]))
+            case "eval":
+                self.require_backend().eval()
+            case "tick":
+                self.require_backend().tick()
+                self.ticked = True
+            case "tock":
+                self.require_backend().tock()
+                self.time += 1
+                self.ticked = False
+            case "ticktock" | "vmstep":
+                self.require_backend().step(1)
+                self.time += command.name == "ticktock"
+            case "repeat":
+                if not arguments:
+                    raise Exception(f"repeat without a count never ends | line {command.line}")
+                count: int = int(arguments[0])
+                if all(inner.name == command.body[0].name and inner.name in ("ticktock", "vmstep")
+                       for inner in command.body):
+                    self.require_backend().step(count * len(command.body))
+                    self.time += count * len(command.body) if command.body[0].name == "ticktock" else 0
+                    return
+                for _ in range(count):
+                    self.execute(command.body)
+            case "while":
+                for _ in range(WHILE_LIMIT):
+                    if not self.condition(arguments):
+                        return
+                    self.execute(command.body)
+                raise Exception(f"while {' '.join(arguments)} did not end within {WHILE_LIMIT} iterations, "
+                                f"the script probably waits for a key | line {command.line}")
+            case "echo":
+                self.echo = " ".join(arguments)
+            case "clear-echo":
+                self.echo = ""
+            case _ if arguments:
+                self.require_backend().part_command(command.name, arguments, self.directory)
+            case _:
+                raise Exception(f"unknown command | {command.name} at line {command.line}")
+
+    def require_backend(self) -> Backend:
+        if self.backend is None:
+            raise Exception("the script has no load command before its first simulation command")
+        return self.backend
+
+    def read(self, name: str) -> int:
+        return self.time if name == "time" else self.require_backend().get(name)
+
+    def time_text(self) -> str:
+        return f"{self.time}+" if self.ticked else str(self.time)
+
+    def condition(self, arguments: List[str]) -> bool:
+        if len(arguments) != 3 or arguments[1] not in CONDITIONS:
+            raise Exception(f"bad while condition | {' '.join(arguments)}")
+        left, operator, right = arguments
+        return CONDITIONS[operator](to_word(self.read(left)), to_word(parse_value(right)))
+
+    def emit(self, line: str) -> None:
+        self.output.append(line)
+        if self.expected is None:
+            return
+        number: int = len(self.output)
+        expected: str = self.expected[number - 1] if number <= len(self.expected) else "<end of file>"
+        if not lines_match(expected, line):
+            raise ComparisonFailure(number, expected, line)
+
+
+class ComparisonFailure(Exception):
+    def __init__(self, line: int, expected: str, actual: str):
+        super().__init__(f"comparison failure at line {line}\n  expected: {expected}\n  actual:   {actual}")
+
+
+def lines_match(expected: str, actual: str) -> bool:
+    return len(expected) == len(actual) and all(e == a or e == "*" for e, a in zip(expected, actual))
+
+
+def run_script(path: str, write_output: bool = False) -> ScriptResult:
+    """
+    Runs one test script. Errors are returned in the result instead of raised, so one broken script does not stop
+    a sweep. Scripts without a compare-to file are interactive demos and are skipped.
+    :param path: path of the .tst file
+    :param write_output: also write the output lines to the output-file of the script
+    :return: ScriptResult with the status pass, fail, error or skip
+    """
+    start: float = time.perf_counter()
+    script: Path = Path(path)
+    runner: ScriptRunner = ScriptRunner(script)
+    status: str = "pass"
+    message: str = ""
+    try:
+        if not re.search(r"^\s*compare-to\b", script.read_text(encoding="latin-1"), re.MULTILINE):
+            status, message = "skip", "no compare-to file"
+        else:
+            runner.run()
+    except ComparisonFailure as failure:
+        status, message = "fail", str(failure)
+    except Exception as exception:
+        status, message = "error", f"{type(exception).__name__}: {exception}"
+    if write_output and runner.output:
+        match = re.search(r"^\s*output-file\s+([^,;\s]+)", script.read_text(encoding="latin-1"), re.MULTILINE)
+        if match:
+            (script.parent / match.group(1)).write_text("\n".join(runner.output) + "\n")
+    return {'path': path, 'status': status, 'lines': len(runner.output), 'message': message,
+            'seconds': time.perf_counter() - start}
+
+
+def test_scripts(paths: List[Path]) -> List[Path]:
+    """
+    :param paths: .tst files and directories to search for them
+    :return: List[Path] every .tst file, sorted
+    """
+    scripts: List[Path] = []
+    for path in paths:
+        scripts += sorted(path.rglob("*.tst")) if path.is_dir() else [path]
+    return scripts
+
+
+def run_scripts(scripts: List[Path], jobs: Optional[int] = None, write_output: bool = False) -> Iterator[ScriptResult]:
+    """
+    Runs the scripts in worker processes and yields every result as soon as its script finishes
+    :param scripts: .tst files
+    :param jobs: number of worker processes, None for one per core, 1 to run in this process
+    :param write_output: see run_script
+    :return: Iterator[ScriptResult] in the order the scripts finish
+    """
+    if jobs == 1 or len(scripts) < 2:
+        for script in scripts:
+            yield run_script(str(script), write_output)
+        return
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(run_script, str(script), write_output) for script in scripts]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def test_runner():
+    argument_parser = argparse.ArgumentParser(description="Runs .tst scripts and compares them with their .cmp files")
+    argument_parser.add_argument("paths", nargs="*", default=[str(PROJECTS_PATH)],
+                                 help=".tst files or directories to search, defaults to projects")
+    argument_parser.add_argument("--jobs", type=int, default=None,
+                                 help="worker processes, defaults to one per core")
+    argument_parser.add_argument("--write-output", action="store_true",
+                                 help="write the output-file of every script like the course tools do")
+    argument_parser.add_argument("-v", "--verbose", action="store_true", help="also list passing and skipped scripts")
+    arguments = argument_parser.parse_args()
+
+    start: float = time.perf_counter()
+    scripts: List[Path] = test_scripts([Path(path) for path in arguments.paths])
+    counts = {"pass": 0, "fail": 0, "error": 0, "skip": 0}
+    for result in run_scripts(scripts, arguments.jobs, arguments.write_output):
+        counts[result['status']] += 1
+        if arguments.verbose or result['status'] in ("fail", "error"):
+            print(f"{result['status'].upper():<5} {result['path']} ({result['lines']} lines, "
+                  f"{result['seconds'] * 1000:.0f} ms)")
+            if result['message']:
+                print(f"      {result['message']}")
+    print(f"{len(scripts)} scripts in {time.perf_counter() - start:.2f} s: {counts['pass']} passed, "
+          f"{counts['fail']} failed, {counts['error']} errors, {counts['skip']} skipped")
+    if counts["fail"] or counts["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    test_runner()
@@ -0,0 +1,92 @@
+import re
+
+from typing import Iterator, List, NamedTuple, Tuple
+
+TOKEN_PATTERN: re.Pattern = re.compile(r"""
+    (?P<newline>\n)
+    |(?P<space>[ \t\r\f\v]+)
+    |(?P<comment>//[^\n]*|/\*.*?\*/)
+    |(?P<string>"[^"\n]*")
+    |(?P<symbol>[,;{}])
+    |(?P<word>[^\s,;{}"]+)
+""", re.VERBOSE | re.DOTALL)
+
+# Commands that take a block of commands in braces
+BLOCK_COMMANDS: Tuple[str, str] = ("repeat", "while")
+
+
+class ScriptCommand(NamedTuple):
+    """
+    One command of a test script, e.g. set in %B0101 has the name set and the arguments in, %B0101.
+    repeat and while keep the commands in their braces as body; a command like ROM32K load Add.hack is named
+    after the part it addresses.
+    """
+    name: str
+    arguments: List[str]
+    body: List["ScriptCommand"]
+    line: int
+
+
+def scan(source: str) -> Iterator[Tuple[str, str, int]]:
+    """
+    Yields the (kind, text, line) of every token of a .tst source, strings without their quotes
+    :param source: str
+    :return: Iterator[Tuple[str, str, int]]
+    """
+    line: int = 1
+    for match in TOKEN_PATTERN.finditer(source):
+        kind: str = match.lastgroup
+        if kind == "newline":
+            line += 1
+        elif kind == "comment":
+            line += match.group().count("\n")
+        elif kind == "string":
+            yield kind, match.group()[1:-1], line
+        elif kind != "space":
+            yield kind, match.group(), line
+
+
+def parse_script(source: str) -> List[ScriptCommand]:
+    """
+    Parses a test script into its commands. Commands end with a comma or a semicolon, which the scripts use
+    to group commands into simulation steps; the runner treats both alike.
+    :param source: contents of a .tst file
+    :return: List[ScriptCommand]
+    """
+    tokens: List[Tuple[str, str, int]] = list(scan(source))
+    commands, index = parse_block(tokens, 0)
+    if index < len(tokens):
+        raise Exception(f"unmatched '}}' at line {tokens[index][2]}")
+    return commands
+
+
+def parse_block(tokens: List[Tuple[str, str, int]], index: int) -> Tuple[List[ScriptCommand], int]:
+    """
+    Parses commands up to the end of tokens or to a closing brace
+    :return: (commands, index of the closing brace or len(tokens))
+    """
+    commands: List[ScriptCommand] = []
+    while index < len(tokens):
+        kind, text, line = tokens[index]
+        if text == "}":
+            return commands, index
+        if kind == "symbol":
+            if text == "{":
+                raise Exception(f"unexpected '{{' at line {line}")
+            index += 1
+            continue
+
+        words: List[str] = []
+        while index < len(tokens) and tokens[index][0] != "symbol":
+            words.append(tokens[index][1])
+            index += 1
+        body: List[ScriptCommand] = []
+        if words[0] in BLOCK_COMMANDS:
+            if index >= len(tokens) or tokens[index][1] != "{":
+                raise Exception(f"{words[0]} without a block at line {line}")
+            body, index = parse_block(tokens, index + 1)
+            if index >= len(tokens):
+                raise Exception(f"{words[0]} block is not closed | line {line}")
+        index += 1
+        commands.append(ScriptCommand(words[0], words[1:], body, line))
+    return commands, index
@@ -0,0 +1,119 @@
+import hashlib
+import os
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT_PATH: Path = Path(__file__).resolve().parent.parent
+
+# Source files of every stage; a change to any of them changes the tool version and invalidates that stage
+STAGE_SOURCES: Dict[str, List[Path]] = {
+    "jack": sorted((ROOT_PATH / "jackanalyzer").glob("*.py")),
+    "vm": sorted((ROOT_PATH / "vmtranslator").glob("*.py")),
+    "asm": [ROOT_PATH / "projects" / "06" / "Assembler" / "assembler.py"],
+}
+
+DEFAULT_CACHE_PATH: Path = Path(".n2tcache")
+DEFAULT_MAX_BYTES: int = 64 * 1024 * 1024
+
+
+class BuildCache:
+    """
+    Persistent map from (stage, tool version, input content) to the output of that stage.
+
+    Every entry is a file named after the sha256 of its key. Reading an entry bumps its modification time,
+    and once the cache grows past max_bytes the least recently used entries are deleted.
+    """
+    path: Path
+    max_bytes: int
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._tool_versions: Dict[str, str] = {}
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    def key(self, stage: str, *parts: str) -> str:
+        """
+        Returns the cache key of a stage input. parts are everything the output depends on besides the tool,
+        e.g. the file name and content of a .vm file.
+        :param stage: "jack", "vm" or "asm"
+        :return: hex digest
+        """
+        digest = hashlib.sha256()
+        digest.update(stage.encode())
+        digest.update(self._tool_version(stage).encode())
+        for part in parts:
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the cached output for key, or None on a miss
+        :param key: str
+        :return: Optional[str]
+        """
+        entry: Path = self._entry_path(key)
+        try:
+            output: str = entry.read_text()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(entry)
+        self.hits += 1
+        return output
+
+    def put(self, key: str, output: str) -> None:
+        """
+        Stores output under key and evicts least recently used entries if the cache is over its size cap
+        :param key: str
+        :param output: str
+        :return: None
+        """
+        entry: Path = self._entry_path(key)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        temporary: Path = entry.with_suffix(".tmp")
+        temporary.write_text(output)
+        try:
+            # an entry that is overwritten no longer counts towards the size
+            self._size -= entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        os.replace(temporary, entry)
+        self._size += entry.stat().st_size
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries: List[os.DirEntry] = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        self._size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._size <= self.max_bytes:
+                break
+            self._size -= entry.stat().st_size
+            os.remove(entry.path)
+
+    def _entries(self) -> List[os.DirEntry]:
+        if not self.path.is_dir():
+            return []
+        entries: List[os.DirEntry] = []
+        for bucket in os.scandir(self.path):
+            if bucket.is_dir():
+                entries.extend(entry for entry in os.scandir(bucket.path) if not entry.name.endswith(".tmp"))
+        return entries
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / key
+
+    def _tool_version(self, stage: str) -> str:
+        version: Optional[str] = self._tool_versions.get(stage)
+        if version is None:
+            digest = hashlib.sha256()
+            for source in STAGE_SOURCES[stage]:
+                digest.update(source.read_bytes())
+            version = digest.hexdigest()
+            self._tool_versions[stage] = version
+        return version
@@ -0,0 +1,243 @@
+import argparse
+import io
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional, TypedDict
+
+from hackassembler.assembler import OUTPUT_FORMATS, assemble, strip_instructions
+from jackanalyzer.jackanalyzer import CompileResult, compile_commands, compile_project
+from toolchain.buildcache import BuildCache, DEFAULT_CACHE_PATH
+from vmtranslator.codewriter import CodeWriter
+from vmtranslator.commands import VMCommand
+from vmtranslator.main import bootstrap_lines, translate_source, write_commands, write_vm_command
+from vmtranslator.peephole import PeepholeOptimizer
+from vmtranslator.vmoptimizer import VMOptimizer
+
+OS_PATH: Path = Path(__file__).resolve().parent.parent / "tools" / "OS"
+
+
+def collect_sources(path: Path, include_os: bool = True) -> Tuple[List[Path], List[Path]]:
+    """
+    Finds the .jack and .vm files of a program. The OS .vm files are added for every class the program does not define.
+    :param path: a .jack or .vm file or a directory holding them
+    :param include_os: whether to link tools/OS
+    :return: (jack files, vm files)
+    """
+    files: List[Path] = sorted(path.glob("*")) if path.is_dir() else [path]
+    jack_files: List[Path] = [file for file in files if file.suffix == ".jack"]
+    vm_files: List[Path] = [file for file in files if file.suffix == ".vm" and file.with_suffix(".jack") not in jack_files]
+    if include_os:
+        defined: set = {file.stem for file in jack_files + vm_files}
+        vm_files += [file for file in sorted(OS_PATH.glob("*.vm")) if file.stem not in defined]
+    return jack_files, vm_files
+
+
+def build(jack_files: List[Path], vm_files: List[Path], timings: Dict[str, float],
+          jobs: Optional[int] = None, cache: Optional[BuildCache] = None,
+          optimizer: Optional[PeepholeOptimizer] = None, shared_calls: bool = False,
+          vm_optimizer: Optional[VMOptimizer] = None) -> List[str]:
+    """
+    Runs Jack -> VM -> assembly -> machine code entirely in memory.
+    With a cache, every .jack and .vm file whose content and tool are unchanged is not translated again,
+    and an unchanged program is not assembled again. Without a cache the compiler passes its VM commands
+    straight to the VM translator, and the "jack" timing covers both.
+    :param jack_files: Jack classes to compile
+    :param vm_files: already compiled VM files, e.g. the OS
+    :param timings: receives the wall clock seconds spent in every stage
+    :param jobs: worker processes for compiling the Jack classes, see jackanalyzer.compile_project
+    :param cache: BuildCache or None
+    :param optimizer: peephole pass applied to the assembly of every VM file, None to skip it
+    :param shared_calls: use the shared calling convention, see vmtranslator.codewriter.CodeWriter
+    :param vm_optimizer: VM level pass applied to the commands of every VM file, None to skip it
+    :return: the program as 16 character binary strings, see assembler.assemble
+    """
+    start: float = time.perf_counter()
+    translated: List[List[str]] = []
+    vm_sources: List[Tuple[str, str]] = []
+    if cache is None:
+        results: List[AssemblyResult] = compile_project_to_assembly(jack_files, jobs, shared_calls,
+                                                                    vm_optimizer is not None)
+        errors: List[str] = [result['error'] for result in results if result['error']]
+        if errors:
+            raise Exception("\n".join(errors))
+        translated = [result['asm'] for result in results]
+        if vm_optimizer is not None:
+            vm_optimizer.before += sum(result['vm_before'] for result in results)
+            vm_optimizer.after += sum(result['vm_after'] for result in results)
+    else:
+        compiled: Dict[Path, str] = {}
+        jack_keys: Dict[Path, str] = {}
+        for jack_file in jack_files:
+            jack_keys[jack_file] = cache.key("jack", jack_file.read_text())
+            cached: Optional[str] = cache.get(jack_keys[jack_file])
+            if cached is not None:
+                compiled[jack_file] = cached
+        misses: List[Path] = [jack_file for jack_file in jack_files if jack_file not in compiled]
+        results: List[CompileResult] = compile_project(misses, jobs)
+        errors: List[str] = [result['error'] for result in results if result['error']]
+        if errors:
+            raise Exception("\n".join(errors))
+        for jack_file, result in zip(misses, results):
+            compiled[jack_file] = result['vm']
+            cache.put(jack_keys[jack_file], result['vm'])
+        vm_sources = [(f"{jack_file.stem}.vm", compiled[jack_file]) for jack_file in jack_files]
+    vm_sources += [(vm_file.name, vm_file.read_text()) for vm_file in vm_files]
+    timings["jack"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    lines: List[str] = bootstrap_lines(shared_calls)
+    for assembly in translated:
+        lines += optimizer.optimize(assembly) if optimizer is not None else assembly
+    for filename, vm_code in vm_sources:
+        if cache is None:
+            lines += translate_vm(filename, vm_code, optimizer, shared_calls, vm_optimizer)
+            continue
+        key: str = cache.key("vm", filename, vm_code, "peephole" if optimizer is not None else "",
+                             "shared calls" if shared_calls else "", "vm optimizer" if vm_optimizer is not None else "")
+        cached: Optional[str] = cache.get(key)
+        if cached is None:
+            cached = "\n".join(translate_vm(filename, vm_code, optimizer, shared_calls, vm_optimizer))
+            cache.put(key, cached)
+        lines += cached.split("\n")
+    assembly: List[str] = strip_instructions(lines)
+    timings["vm"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if cache is None:
+        binaries: List[str] = assemble(assembly)
+    else:
+        key: str = cache.key("asm", "\n".join(assembly))
+        cached: Optional[str] = cache.get(key)
+        if cached is None:
+            binaries: List[str] = assemble(assembly)
+            cache.put(key, "\n".join(binaries))
+        else:
+            binaries: List[str] = cached.split("\n") if cached else []
+    timings["asm"] = time.perf_counter() - start
+    return binaries
+
+
+class AssemblyResult(TypedDict):
+    path: str
+    asm: Optional[List[str]]
+    error: Optional[str]
+    vm_before: int
+    vm_after: int
+
+
+def compile_to_assembly(jack_file: Path, shared_calls: bool = False, optimize_vm: bool = False) -> AssemblyResult:
+    """
+    Compiles one .jack file to assembly, the VM commands go from the compiler to the code writer as tuples.
+    Errors are returned as a diagnostic, see jackanalyzer.compile_file.
+    :param jack_file: Path
+    :param shared_calls: use the shared calling convention
+    :param optimize_vm: run a VMOptimizer on the commands of the class, its counts are returned as vm_before and
+        vm_after since a worker process cannot update the optimizer of the parent
+    :return: AssemblyResult
+    """
+    code_writer: CodeWriter = CodeWriter(shared_calls=shared_calls)
+    code_writer.set_file_name(f"{jack_file.stem}.vm")
+    commands: List[VMCommand] = []
+    try:
+        with open(jack_file) as input_file:
+            if optimize_vm:
+                compile_commands(input_file, commands.append)
+            else:
+                compile_commands(input_file, partial(write_vm_command, code_writer=code_writer))
+    except Exception as exception:
+        return {'path': str(jack_file), 'asm': None, 'error': f"{jack_file}: {exception}", 'vm_before': 0,
+                'vm_after': 0}
+    vm_before: int = 0
+    vm_after: int = 0
+    if optimize_vm:
+        vm_optimizer: VMOptimizer = VMOptimizer()
+        write_commands(vm_optimizer.optimize(commands), code_writer)
+        vm_before, vm_after = vm_optimizer.before, vm_optimizer.after
+    return {'path': str(jack_file), 'asm': code_writer.take_lines(), 'error': None,
+            'vm_before': vm_before, 'vm_after': vm_after}
+
+
+def compile_project_to_assembly(jack_files: List[Path], jobs: Optional[int] = None,
+                                shared_calls: bool = False, optimize_vm: bool = False) -> List[AssemblyResult]:
+    """
+    Runs compile_to_assembly for every class in a worker process, results in the order of jack_files
+    :param jack_files: List[Path]
+    :param jobs: number of worker processes, None for one per core, 1 to compile in this process
+    :param shared_calls: use the shared calling convention
+    :param optimize_vm: run a VMOptimizer on the commands of every class
+    :return: List[AssemblyResult]
+    """
+    compile_one: partial = partial(compile_to_assembly, shared_calls=shared_calls, optimize_vm=optimize_vm)
+    if jobs == 1 or len(jack_files) < 2:
+        return [compile_one(jack_file) for jack_file in jack_files]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(compile_one, jack_files))
+
+
+def translate_vm(filename: str, vm_code: str, optimizer: Optional[PeepholeOptimizer],
+                 shared_calls: bool = False, vm_optimizer: Optional[VMOptimizer] = None) -> List[str]:
+    lines: List[str] = translate_source(filename, io.StringIO(vm_code), shared_calls, vm_optimizer)
+    if optimizer is not None:
+        lines = optimizer.optimize(lines)
+    return lines
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Builds a Jack program into a Hack ROM without intermediate files")
+    argument_parser.add_argument("path", help="a .jack or .vm file or a directory of them")
+    argument_parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="hack")
+    argument_parser.add_argument("--no-os", dest="include_os", action="store_false", help="do not link tools/OS")
+    argument_parser.add_argument("-o", "--output", help="output file, defaults to <name>.<format> inside path")
+    argument_parser.add_argument("--jobs", type=int, default=None,
+                                 help="worker processes for compiling Jack classes, defaults to one per core")
+    argument_parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_PATH), help="incremental build cache")
+    argument_parser.add_argument("--no-cache", dest="use_cache", action="store_false", help="rebuild everything")
+    argument_parser.add_argument("--optimize", action="store_true", help="run the peephole optimizer on the assembly")
+    argument_parser.add_argument("--shared-calls", action="store_true",
+                                 help="jump to one shared $CALL and $RETURN routine instead of inlining calls and returns")
+    argument_parser.add_argument("--optimize-vm", action="store_true",
+                                 help="optimize the VM commands before translating them")
+    arguments = argument_parser.parse_args()
+
+    path: Path = Path(arguments.path)
+    jack_files, vm_files = collect_sources(path, arguments.include_os)
+    if not jack_files and not vm_files:
+        print("no .jack or .vm files found")
+        return
+
+    timings: Dict[str, float] = {}
+    cache: Optional[BuildCache] = BuildCache(Path(arguments.cache_dir)) if arguments.use_cache else None
+    optimizer: Optional[PeepholeOptimizer] = PeepholeOptimizer() if arguments.optimize else None
+    vm_optimizer: Optional[VMOptimizer] = VMOptimizer() if arguments.optimize_vm else None
+    binaries: List[str] = build(jack_files, vm_files, timings, arguments.jobs, cache, optimizer,
+                                arguments.shared_calls, vm_optimizer)
+
+    start: float = time.perf_counter()
+    suffix, formatter = OUTPUT_FORMATS[arguments.output_format]
+    output_path: Path = Path(arguments.output) if arguments.output else \
+        (path / path.name if path.is_dir() else path).with_suffix(suffix)
+    contents = formatter(binaries)
+    if isinstance(contents, str):
+        output_path.write_text(contents)
+    else:
+        output_path.write_bytes(contents)
+    timings["write"] = time.perf_counter() - start
+
+    print(f"wrote {len(binaries)} instructions to {output_path}")
+    for stage, seconds in timings.items():
+        print(f"{stage:>6}: {seconds * 1000:8.1f} ms")
+    print(f" total: {sum(timings.values()) * 1000:8.1f} ms")
+    if cache is not None:
+        print(f"cache: {cache.hits} hits, {cache.misses} misses")
+    if optimizer is not None:
+        print(f"peephole optimizer removed {optimizer.removed} instructions from the files translated in this run")
+    if vm_optimizer is not None:
+        print(f"VM optimizer reduced {vm_optimizer.before} VM commands to {vm_optimizer.after} "
+              f"in the files translated in this run")
+
+
+if __name__ == "__main__":
+    main()
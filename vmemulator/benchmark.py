@@ -0,0 +1,163 @@
+import io
+import random
+import time
+
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from cpuemulator.blockjit import BlockJIT
+from hackassembler.assembler import assemble, strip_instructions, to_words
+from jackanalyzer.jackanalyzer import compile_class
+from vmemulator.nativeos import BUILTINS
+from vmemulator.vmemulator import STACK_BASE, SP, TEMP_BASE, TEMP_SIZE, VMEmulator
+from vmtranslator.main import translate_sources
+
+FIBONACCI_PATH: Path = Path(__file__).resolve().parent.parent / "projects" / "08" / "FunctionCalls" / "FibonacciElement"
+OS_PATH: Path = Path(__file__).resolve().parent.parent / "tools" / "OS"
+HEAP_BASE: int = 2048
+
+# OS classes that need no keyboard or output, initialized in the order of Sys.init
+INIT_FUNCTIONS: List[str] = ["Memory.init", "Math.init", "Screen.init"]
+
+WORKLOAD: str = """
+class Main {
+    function void main() {
+        var int i, sum;
+        let i = 0;
+        while (i < 40) {
+            let sum = sum + ((i * 37) / 3) + Math.sqrt(i * 300);
+            do Screen.setColor((i & 1) = 0);
+            do Screen.drawRectangle(i, i / 2, 300 + i, 100 + (i / 2));
+            do Screen.drawCircle(256, 128, 20 + (i / 10));
+            let i = i + 1;
+        }
+        do Memory.poke(8000, sum);
+        return;
+    }
+}
+"""
+
+# Random valid arguments for every builtin, invalid ones would end in Sys.error
+ARGUMENTS: Dict[str, Callable[[random.Random], List[int]]] = {
+    "Math.abs": lambda rng: [rng.randint(-32768, 32767)],
+    "Math.min": lambda rng: [rng.randint(-32768, 32767), rng.randint(-32768, 32767)],
+    "Math.max": lambda rng: [rng.randint(-32768, 32767), rng.randint(-32768, 32767)],
+    "Math.multiply": lambda rng: [rng.choice((-32768, -1, 0, 1, 32767, rng.randint(-32768, 32767))),
+                                  rng.choice((-32768, -1, 0, 1, 2, rng.randint(-300, 300), rng.randint(-32768, 32767)))],
+    "Math.divide": lambda rng: [rng.choice((-32768, -1, 0, 32767, rng.randint(-32768, 32767))),
+                                rng.choice((-32768, -1, 1, 16, rng.randint(1, 300), rng.randint(-32768, 32767))) or 1],
+    "Math.sqrt": lambda rng: [rng.randint(0, 32767)],
+    "Screen.clearScreen": lambda rng: [],
+    "Screen.drawPixel": lambda rng: [rng.randint(0, 511), rng.randint(0, 255)],
+    "Screen.drawHorizontal": lambda rng: [rng.randint(-5, 260), rng.randint(-20, 530), rng.randint(-20, 530)],
+    "Screen.drawRectangle": lambda rng: sorted_rectangle(rng),
+    "Sys.wait": lambda rng: [rng.randint(0, 3)],
+}
+
+
+def sources(n: int) -> List[Tuple[str, io.StringIO]]:
+    """
+    Returns Main.vm of FibonacciElement with a Sys.vm that computes fibonacci(n) and halts
+    """
+    sys_vm: str = f"function Sys.init 0\npush constant {n}\ncall Main.fibonacci 1\nlabel WHILE\ngoto WHILE\n"
+    return [("Main.vm", io.StringIO((FIBONACCI_PATH / "Main.vm").read_text())), ("Sys.vm", io.StringIO(sys_vm))]
+
+
+def sorted_rectangle(rng: random.Random) -> List[int]:
+    x1, x2 = sorted((rng.randint(0, 511), rng.randint(0, 511)))
+    y1, y2 = sorted((rng.randint(0, 255), rng.randint(0, 255)))
+    return [x1, y1, x2, y2]
+
+
+def os_emulator(builtins: Iterable[str], main_vm: str) -> VMEmulator:
+    """
+    Returns an emulator of the OS and main_vm with SP at 256 and INIT_FUNCTIONS run
+    """
+    sources: List[Tuple[str, io.StringIO]] = [("Main.vm", io.StringIO(main_vm))]
+    sources += [(vm_file.name, io.StringIO(vm_file.read_text())) for vm_file in sorted(OS_PATH.glob("*.vm"))]
+    emulator: VMEmulator = VMEmulator(sources, builtins)
+    emulator.ram[SP] = STACK_BASE
+    for function in INIT_FUNCTIONS:
+        emulator.call(function, [])
+    return emulator
+
+
+def same_memory(reference: VMEmulator, emulator: VMEmulator) -> bool:
+    """
+    Compares the RAM of two emulators but the temp segment and the stack above SP, which the VM code of a function
+    uses as scratch
+    """
+    sp: int = reference.ram[SP]
+    return (reference.ram[:TEMP_BASE] == emulator.ram[:TEMP_BASE]
+            and reference.ram[TEMP_BASE + TEMP_SIZE:sp] == emulator.ram[TEMP_BASE + TEMP_SIZE:sp]
+            and reference.ram[HEAP_BASE:] == emulator.ram[HEAP_BASE:])
+
+
+def check_builtins(calls: int) -> None:
+    """
+    Calls every builtin and the VM code of its function with the same random arguments and screen color,
+    and raises if a return value or the RAM differs
+    """
+    main_vm: str = "function Main.main 0\npush constant 0\nreturn\n"
+    for name in BUILTINS:
+        rng: random.Random = random.Random(name)
+        reference: VMEmulator = os_emulator((), main_vm)
+        emulator: VMEmulator = os_emulator((name,), main_vm)
+        for _ in range(calls):
+            color: int = rng.choice((0, -1))
+            reference.call("Screen.setColor", [color])
+            emulator.call("Screen.setColor", [color])
+            arguments: List[int] = ARGUMENTS[name](rng)
+            expected: int = reference.call(name, arguments)
+            result: int = emulator.call(name, arguments)
+            if result != expected or not same_memory(reference, emulator):
+                raise Exception(f"builtin differs from the VM code | {name}{tuple(arguments)}: {result}, {expected}")
+    print(f"{len(BUILTINS)} builtins match the VM code of the OS on {calls} random calls each")
+
+
+def measure_builtins() -> None:
+    """
+    Runs WORKLOAD on the VM code of the OS and with every builtin and prints both run times
+    """
+    output: io.StringIO = io.StringIO()
+    compile_class(io.StringIO(WORKLOAD), output)
+    emulators: List[VMEmulator] = []
+    times: List[float] = []
+    for builtins in ((), tuple(BUILTINS)):
+        emulator: VMEmulator = os_emulator(builtins, output.getvalue())
+        start: float = time.perf_counter()
+        emulator.call("Main.main", [], 1_000_000_000)
+        times.append(time.perf_counter() - start)
+        emulators.append(emulator)
+        print(f"workload with {len(builtins):>2} builtins: {times[-1]:.2f} s, {emulator.cycles} commands")
+    if not same_memory(*emulators):
+        raise Exception("workload leaves different RAM with builtins")
+    print(f"builtin speedup: {times[0] / times[1]:.1f}x")
+
+
+def main():
+    n: int = 20
+
+    start: float = time.perf_counter()
+    emulator: VMEmulator = VMEmulator(sources(n))
+    emulator.bootstrap()
+    emulator.run(100_000_000)
+    vm_time: float = time.perf_counter() - start
+    print(f"VM emulator: fibonacci({n}) = {emulator.ram[emulator.ram[0] - 1]} in {vm_time:.2f} s, "
+          f"{emulator.cycles} commands, {emulator.cycles / vm_time:,.0f} commands per second, "
+          f"max call depth {emulator.max_call_depth}")
+
+    start = time.perf_counter()
+    cpu: BlockJIT = BlockJIT(to_words(assemble(strip_instructions(translate_sources(sources(n))))))
+    cpu.run(1_000_000_000)
+    cpu_time: float = time.perf_counter() - start
+    print(f"translate, assemble and block JIT: fibonacci({n}) = {cpu.ram[cpu.ram[0] - 1]} in {cpu_time:.2f} s, "
+          f"{cpu.cycles} instructions")
+    print(f"VM emulator speedup: {cpu_time / vm_time:.1f}x")
+
+    check_builtins(200)
+    measure_builtins()
+
+
+if __name__ == "__main__":
+    main()
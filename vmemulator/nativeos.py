@@ -0,0 +1,221 @@
+from array import array
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Python replacement of an OS function: (RAM, address of every static variable by "Class.index", arguments)
+# -> return value, or None to run the VM code of the function instead, e.g. for the arguments it reports
+# with Sys.error. A builtin leaves RAM as the VM code does, except for the temp segment and the stack above SP,
+# which compiled code only uses as scratch.
+Builtin = Callable[[array, Dict[str, int], array], Optional[int]]
+
+SCREEN_WORDS: int = 8192
+SCREEN_WORDS_PER_ROW: int = 32
+WORD_BITS: int = 16
+
+
+def to_word(value: int) -> int:
+    """
+    Wraps value to a signed 16 bit Hack word
+    :param value: int
+    :return: int in [-32768, 32767]
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+def word_abs(value: int) -> int:
+    """
+    Math.abs on a Hack word, the absolute value of -32768 is -32768
+    """
+    return to_word(-value) if value < 0 else value
+
+
+def math_abs(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    return word_abs(arguments[0])
+
+
+def math_min(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    return min(arguments[0], arguments[1])
+
+
+def math_max(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    return max(arguments[0], arguments[1])
+
+
+def math_multiply(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    # shift and add over the bits of |y| computes |x| * |y| modulo 2 ** 16, the sign is fixed up at the end
+    return to_word(arguments[0] * arguments[1])
+
+
+def divide(ram: array, statics: Dict[str, int], x: int, y: int) -> Optional[int]:
+    """
+    Math.divide step by step, since it leaves y * 2 ** j in the array of Math static 1 for every j it tried.
+    :return: x / y, None for y = 0
+    """
+    if y == 0:
+        return None
+    negative: bool = (x < 0 < y) or (y < 0 < x)
+    powers: int = ram[statics["Math.0"]]
+    multiples: int = ram[statics["Math.1"]]
+    ram[multiples] = word_abs(y)
+    x = word_abs(x)
+    j: int = 0
+    overflow: bool = False
+    while j < 15 and not overflow:
+        multiple: int = ram[multiples + j]
+        overflow = to_word(0x7FFF - to_word(multiple - 1)) < to_word(multiple - 1)
+        if not overflow:
+            ram[multiples + j + 1] = to_word(multiple + multiple)
+            overflow = to_word(ram[multiples + j + 1] - 1) > to_word(x - 1)
+            if not overflow:
+                j += 1
+    result: int = 0
+    while j > -1:
+        if not to_word(ram[multiples + j] - 1) > to_word(x - 1):
+            result = to_word(result + ram[powers + j])
+            x = to_word(x - ram[multiples + j])
+        j -= 1
+    return to_word(-result) if negative else result
+
+
+def math_divide(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    return divide(ram, statics, arguments[0], arguments[1])
+
+
+def math_sqrt(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    x: int = arguments[0]
+    if x < 0:
+        return None
+    powers: int = ram[statics["Math.0"]]
+    y: int = 0
+    for j in range(7, -1, -1):
+        candidate: int = to_word(y + ram[powers + j])
+        square: int = to_word(candidate * candidate)
+        if not square > x and not square < 0:
+            y = candidate
+    return y
+
+
+def update_location(ram: array, statics: Dict[str, int], location: int, mask: int) -> None:
+    """
+    Screen.updateLocation: sets or clears the bits of mask in screen word location in the current color
+    """
+    address: int = to_word(location + ram[statics["Screen.1"]])
+    if ram[statics["Screen.2"]]:
+        ram[address] |= mask
+    else:
+        ram[address] &= ~mask
+
+
+def fill_words(ram: array, statics: Dict[str, int], location: int, count: int) -> None:
+    """
+    Sets count screen words from location on to the current color, like Screen.updateLocation with mask -1
+    """
+    if count > 0:
+        start: int = to_word(location + ram[statics["Screen.1"]])
+        ram[start:start + count] = array("h", [-1 if ram[statics["Screen.2"]] else 0]) * count
+
+
+def span_masks(ram: array, statics: Dict[str, int], left: int, right: int) -> Tuple[int, int, int, int]:
+    """
+    Returns the first and last screen word of the pixels left to right of a row and the masks of their pixels,
+    computed the way Screen.drawRectangle and Screen.drawHorizontal do, including their Math.divide calls
+    :return: (first word, last word, mask of the first word, mask of the last word)
+    """
+    masks: int = ram[statics["Screen.0"]]
+    first: int = divide(ram, statics, left, WORD_BITS)
+    last: int = divide(ram, statics, right, WORD_BITS)
+    left_mask: int = ~to_word(ram[masks + left - first * WORD_BITS] - 1)
+    right_mask: int = to_word(ram[masks + right - last * WORD_BITS + 1] - 1)
+    return first, last, left_mask, right_mask
+
+
+def draw_span(ram: array, statics: Dict[str, int], row: int, span: Tuple[int, int, int, int]) -> None:
+    """
+    Draws the pixels of span_masks in one row in the current color
+    """
+    first, last, left_mask, right_mask = span
+    location: int = row * SCREEN_WORDS_PER_ROW + first
+    if first == last:
+        update_location(ram, statics, location, left_mask & right_mask)
+        return
+    update_location(ram, statics, location, left_mask)
+    fill_words(ram, statics, location + 1, last - first - 1)
+    update_location(ram, statics, location + last - first, right_mask)
+
+
+def screen_clear_screen(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    start: int = ram[statics["Screen.1"]]
+    if numpy is not None:
+        numpy.frombuffer(ram, dtype=numpy.int16)[start:start + SCREEN_WORDS] = 0
+    else:
+        ram[start:start + SCREEN_WORDS] = array("h", bytes(2 * SCREEN_WORDS))
+    return 0
+
+
+def screen_draw_pixel(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    x, y = arguments
+    if x < 0 or x > 511 or y < 0 or y > 255:
+        return None
+    column: int = divide(ram, statics, x, WORD_BITS)
+    update_location(ram, statics, y * SCREEN_WORDS_PER_ROW + column,
+                    ram[ram[statics["Screen.0"]] + x - column * WORD_BITS])
+    return 0
+
+
+def screen_draw_horizontal(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    y: int = arguments[0]
+    left: int = min(arguments[1], arguments[2])
+    right: int = max(arguments[1], arguments[2])
+    if -1 < y < 256 and left < 512 and right > -1:
+        draw_span(ram, statics, y, span_masks(ram, statics, max(left, 0), min(right, 511)))
+    return 0
+
+
+def screen_draw_rectangle(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    x1, y1, x2, y2 = arguments
+    if x1 > x2 or y1 > y2 or x1 < 0 or x2 > 511 or y1 < 0 or y2 > 255:
+        return None
+    span: Tuple[int, int, int, int] = span_masks(ram, statics, x1, x2)
+    if numpy is None:
+        for row in range(y1, y2 + 1):
+            draw_span(ram, statics, row, span)
+        return 0
+
+    first, last, left_mask, right_mask = span
+    start: int = ram[statics["Screen.1"]] + y1 * SCREEN_WORDS_PER_ROW
+    rows = numpy.frombuffer(ram, dtype=numpy.int16)[start:start + (y2 - y1 + 1) * SCREEN_WORDS_PER_ROW]
+    rows = rows.reshape(y2 - y1 + 1, SCREEN_WORDS_PER_ROW)
+    color: bool = ram[statics["Screen.2"]] != 0
+    edges = ((first, left_mask & right_mask),) if first == last else ((first, left_mask), (last, right_mask))
+    for column, mask in edges:
+        if color:
+            rows[:, column] |= numpy.int16(mask)
+        else:
+            rows[:, column] &= numpy.int16(~mask)
+    rows[:, first + 1:last] = -1 if color else 0
+    return 0
+
+
+def sys_wait(ram: array, statics: Dict[str, int], arguments: array) -> Optional[int]:
+    # the delay loop only touches its own local, so skipping it leaves RAM as the VM code would
+    return None if arguments[0] < 0 else 0
+
+
+# Every OS function with a native implementation, see VMEmulator for switching them on one by one
+BUILTINS: Dict[str, Builtin] = {
+    "Math.abs": math_abs,
+    "Math.min": math_min,
+    "Math.max": math_max,
+    "Math.multiply": math_multiply,
+    "Math.divide": math_divide,
+    "Math.sqrt": math_sqrt,
+    "Screen.clearScreen": screen_clear_screen,
+    "Screen.drawPixel": screen_draw_pixel,
+    "Screen.drawHorizontal": screen_draw_horizontal,
+    "Screen.drawRectangle": screen_draw_rectangle,
+    "Sys.wait": sys_wait,
+}
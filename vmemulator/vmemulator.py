@@ -0,0 +1,475 @@
+import argparse
+
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, TextIO, Tuple
+
+from cpuemulator.hackcpu import KBD, RAM_SIZE, SCREEN, SCREEN_WORDS, SCREEN_WORDS_PER_ROW
+from vmemulator.nativeos import BUILTINS, Builtin
+from vmtranslator.commands import CommandNameEnum
+from vmtranslator.main import open_sources
+from vmtranslator.parser import ParsedCommand, iter_commands
+
+# Opcodes of the loaded program. Pushes and pops come first so run can test them with one comparison.
+# Every segment is resolved at load time: PUSH_ADDRESS and POP_ADDRESS take the absolute RAM address of
+# temp, pointer and static, the other segments take the offset from their base pointer.
+(PUSH_CONSTANT, PUSH_LOCAL, PUSH_ARGUMENT, PUSH_THIS, PUSH_THAT, PUSH_ADDRESS,
+ POP_LOCAL, POP_ARGUMENT, POP_THIS, POP_THAT, POP_ADDRESS,
+ ADD, SUB, NEG, EQ, GT, LT, AND, OR, NOT,
+ GOTO, IF_GOTO, CALL, CALL_NATIVE, FUNCTION, RETURN, HALT) = range(27)
+
+PUSH_OPCODES: Dict[str, int] = {
+    "local": PUSH_LOCAL, "argument": PUSH_ARGUMENT, "this": PUSH_THIS, "that": PUSH_THAT,
+    "temp": PUSH_ADDRESS, "pointer": PUSH_ADDRESS, "static": PUSH_ADDRESS, "constant": PUSH_CONSTANT,
+}
+POP_OPCODES: Dict[str, int] = {
+    "local": POP_LOCAL, "argument": POP_ARGUMENT, "this": POP_THIS, "that": POP_THAT,
+    "temp": POP_ADDRESS, "pointer": POP_ADDRESS, "static": POP_ADDRESS,
+}
+ARITHMETIC_OPCODES: Dict[str, int] = {
+    "add": ADD, "sub": SUB, "neg": NEG, "eq": EQ, "gt": GT, "lt": LT, "and": AND, "or": OR, "not": NOT,
+}
+
+SP: int = 0
+LCL: int = 1
+ARG: int = 2
+THIS: int = 3
+THAT: int = 4
+TEMP_BASE: int = 5
+TEMP_SIZE: int = 8
+STATIC_BASE: int = 16
+STATIC_END: int = 256
+STACK_BASE: int = 256
+
+# Largest value push constant takes, and largest program, since return addresses are stored in RAM words
+MAX_WORD: int = 0x7FFF
+
+
+class VMEmulator:
+    """
+    Runs .vm files directly, without translating them to assembly.
+
+    At load time every command becomes an opcode and one integer argument in two parallel lists:
+    labels and functions are resolved to command indexes, segments to base pointers or absolute addresses
+    and static variables are allocated from RAM[16] on like the assembler does. Labels themselves are dropped.
+    The run loop then only indexes lists and a signed 16 bit RAM.
+
+    SP, LCL and ARG are kept in Python variables while run executes and are written back to RAM when it returns;
+    this and that accesses to RAM[0] - RAM[2] see the values from the start of the run.
+    cycles counts the executed commands, call_depth the frames on the stack and max_call_depth its high water mark.
+
+    builtins replace OS functions by the native implementations of nativeos.BUILTINS, e.g. {"Math.multiply"}.
+    A call of one of them takes one cycle and no frame; when the builtin declines its arguments,
+    the VM code of the function runs instead.
+    """
+    ops: List[int]
+    args: List[int]
+    counts: List[int]
+    functions: Dict[str, int]
+    statics: Dict[str, int]
+    natives: Dict[int, Builtin]
+    ram: array
+
+    def __init__(self, sources: Iterable[Tuple[str, TextIO]], builtins: Iterable[str] = ()):
+        self.ops = []
+        self.args = []
+        self.counts = []
+        self.functions = {}
+        self.statics = {}
+        self.natives = {}
+        self.ram = array("h", bytes(2 * RAM_SIZE))
+        self._load(sources, set(builtins))
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Starts over at Sys.init if the program has one, else at its first command, like the VM emulator of the course.
+        Resets the counters, RAM is left untouched.
+        :return: None
+        """
+        self.pc = self.functions.get("Sys.init", 0)
+        self.cycles = 0
+        self.call_depth = 0
+        self.max_call_depth = 0
+        self.halted = False
+
+    def bootstrap(self, function: str = "Sys.init") -> None:
+        """
+        Sets SP to 256 and calls Sys.init like the bootstrap code of the VM translator.
+        A return from the called function halts the emulator.
+        :param function: function to call instead of Sys.init, e.g. Main.main once the OS is initialized
+        :return: None
+        """
+        if function not in self.functions:
+            raise Exception(f"bootstrap needs a {function} function")
+        ram: array = self.ram
+        ram[SP] = STACK_BASE
+        for value in (len(self.ops) - 1, ram[LCL], ram[ARG], ram[THIS], ram[THAT]):
+            ram[ram[SP]] = value
+            ram[SP] += 1
+        ram[ARG] = ram[SP] - 5
+        ram[LCL] = ram[SP]
+        self.pc = self.functions[function]
+        self.call_depth = 1
+        self.max_call_depth = max(self.max_call_depth, 1)
+
+    def run(self, max_cycles: int) -> int:
+        """
+        Executes commands until max_cycles have run, the program ends or it reaches a goto to its own label.
+        :param max_cycles: cycle budget for this call
+        :return: number of cycles executed
+        """
+        ram: array = self.ram
+        ops: List[int] = self.ops
+        args: List[int] = self.args
+        counts: List[int] = self.counts
+        natives: Dict[int, Builtin] = self.natives
+        statics: Dict[str, int] = self.statics
+
+        sp: int = ram[SP]
+        lcl: int = ram[LCL]
+        arg: int = ram[ARG]
+        pc: int = self.pc
+        depth: int = self.call_depth
+        max_depth: int = self.max_call_depth
+        cycles: int = 0
+        try:
+            while cycles < max_cycles:
+                op: int = ops[pc]
+                if op <= PUSH_ADDRESS:
+                    if op == PUSH_CONSTANT:
+                        ram[sp] = args[pc]
+                    elif op == PUSH_LOCAL:
+                        ram[sp] = ram[lcl + args[pc]]
+                    elif op == PUSH_ARGUMENT:
+                        ram[sp] = ram[arg + args[pc]]
+                    elif op == PUSH_ADDRESS:
+                        ram[sp] = ram[args[pc]]
+                    else:
+                        # this and that point wherever pop pointer put them, and a negative index would wrap around
+                        address: int = ram[THIS if op == PUSH_THIS else THAT] + args[pc]
+                        if address < 0:
+                            raise Exception(f"negative RAM address | {address} in {self.function_at(pc)}")
+                        ram[sp] = ram[address]
+                    sp += 1
+                elif op <= POP_ADDRESS:
+                    sp -= 1
+                    if op == POP_LOCAL:
+                        ram[lcl + args[pc]] = ram[sp]
+                    elif op == POP_ARGUMENT:
+                        ram[arg + args[pc]] = ram[sp]
+                    elif op == POP_ADDRESS:
+                        ram[args[pc]] = ram[sp]
+                    else:
+                        address: int = ram[THIS if op == POP_THIS else THAT] + args[pc]
+                        if address < 0:
+                            raise Exception(f"negative RAM address | {address} in {self.function_at(pc)}")
+                        ram[address] = ram[sp]
+                elif op <= NOT:
+                    if op == NEG:
+                        value: int = ram[sp - 1]
+                        ram[sp - 1] = value if value == -0x8000 else -value
+                    elif op == NOT:
+                        ram[sp - 1] = ~ram[sp - 1]
+                    else:
+                        sp -= 1
+                        left: int = ram[sp - 1]
+                        right: int = ram[sp]
+                        if op == ADD:
+                            value: int = left + right
+                            if value > MAX_WORD:
+                                value -= 0x10000
+                            elif value < -0x8000:
+                                value += 0x10000
+                            ram[sp - 1] = value
+                        elif op == SUB:
+                            value: int = left - right
+                            if value > MAX_WORD:
+                                value -= 0x10000
+                            elif value < -0x8000:
+                                value += 0x10000
+                            ram[sp - 1] = value
+                        elif op == EQ:
+                            ram[sp - 1] = -1 if left == right else 0
+                        elif op == GT:
+                            ram[sp - 1] = -1 if left > right else 0
+                        elif op == LT:
+                            ram[sp - 1] = -1 if left < right else 0
+                        elif op == AND:
+                            ram[sp - 1] = left & right
+                        else:
+                            ram[sp - 1] = left | right
+                elif op == GOTO:
+                    target: int = args[pc]
+                    if target == pc:
+                        self.halted = True
+                        break
+                    pc = target
+                    cycles += 1
+                    continue
+                elif op == IF_GOTO:
+                    sp -= 1
+                    if ram[sp]:
+                        pc = args[pc]
+                        cycles += 1
+                        continue
+                elif op == CALL or op == CALL_NATIVE:
+                    if op == CALL_NATIVE:
+                        result: Optional[int] = natives[args[pc]](ram, statics, ram[sp - counts[pc]:sp])
+                        if result is not None:
+                            sp -= counts[pc]
+                            ram[sp] = result
+                            sp += 1
+                            pc += 1
+                            cycles += 1
+                            continue
+                    ram[sp] = pc + 1
+                    ram[sp + 1] = lcl
+                    ram[sp + 2] = arg
+                    ram[sp + 3] = ram[THIS]
+                    ram[sp + 4] = ram[THAT]
+                    sp += 5
+                    arg = sp - 5 - counts[pc]
+                    lcl = sp
+                    depth += 1
+                    if depth > max_depth:
+                        max_depth = depth
+                    pc = args[pc]
+                    cycles += 1
+                    continue
+                elif op == FUNCTION:
+                    for _ in range(args[pc]):
+                        ram[sp] = 0
+                        sp += 1
+                elif op == RETURN:
+                    frame: int = lcl
+                    # read before the return value goes to argument 0, which is the same word without arguments
+                    pc = ram[frame - 5]
+                    ram[arg] = ram[sp - 1]
+                    sp = arg + 1
+                    ram[THAT] = ram[frame - 1]
+                    ram[THIS] = ram[frame - 2]
+                    arg = ram[frame - 3]
+                    lcl = ram[frame - 4]
+                    depth -= 1
+                    cycles += 1
+                    continue
+                else:
+                    self.halted = True
+                    break
+                pc += 1
+                cycles += 1
+        except IndexError:
+            raise Exception(f"RAM access out of range | command {pc} in {self.function_at(pc)}, SP {sp}")
+        finally:
+            ram[SP] = sp
+            ram[LCL] = lcl
+            ram[ARG] = arg
+            self.pc = pc
+            self.call_depth = depth
+            self.max_call_depth = max_depth
+            self.cycles += cycles
+        return cycles
+
+    def call(self, function: str, arguments: Sequence[int], max_cycles: int = 10_000_000) -> int:
+        """
+        Calls a function from outside the program on the current stack and runs until it returns,
+        e.g. to compare a builtin with the VM code of its function.
+        :param function: function name, its builtin is used if it is switched on
+        :param arguments: argument values
+        :param max_cycles: cycle budget, the function has to return within it
+        :return: return value
+        """
+        index: int = self.functions[function]
+        ram: array = self.ram
+        if index in self.natives:
+            result: Optional[int] = self.natives[index](ram, self.statics, array("h", arguments))
+            if result is not None:
+                return result
+        for value in (*arguments, len(self.ops) - 1, ram[LCL], ram[ARG], ram[THIS], ram[THAT]):
+            ram[ram[SP]] = value
+            ram[SP] += 1
+        ram[ARG] = ram[SP] - 5 - len(arguments)
+        ram[LCL] = ram[SP]
+        self.pc = index
+        self.halted = False
+        self.call_depth += 1
+        self.run(max_cycles)
+        if not self.halted:
+            raise Exception(f"{function} did not return within {max_cycles} cycles | in {self.function_at(self.pc)}")
+        self.halted = False
+        ram[SP] -= 1
+        return ram[ram[SP]]
+
+    def function_at(self, pc: int) -> str:
+        """
+        Returns the name of the function the command at pc belongs to
+        :param pc: command index
+        :return: function name, "" for commands before the first function
+        """
+        name: str = ""
+        start: int = -1
+        for function, index in self.functions.items():
+            if start < index <= pc:
+                name, start = function, index
+        return name
+
+    def set_key(self, key_code: int) -> None:
+        """
+        Simulates holding down a key; 0 means no key is pressed.
+        :param key_code: Hack character set code
+        :return: None
+        """
+        self.ram[KBD] = key_code
+
+    def screen(self) -> memoryview:
+        """
+        Returns the 8K word screen memory map without copying it.
+        :return: memoryview over RAM[SCREEN:KBD] of signed words
+        """
+        return memoryview(self.ram)[SCREEN:SCREEN + SCREEN_WORDS]
+
+    def screen_rows(self) -> List[str]:
+        """
+        Renders the headless screen as 256 rows of 512 characters, '#' for a black pixel.
+        :return: List[str]
+        """
+        rows: List[str] = []
+        screen: memoryview = self.screen()
+        for row in range(SCREEN_WORDS // SCREEN_WORDS_PER_ROW):
+            words = screen[row * SCREEN_WORDS_PER_ROW:(row + 1) * SCREEN_WORDS_PER_ROW]
+            # pixel 0 of each word is its least significant bit
+            rows.append("".join(format(word & 0xFFFF, "016b")[::-1] for word in words)
+                        .replace("0", " ").replace("1", "#"))
+        return rows
+
+    def _load(self, sources: Iterable[Tuple[str, TextIO]], builtins: Set[str]) -> None:
+        """
+        Parses every source, then resolves labels, calls and segments into ops, args and counts
+        """
+        # (file name, enclosing function, command) of every command but labels
+        program: List[Tuple[str, str, ParsedCommand]] = []
+        labels: Dict[Tuple[str, str, str], int] = {}
+        for filename, input_file in sources:
+            file_name: str = Path(filename).stem
+            function_name: str = ""
+            for command in iter_commands(input_file):
+                if command.command_type is CommandNameEnum.C_FUNCTION:
+                    if command.arg1 in self.functions:
+                        raise Exception(f"function defined twice | {command.arg1}")
+                    function_name = command.arg1
+                    self.functions[function_name] = len(program)
+                if command.command_type is CommandNameEnum.C_LABEL:
+                    labels[(file_name, function_name, command.arg1)] = len(program)
+                else:
+                    program.append((file_name, function_name, command))
+        if len(program) >= MAX_WORD:
+            raise Exception(f"program does not fit into return addresses | {len(program)} commands")
+        for name in builtins:
+            if name not in BUILTINS:
+                raise Exception(f"no builtin for | {name}")
+            if name in self.functions:
+                self.natives[self.functions[name]] = BUILTINS[name]
+
+        statics: Dict[str, int] = self.statics
+        for file_name, function_name, (command_type, arg1, arg2) in program:
+            count: int = 0
+            match command_type:
+                case CommandNameEnum.C_PUSH | CommandNameEnum.C_POP:
+                    opcodes: Dict[str, int] = PUSH_OPCODES if command_type is CommandNameEnum.C_PUSH else POP_OPCODES
+                    if arg1 not in opcodes:
+                        raise Exception(f"invalid segment | {command_type.name} {arg1}")
+                    op: int = opcodes[arg1]
+                    argument: int = self._resolve_segment(arg1, arg2, f"{file_name}.{arg2}", statics)
+                case CommandNameEnum.C_ARITHMETIC:
+                    op: int = ARITHMETIC_OPCODES[arg1]
+                    argument: int = 0
+                case CommandNameEnum.C_GOTO | CommandNameEnum.C_IF:
+                    target: Optional[int] = labels.get((file_name, function_name, arg1))
+                    if target is None:
+                        raise Exception(f"unknown label | {arg1} in {function_name or file_name}")
+                    op: int = GOTO if command_type is CommandNameEnum.C_GOTO else IF_GOTO
+                    argument: int = target
+                case CommandNameEnum.C_CALL:
+                    if arg1 not in self.functions:
+                        raise Exception(f"unknown function | {arg1}")
+                    argument: int = self.functions[arg1]
+                    op: int = CALL_NATIVE if argument in self.natives else CALL
+                    count = arg2
+                case CommandNameEnum.C_FUNCTION:
+                    op: int = FUNCTION
+                    argument: int = arg2
+                case _:
+                    op: int = RETURN
+                    argument: int = 0
+            self.ops.append(op)
+            self.args.append(argument)
+            self.counts.append(count)
+        # falling off the end of the program halts, as does a return from the bootstrap call
+        self.ops.append(HALT)
+        self.args.append(0)
+        self.counts.append(0)
+
+    @staticmethod
+    def _resolve_segment(segment: str, index: int, static_name: str, statics: Dict[str, int]) -> int:
+        """
+        Returns the argument of a push or pop: the constant, the offset from the base pointer
+        or the absolute address of temp, pointer and static
+        """
+        match segment:
+            case "constant":
+                if not 0 <= index <= MAX_WORD:
+                    raise Exception(f"constant out of range | {index}")
+                return index
+            case "temp":
+                if not 0 <= index < TEMP_SIZE:
+                    raise Exception(f"temp index out of range | {index}")
+                return TEMP_BASE + index
+            case "pointer":
+                if index not in (0, 1):
+                    raise Exception(f"pointer index out of range | {index}")
+                return THIS + index
+            case "static":
+                if static_name not in statics:
+                    if STATIC_BASE + len(statics) >= STATIC_END:
+                        raise Exception(f"too many static variables | {static_name}")
+                    statics[static_name] = STATIC_BASE + len(statics)
+                return statics[static_name]
+            case _:
+                return index
+
+
+def vm_files(path: Path) -> List[Path]:
+    """
+    Returns the .vm files of a program
+    :param path: a .vm file or a directory of them
+    :return: List[Path]
+    """
+    return sorted(path.glob("*.vm")) if path.is_dir() else [path]
+
+
+def vm_emulator():
+    argument_parser = argparse.ArgumentParser(description="Runs VM code headless without translating it")
+    argument_parser.add_argument("path", help="a .vm file or a directory of .vm files")
+    argument_parser.add_argument("--cycles", type=int, default=10_000_000, help="cycle budget in VM commands")
+    argument_parser.add_argument("--ram", type=int, default=16, help="number of RAM words to print after the run")
+    argument_parser.add_argument("--no-bootstrap", dest="bootstrap", action="store_false",
+                                 help="start at Sys.init with the RAM as it is instead of calling it with SP = 256")
+    argument_parser.add_argument("--builtins", nargs="*", choices=sorted(BUILTINS), default=None,
+                                 help="replace these OS functions by native code, all of them if none are given")
+    arguments = argument_parser.parse_args()
+    builtins: List[str] = [] if arguments.builtins is None else arguments.builtins or list(BUILTINS)
+
+    emulator: VMEmulator = VMEmulator(open_sources(vm_files(Path(arguments.path))), builtins)
+    if arguments.bootstrap and "Sys.init" in emulator.functions:
+        emulator.bootstrap()
+    emulator.run(arguments.cycles)
+
+    print(f"cycles: {emulator.cycles} halted: {emulator.halted} in: {emulator.function_at(emulator.pc)} "
+          f"max call depth: {emulator.max_call_depth}")
+    for address in range(arguments.ram):
+        print(f"RAM[{address}] = {emulator.ram[address]}")
+
+
+if __name__ == "__main__":
+    vm_emulator()
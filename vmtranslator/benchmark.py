@@ -0,0 +1,81 @@
+import io
+import time
+
+from pathlib import Path
+from typing import Callable, List, Tuple, Union
+
+from vmtranslator.parser import LegacyParser, iter_commands
+
+OS_PATH: Path = Path(__file__).resolve().parent.parent / "tools" / "OS"
+
+# (command type, arg1, arg2) with None for the arguments a command does not have
+ParsedTuple = Tuple[str, Union[str, None], Union[int, None]]
+
+
+def parse_legacy(source: str) -> List[ParsedTuple]:
+    """
+    Walks every command of source with the LegacyParser API the code writer used
+    :param source: contents of a .vm file
+    :return: List[ParsedTuple]
+    """
+    commands: List[ParsedTuple] = []
+    parser = LegacyParser(io.StringIO(source))
+    parser.advance()
+    while parser.has_more_commands():
+        command_type: str = parser.command_type()
+        arg1 = parser.arg1() if command_type != "C_RETURN" else None
+        arg2 = parser.arg2() if command_type in ("C_PUSH", "C_POP", "C_FUNCTION", "C_CALL") else None
+        commands.append((command_type, arg1, arg2))
+        parser.advance()
+    return commands
+
+
+def parse(source: str) -> List[ParsedTuple]:
+    """
+    Collects the commands of iter_commands in the form of parse_legacy
+    :param source: contents of a .vm file
+    :return: List[ParsedTuple]
+    """
+    return [(command_type, arg1 if command_type != "C_RETURN" else None,
+             arg2 if command_type in ("C_PUSH", "C_POP", "C_FUNCTION", "C_CALL") else None)
+            for command_type, arg1, arg2 in iter_commands(io.StringIO(source))]
+
+
+def measure(name: str, parse_function: Callable[[str], List[ParsedTuple]], sources: List[str], rounds: int) -> float:
+    """
+    Parses every source rounds times and prints the lines per second.
+    :return: lines per second
+    """
+    lines: int = sum(source.count("\n") for source in sources) * rounds
+    start: float = time.perf_counter()
+    for _ in range(rounds):
+        for source in sources:
+            parse_function(source)
+    run_time: float = time.perf_counter() - start
+    speed: float = lines / run_time
+    print(f"{name}: {lines} lines in {run_time:.2f} s: {speed:,.0f} lines per second")
+    return speed
+
+
+def main():
+    sources: List[str] = [vm_file.read_text() for vm_file in sorted(OS_PATH.glob("*.vm"))]
+    for source in sources:
+        if parse_legacy(source) != parse(source):
+            raise Exception("Parsers disagree")
+    print(f"{len(sources)} OS files parse identically")
+
+    legacy_speed: float = measure("LegacyParser", parse_legacy, sources, 20)
+    parser_speed: float = measure("iter_commands", parse, sources, 20)
+    print(f"iter_commands speedup: {parser_speed / legacy_speed:.1f}x")
+
+    comments: str = "// comment\n" * 100_000 + "push constant 1\n"
+    try:
+        parse_legacy(comments)
+        print("LegacyParser: parsed 100000 comment lines")
+    except RecursionError:
+        print("LegacyParser: RecursionError on 100000 comment lines")
+    print(f"iter_commands: parsed 100000 comment lines into {len(parse(comments))} command")
+
+
+if __name__ == "__main__":
+    main()
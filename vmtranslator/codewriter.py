@@ -1,16 +1,39 @@
-from typing import TextIO
+from pathlib import Path
+from typing import TextIO, List, Optional
 
-from commands import CommandNameEnum
+from vmtranslator.commands import CommandNameEnum
+
+# Number of characters of translated assembly held in memory before it is written to the output file
+DEFAULT_FLUSH_THRESHOLD: int = 1 << 20
+
+# Entry points of the routines shared by every call and return in the shared calling convention
+CALL_ROUTINE: str = "$CALL"
+RETURN_ROUTINE: str = "$RETURN"
 
 
 class CodeWriter:
-    output_file: TextIO
+    output_file: Optional[TextIO]
 
-    def __init__(self, output_file: TextIO):
+    def __init__(self, output_file: Optional[TextIO] = None, flush_threshold: int = DEFAULT_FLUSH_THRESHOLD,
+                 shared_calls: bool = False):
+        """
+        Without an output file the translated lines are only kept in memory and collected with take_lines.
+        With shared_calls every call and return jumps to a routine that write_shared_routines emits once per program,
+        which makes the code much smaller for a few more cycles per call, see write_call.
+        :param output_file: TextIO or None
+        :param flush_threshold: buffered characters that trigger a write to output_file
+        :param shared_calls: use the shared $CALL and $RETURN routines instead of inlining them
+        """
         self.output_file = output_file
+        self.flush_threshold = flush_threshold
+        self.shared_calls = shared_calls
+        self.uses_shared_routines = False
         self.label_number = 0
-        self.filename = self.output_file.name
-        self.assembly_command = ""
+        self.filename = Path(output_file.name).stem if output_file is not None else ""
+        self.function_name = ""
+        self.assembly_command: List[str] = []
+        self._buffer: List[str] = []
+        self._buffered_size = 0
 
     def write_arithmetic(self, command: str) -> None:
         """
@@ -21,7 +44,7 @@ class CodeWriter:
         self._add_to_write(f'// {command}')
         match command:
             case "add":
-                self._arith_multi_param("M+D")
+                self._arith_multi_param("D+M")
             case "sub":
                 self._arith_multi_param("M-D")
             case "neg":
@@ -118,7 +141,7 @@ class CodeWriter:
                                 assembly_pointer: str = "THAT"
                             case _:
                                 raise Exception
-                        self._add_to_write(f"@{assembly_pointer}.{index}")
+                        self._add_to_write(f"@{assembly_pointer}")
                         self._add_to_write("D=M")
                         self._write_to_stack_and_increment_stack_pointer()
                     case "temp":
@@ -137,18 +160,42 @@ class CodeWriter:
 
     def close(self) -> None:
         """
-        CLoses the output file.
+        Flushes the buffered assembly and closes the output file.
         :return:
         """
-        self.output_file.close()
+        self.flush()
+        if self.output_file is not None:
+            self.output_file.close()
+
+    def flush(self) -> None:
+        """
+        Writes all buffered assembly to the output file in a single call.
+        :return: None
+        """
+        if self.output_file is not None and self._buffer:
+            self.output_file.write("\n".join(self._buffer) + "\n")
+            self._buffer = []
+            self._buffered_size = 0
+
+    def take_lines(self) -> List[str]:
+        """
+        Returns the assembly lines translated since the last call and removes them from the buffer.
+        Used when the code writer has no output file and its output is streamed instead.
+        :return: List[str]
+        """
+        lines: List[str] = self._buffer
+        self._buffer = []
+        self._buffered_size = 0
+        return lines
 
     def set_file_name(self, filename: str) -> None:
         """
         Informs the codewriter that the parsing of a new file has started
-        :param filename: str
+        :param filename: path or name of the .vm file, static variables and labels are named after its stem
         :return: None
         """
-        self.filename = filename
+        self.filename = Path(filename).stem
+        self.label_number = 0
 
     def write_init(self) -> None:
         """
@@ -162,6 +209,42 @@ class CodeWriter:
         self._add_to_write("@SP")
         self._add_to_write("M=D")
         self.write_call("Sys.init", 0)
+        if self.shared_calls:
+            self.write_shared_routines()
+
+    def write_shared_routines(self) -> None:
+        """
+        Writes the $CALL and $RETURN routines of the shared calling convention, once per program.
+        They are guarded by an endless loop, so a program that runs past its last command halts there.
+        $CALL expects the return address in D, the number of arguments in R13 and the address of the function in R14.
+        :return: None
+        """
+        label: str = self._create_label("HALT")
+        self._add_to_write(f"({label})")
+        self._add_to_write(f"@{label}")
+        self._add_to_write("0;JMP")
+        self._add_to_write(f"({CALL_ROUTINE})")
+        self._write_to_stack_and_increment_stack_pointer()
+        self._write_save_frame()
+        # ARG = SP - 5 - nArgs, LCL = SP
+        self._add_to_write("@SP")
+        self._add_to_write("D=M")
+        self._add_to_write("@R13")
+        self._add_to_write("D=D-M")
+        self._add_to_write("@5")
+        self._add_to_write("D=D-A")
+        self._add_to_write("@ARG")
+        self._add_to_write("M=D")
+        self._add_to_write("@SP")
+        self._add_to_write("D=M")
+        self._add_to_write("@LCL")
+        self._add_to_write("M=D")
+        self._add_to_write("@R14")
+        self._add_to_write("A=M")
+        self._add_to_write("0;JMP")
+        self._add_to_write(f"({RETURN_ROUTINE})")
+        self._write_restore_frame()
+        self._write()
 
     def write_label(self, label: str) -> None:
         """
@@ -169,7 +252,7 @@ class CodeWriter:
         :return: None
         """
         self._add_to_write(f'// label {label}')
-        self._add_to_write(f"({label})")
+        self._add_to_write(f"({self._scoped_label(label)})")
         self._write()
 
     def write_goto(self, label: str) -> None:
@@ -178,7 +261,7 @@ class CodeWriter:
         :return:
         """
         self._add_to_write(f'// goto {label}')
-        self._add_to_write(f"@({label})")
+        self._add_to_write(f"@{self._scoped_label(label)}")
         self._add_to_write("0;JMP")
         self._write()
 
@@ -190,26 +273,22 @@ class CodeWriter:
         """
         self._add_to_write(f'// if-goto {label}')
         self._decrement_stack_pointer_and_get_value_in_d_register()
-        self._add_to_write(f"@({label})")
-        self._add_to_write("D;JGT")
+        self._add_to_write(f"@{self._scoped_label(label)}")
+        self._add_to_write("D;JNE")
         self._write()
 
     def write_function(self, function_name: str, num_vars: int) -> None:
         """
         Responsibilities:
         1. Sets up the local segment of the called function
-          > push n_vars zero on to stack and set stack pointer to LCL
+          > push n_vars zero on to stack, LCL was already set to SP by the caller
         :param function_name:
         :param num_vars:
         :return:
         """
+        self.function_name = function_name
         self._add_to_write(f"// function {function_name} {num_vars}")
-        self._add_to_write(f'// function {function_name} {num_vars}')
-        self._add_to_write(f"({self.filename}.{function_name})")
-        self._add_to_write("@SP")
-        self._add_to_write("D=M")
-        self._add_to_write("@LCL")
-        self._add_to_write("M=D")
+        self._add_to_write(f"({function_name})")
         for x in range(num_vars):
             self.write_push_pop(CommandNameEnum.C_PUSH, "constant", 0)
         self._write()
@@ -221,11 +300,16 @@ class CodeWriter:
         2. saves the callers frame
           > (return address | saved LCL | saved ARG | saved THIS | saved THAT)
         3. jump to execute function_name
+        In the shared calling convention only the arguments of $CALL are set up here, a fifth of the code
+        for a few more executed instructions, see vmtranslator.main.calling_convention_costs.
         :param function_name:
         :param num_vars:
         :return:
         """
         self._add_to_write(f"// call {function_name} {num_vars}")
+        if self.shared_calls:
+            self._write_shared_call(function_name, num_vars)
+            return
         #SP is at x, arg should be set at x - nArgs - store in temp
         self._add_to_write("@SP")
         self._add_to_write("D=M")
@@ -234,30 +318,25 @@ class CodeWriter:
         self._add_to_write("@R13")
         self._add_to_write("M=D") #Stores arg pointer in R13 temporarily
         # save return address by writing label and pushing label register onto stack
-        label: str = self._create_label(f"Return_{function_name}")
+        label: str = self._create_label("ret.")
         self._add_to_write(f"@{label}")
         self._add_to_write("D=A")
         self._write_to_stack_and_increment_stack_pointer()
-        # save LCL bump SP
-        self._add_to_write("@LCL")
+        self._write_save_frame()
+        # ARG = SP - nArgs (stored in R13), LCL = SP
+        self._add_to_write("@R13")
         self._add_to_write("D=M")
-        self._write_to_stack_and_increment_stack_pointer()
-        # save ARG bump SP
         self._add_to_write("@ARG")
+        self._add_to_write("M=D")
+        self._add_to_write("@SP")
         self._add_to_write("D=M")
-        self._write_to_stack_and_increment_stack_pointer()
-        # save THIS bump SP
-        self._add_to_write("@THIS")
-        self._add_to_write("D=M")
-        self._write_to_stack_and_increment_stack_pointer()
-        # save THAT bump SP
-        self._add_to_write("@THAT")
-        self._add_to_write("D=M")
-        self._write_to_stack_and_increment_stack_pointer()
+        self._add_to_write("@LCL")
+        self._add_to_write("M=D")
         # jump to execute function name
-        self.write_goto(function_name)
-        # write return value
-        self.write_label(label)
+        self._add_to_write(f"@{function_name}")
+        self._add_to_write("0;JMP")
+        # return address
+        self._add_to_write(f"({label})")
         self._write()
 
     def write_return(self) -> None:
@@ -268,51 +347,81 @@ class CodeWriter:
         3. Clear the stack
         4. Sets SP for the caller (one above arg0)
         5. Jumps to the return address within the code
+        In the shared calling convention this is a jump to $RETURN.
         :return:
         """
         self._add_to_write("// return")
-        self.write_push_pop(CommandNameEnum.C_POP, "argument", 0)
-        # Save address for SP to clear stack
-        self._add_to_write("@ARG")
-        self._add_to_write("D=M")
-        self._add_to_write("@R13")
-        self._add_to_write("M=D+1")
-        # Navigate to saved Frame
+        if self.shared_calls:
+            self.uses_shared_routines = True
+            self._add_to_write(f"@{RETURN_ROUTINE}")
+            self._add_to_write("0;JMP")
+            self._write()
+            return
+        self._write_restore_frame()
+        self._write()
+
+    def _write_shared_call(self, function_name: str, num_vars: int) -> None:
+        # R13 = nArgs, R14 = function, D = return address
+        self.uses_shared_routines = True
+        if num_vars in (0, 1):
+            self._add_to_write("@R13")
+            self._add_to_write(f"M={num_vars}")
+        else:
+            self._add_to_write(f"@{num_vars}")
+            self._add_to_write("D=A")
+            self._add_to_write("@R13")
+            self._add_to_write("M=D")
+        self._add_to_write(f"@{function_name}")
+        self._add_to_write("D=A")
+        self._add_to_write("@R14")
+        self._add_to_write("M=D")
+        label: str = self._create_label("ret.")
+        self._add_to_write(f"@{label}")
+        self._add_to_write("D=A")
+        self._add_to_write(f"@{CALL_ROUTINE}")
+        self._add_to_write("0;JMP")
+        self._add_to_write(f"({label})")
+        self._write()
+
+    def _write_save_frame(self) -> None:
+        # push LCL, ARG, THIS and THAT of the caller
+        for pointer in ("LCL", "ARG", "THIS", "THAT"):
+            self._add_to_write(f"@{pointer}")
+            self._add_to_write("D=M")
+            self._write_to_stack_and_increment_stack_pointer()
+
+    def _write_restore_frame(self) -> None:
+        # Save frame (LCL) in R13 and the return address (frame - 5) in R14
         self._add_to_write("@LCL")
-        self._add_to_write("A=M")
-        # Restore THAT
-        self._add_to_write("A=A-1")
         self._add_to_write("D=M")
-        self._add_to_write("@THAT")
+        self._add_to_write("@R13")
         self._add_to_write("M=D")
-        # Restore THIS
-        self._add_to_write("D=D-1")
-        self._add_to_write("@THIS")
+        self._add_to_write("@5")
+        self._add_to_write("A=D-A")
+        self._add_to_write("D=M")
+        self._add_to_write("@R14")
         self._add_to_write("M=D")
-        # Restore ARG
-        self._add_to_write("D=D-1")
+        # Copy return value to arg 0
+        self._decrement_stack_pointer_and_get_value_in_d_register()
         self._add_to_write("@ARG")
+        self._add_to_write("A=M")
         self._add_to_write("M=D")
-        # Restore LCL
-        self._add_to_write("D=D-1")
-        self._add_to_write("@LCL")
-        self._add_to_write("M=D")
-        # Save return address
-        self._add_to_write("A=D")
-        self._add_to_write("A=A-1")
-        self._add_to_write("D=M") #return address in d register
-        self._add_to_write("@R14")
-        self._add_to_write("M=D")
-        # Set SP
-        self._add_to_write("@R13")
-        self._add_to_write("D=M")
+        # Set SP one above arg 0
+        self._add_to_write("@ARG")
+        self._add_to_write("D=M+1")
         self._add_to_write("@SP")
         self._add_to_write("M=D")
+        # Restore THAT, THIS, ARG, LCL walking down the saved frame
+        for pointer in ("THAT", "THIS", "ARG", "LCL"):
+            self._add_to_write("@R13")
+            self._add_to_write("AM=M-1")
+            self._add_to_write("D=M")
+            self._add_to_write(f"@{pointer}")
+            self._add_to_write("M=D")
         # Jump to return address
         self._add_to_write("@R14")
         self._add_to_write("A=M")
         self._add_to_write("0;JMP")
-        self._write()
 
     def _push_common_pattern(self, assembly_pointer: str, index: int) -> None:
         """
@@ -325,7 +434,7 @@ class CodeWriter:
         self._add_to_write(f"@{assembly_pointer}")
         self._add_to_write(f"D=M")
         self._add_to_write(f"@{index}")
-        self._add_to_write(f"A=A+D")
+        self._add_to_write("A=D+A")
         self._add_to_write("D=M")
         self._write_to_stack_and_increment_stack_pointer()
 
@@ -358,15 +467,35 @@ class CodeWriter:
         self._add_to_write("D=M")
 
     def _add_to_write(self, text: str):
-        self.assembly_command.append(text+"\n")
+        self.assembly_command.append(text)
 
     def _write(self):
-        self.output_file.write(self.assembly_command+"\n")
-        self.assembly_command = ""
+        """
+        Moves the lines of the current command into the output buffer, flushing it once it passes the threshold.
+        """
+        lines: List[str] = self.assembly_command
+        if not lines:
+            return
+        self._buffer.extend(lines)
+        self._buffered_size += sum(map(len, lines)) + len(lines)
+        self.assembly_command = []
+        if self._buffered_size >= self.flush_threshold:
+            self.flush()
 
-    def _create_label(self):
+    def _create_label(self, prefix: str = "LABEL"):
+        """
+        Labels are numbered per file and prefixed with its name, so files can be translated independently
+        """
         self.label_number += 1
-        return f"LABEL{self.label_number}"
+        return f"{self.filename or 'Bootstrap'}${prefix}{self.label_number}"
+
+    def _scoped_label(self, label: str) -> str:
+        """
+        VM labels are local to the function they appear in
+        """
+        if not self.function_name:
+            return label
+        return f"{self.function_name}${label}"
 
     def _decrement_segment_pointer_and_go_to_memory_address_one_below_sp(self):
         self._add_to_write("@SP")
@@ -384,6 +513,7 @@ class CodeWriter:
         end_label: str = self._create_label()
         self._decrement_segment_pointer_and_go_to_memory_address_one_below_sp()
         self._add_to_write("D=M-D")  # do calculation
+        self._add_to_write("M=0")  # false unless the jump is taken
         self._add_to_write(f"@{jump_label}")
         self._add_to_write(f"D;{jump_condition}")
         self._add_to_write(f"@{end_label}")
@@ -392,7 +522,7 @@ class CodeWriter:
         self._add_to_write("@SP")
         self._add_to_write("A=M")
         self._add_to_write("A=A-1")
-        self._add_to_write("M=1")
+        self._add_to_write("M=-1")
         self._add_to_write(f"({end_label})")
 
     def _arith_single_param(self, return_value: str):
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import Tuple
 
 
 class CommandNameEnum(str, Enum):
@@ -16,3 +17,8 @@ class CommandNameEnum(str, Enum):
 class Command:
     type: CommandNameEnum
     content: str
+
+
+# A VM command as (op, arg1, arg2): ("push", "constant", 7), ("label", "LOOP", 0), ("add", "", 0).
+# Arguments a command does not have are "" and 0.
+VMCommand = Tuple[str, str, int]
@@ -1,75 +1,360 @@
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from sys import argv
-from typing import TextIO
+from functools import partial
+from typing import TextIO, Iterator, List, Iterable, Tuple, Optional, Dict
 
-from codewriter import CodeWriter
-from commands import CommandNameEnum
-from parser import Parser
+from vmtranslator.codewriter import CodeWriter, CALL_ROUTINE, RETURN_ROUTINE
+from vmtranslator.commands import CommandNameEnum, VMCommand
+from vmtranslator.parser import ParsedCommand, iter_commands, parse_commands
+from vmtranslator.peephole import PeepholeOptimizer
+from vmtranslator.vmoptimizer import VMOptimizer
 
 
-def main():
-    try:
-        input_path: str = argv[1]
-    except IndexError:
-        print("Please provide an input path as a command line argument.")
+def write_parsed_command(command: ParsedCommand, code_writer: CodeWriter) -> None:
+    """
+    Translates one command of iter_commands with the code writer.
+    :param command: ParsedCommand
+    :param code_writer: CodeWriter
+    :return: None
+    """
+    command_type, arg1, arg2 = command
+    match command_type:
+        case CommandNameEnum.C_ARITHMETIC:
+            code_writer.write_arithmetic(arg1)
+        case CommandNameEnum.C_PUSH | CommandNameEnum.C_POP:
+            code_writer.write_push_pop(command_type, arg1, arg2)
+        case CommandNameEnum.C_RETURN:
+            code_writer.write_return()
+        case CommandNameEnum.C_FUNCTION:
+            code_writer.write_function(arg1, arg2)
+        case CommandNameEnum.C_CALL:
+            code_writer.write_call(arg1, arg2)
+        case CommandNameEnum.C_LABEL:
+            code_writer.write_label(arg1)
+        case CommandNameEnum.C_IF:
+            code_writer.write_if(arg1)
+        case CommandNameEnum.C_GOTO:
+            code_writer.write_goto(arg1)
+        case _:
+            raise Exception(f"unimplemented command type | {command_type}")
+
+
+def write_vm_command(command: VMCommand, code_writer: CodeWriter) -> None:
+    """
+    Translates a VM command given as (op, segment, index) instead of text, e.g. straight from the Jack compiler.
+    Arguments a command does not have are ignored.
+    :param command: e.g. ("push", "constant", 7), ("label", "LOOP", 0) or ("add", "", 0)
+    :param code_writer: CodeWriter
+    :return: None
+    """
+    op, segment, index = command
+    match op:
+        case "push":
+            code_writer.write_push_pop(CommandNameEnum.C_PUSH, segment, index)
+        case "pop":
+            code_writer.write_push_pop(CommandNameEnum.C_POP, segment, index)
+        case "return":
+            code_writer.write_return()
+        case "function":
+            code_writer.write_function(segment, index)
+        case "call":
+            code_writer.write_call(segment, index)
+        case "label":
+            code_writer.write_label(segment)
+        case "if-goto":
+            code_writer.write_if(segment)
+        case "goto":
+            code_writer.write_goto(segment)
+        case _:
+            code_writer.write_arithmetic(op)
+
+
+def write_file(input_file: TextIO, code_writer: CodeWriter) -> None:
+    """
+    Translates every command of an open .vm file.
+    :param input_file: TextIO
+    :param code_writer: CodeWriter
+    :return: None
+    """
+    for command in iter_commands(input_file):
+        write_parsed_command(command, code_writer)
+
+
+def translate(vm_files: List[Path], bootstrap: bool = True, shared_calls: bool = False,
+              vm_optimizer: Optional[VMOptimizer] = None) -> Iterator[str]:
+    """
+    Streams the assembly translation of the given .vm files line by line, without an output file.
+    :param vm_files: .vm files in the order they should be translated
+    :param bootstrap: whether to start with the code that sets SP and calls Sys.init
+    :param shared_calls: use the shared calling convention, see CodeWriter
+    :param vm_optimizer: optimizes the commands of every file before they are translated, None to skip it
+    :return: Iterator[str] of assembly lines
+    """
+    yield from translate_sources(open_sources(vm_files), bootstrap, shared_calls, vm_optimizer)
+
+
+def open_sources(vm_files: Iterable[Path]) -> Iterator[Tuple[str, TextIO]]:
+    """
+    Opens the .vm files one at a time, each stays open until the consumer asks for the next
+    :param vm_files: Iterable[Path]
+    :return: Iterator of (file name, open file)
+    """
+    for vm_file in vm_files:
+        with open(vm_file, "r") as input_file:
+            yield vm_file.name, input_file
+
+
+def translate_sources(sources: Iterable[Tuple[str, TextIO]], bootstrap: bool = True,
+                      shared_calls: bool = False, vm_optimizer: Optional[VMOptimizer] = None) -> Iterator[str]:
+    """
+    Streams the assembly translation of already opened VM sources, e.g. io.StringIO from the Jack compiler.
+    Without bootstrap code the shared calling convention routines are written after the last source, if any call
+    or return needs them.
+    :param sources: (file name, VM source) pairs, the file name determines the names of static variables
+    :param bootstrap: whether to start with the code that sets SP and calls Sys.init
+    :param shared_calls: use the shared calling convention, see CodeWriter
+    :param vm_optimizer: optimizes the commands of every source before they are translated, None to skip it
+    :return: Iterator[str] of assembly lines
+    """
+    code_writer: CodeWriter = CodeWriter(shared_calls=shared_calls)
+    if bootstrap:
+        code_writer.write_init()
+        yield from code_writer.take_lines()
+    for filename, input_file in sources:
+        code_writer.set_file_name(filename)
+        if vm_optimizer is not None:
+            for command in vm_optimizer.optimize(parse_commands(input_file)):
+                write_vm_command(command, code_writer)
+                yield from code_writer.take_lines()
+            continue
+        for command in iter_commands(input_file):
+            write_parsed_command(command, code_writer)
+            yield from code_writer.take_lines()
+    if code_writer.uses_shared_routines and not bootstrap:
+        code_writer.write_shared_routines()
+        yield from code_writer.take_lines()
+
+
+def translate_file(vm_file: Path, shared_calls: bool = False) -> List[str]:
+    """
+    Translates a single .vm file on its own code writer, the unit of work of the parallel directory mode.
+    :param vm_file: Path
+    :param shared_calls: use the shared calling convention, see CodeWriter
+    :return: assembly lines
+    """
+    with open(vm_file, "r") as input_file:
+        return translate_source(vm_file.name, input_file, shared_calls)
+
+
+def translate_optimized_file(vm_file: Path, shared_calls: bool = False) -> Tuple[List[str], int, int]:
+    """
+    translate_file with a VMOptimizer of its own, whose counts are returned since a worker process cannot
+    update the optimizer of the parent.
+    :param vm_file: Path
+    :param shared_calls: use the shared calling convention, see CodeWriter
+    :return: (assembly lines, VM instructions before optimizing, VM instructions after optimizing)
+    """
+    vm_optimizer: VMOptimizer = VMOptimizer()
+    with open(vm_file, "r") as input_file:
+        lines: List[str] = translate_source(vm_file.name, input_file, shared_calls, vm_optimizer)
+    return lines, vm_optimizer.before, vm_optimizer.after
+
+
+def translate_source(filename: str, input_file: TextIO, shared_calls: bool = False,
+                     vm_optimizer: Optional[VMOptimizer] = None) -> List[str]:
+    """
+    Translates one VM source independently of any other: labels and statics are named after filename.
+    :param filename: name of the .vm file
+    :param input_file: TextIO
+    :param shared_calls: use the shared calling convention, the routines themselves come with bootstrap_lines
+    :param vm_optimizer: optimizes the commands before they are translated, None to skip it
+    :return: assembly lines
+    """
+    code_writer: CodeWriter = CodeWriter(shared_calls=shared_calls)
+    code_writer.set_file_name(filename)
+    if vm_optimizer is not None:
+        write_commands(vm_optimizer.optimize(parse_commands(input_file)), code_writer)
+    else:
+        write_file(input_file, code_writer)
+    return code_writer.take_lines()
+
+
+def write_commands(commands: Iterable[VMCommand], code_writer: CodeWriter) -> None:
+    """
+    Translates VMCommand tuples, e.g. the output of a VMOptimizer
+    :param commands: Iterable[VMCommand]
+    :param code_writer: CodeWriter
+    :return: None
+    """
+    for command in commands:
+        write_vm_command(command, code_writer)
+
+
+def bootstrap_lines(shared_calls: bool = False) -> List[str]:
+    """
+    Returns the assembly that sets SP and calls Sys.init, followed by the shared calling convention routines
+    :param shared_calls: use the shared calling convention, see CodeWriter
+    :return: List[str]
+    """
+    code_writer: CodeWriter = CodeWriter(shared_calls=shared_calls)
+    code_writer.write_init()
+    return code_writer.take_lines()
+
+
+def translate_directory(vm_files: List[Path], output_file: TextIO, jobs: Optional[int] = None,
+                        optimizer: Optional[PeepholeOptimizer] = None, shared_calls: bool = False,
+                        vm_optimizer: Optional[VMOptimizer] = None) -> None:
+    """
+    Translates every file in a separate worker process and writes bootstrap code followed by the files
+    in the given order, so the output does not depend on which worker finishes first.
+    :param vm_files: List[Path]
+    :param output_file: TextIO
+    :param jobs: number of worker processes, None for one per core, 1 to translate in this process
+    :param optimizer: peephole pass applied to every translated file, None to write CodeWriter output as is
+    :param shared_calls: use the shared calling convention, see CodeWriter
+    :param vm_optimizer: collects the counts of the VM optimizer every worker runs, None to skip it
+    :return: None
+    """
+    output_file.write("\n".join(bootstrap_lines(shared_calls)) + "\n")
+    if vm_optimizer is not None:
+        translate_one: partial = partial(translate_optimized_file, shared_calls=shared_calls)
+    else:
+        translate_one: partial = partial(translate_file, shared_calls=shared_calls)
+
+    if jobs == 1:
+        translations: Iterable = map(translate_one, vm_files)
+        write_translations(count_optimized(translations, vm_optimizer), output_file, optimizer)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        translations: Iterable = executor.map(translate_one, vm_files)
+        write_translations(count_optimized(translations, vm_optimizer), output_file, optimizer)
+
+
+def count_optimized(translations: Iterable, vm_optimizer: Optional[VMOptimizer]) -> Iterator[List[str]]:
+    """
+    Adds the counts returned by translate_optimized_file to vm_optimizer and passes the lines on
+    :param translations: lines of translate_file, or the results of translate_optimized_file
+    :param vm_optimizer: None if translations are plain lines
+    :return: Iterator[List[str]]
+    """
+    if vm_optimizer is None:
+        yield from translations
         return
+    for lines, before, after in translations:
+        vm_optimizer.before += before
+        vm_optimizer.after += after
+        yield lines
+
+
+def write_translations(translations: Iterable[List[str]], output_file: TextIO,
+                       optimizer: Optional[PeepholeOptimizer]) -> None:
+    for lines in translations:
+        if optimizer is not None:
+            lines = optimizer.optimize(lines)
+        output_file.write("\n".join(lines) + "\n")
 
-    path: Path = Path(input_path)
-    if path.is_file() and path.suffix != ".vm":
-        with open(path, "r") as input_file:
-            output_path: str = input_path.replace(".vm", ".asm")
-            print(f"writing to {output_path}")
-            write_file: TextIO = open(output_path, "w+")
-            code_writer: CodeWriter = CodeWriter(write_file)
-
-            parser: Parser = Parser(input_file)
-            parser.advance()
-
-            while parser.has_more_commands():
-                match parser.command_type():
-                    case CommandNameEnum.C_ARITHMETIC:
-                        code_writer.write_arithmetic(parser.arg1())
-                    case CommandNameEnum.C_PUSH | CommandNameEnum.C_POP:
-                        code_writer.write_push_pop(parser.command_type(), parser.arg1(), parser.arg2())
-                    case _:
-                        raise Exception
-                parser.advance()
-        code_writer.close()
+
+def count_instructions(lines: Iterable[str]) -> int:
+    """
+    Returns the number of Hack instructions in assembly lines, i.e. without labels, comments and blank lines
+    :param lines: Iterable[str]
+    :return: int
+    """
+    count: int = 0
+    for line in lines:
+        instruction: str = line.split("//", 1)[0].strip()
+        if instruction and instruction[0] != "(":
+            count += 1
+    return count
+
+
+def calling_convention_costs() -> Dict[str, int]:
+    """
+    Returns the instructions written per call site and return site in both calling conventions,
+    the size of the shared routines and the instructions executed per call and return.
+    Neither convention branches within a call or return, so every written instruction runs exactly once.
+    :return: Dict[str, int]
+    """
+    costs: Dict[str, int] = {}
+    for convention, shared_calls in (("inlined", False), ("shared", True)):
+        code_writer: CodeWriter = CodeWriter(shared_calls=shared_calls)
+        code_writer.write_call("Main.main", 2)
+        costs[f"{convention} call"] = count_instructions(code_writer.take_lines())
+        code_writer.write_return()
+        costs[f"{convention} return"] = count_instructions(code_writer.take_lines())
+    code_writer = CodeWriter(shared_calls=True)
+    code_writer.write_shared_routines()
+    routines: List[str] = code_writer.take_lines()
+    call_routine: int = routines.index(f"({CALL_ROUTINE})")
+    return_routine: int = routines.index(f"({RETURN_ROUTINE})")
+    costs["$CALL"] = count_instructions(routines[call_routine:return_routine])
+    costs["$RETURN"] = count_instructions(routines[return_routine:])
+    costs["executed call"] = costs["shared call"] + costs["$CALL"] - costs["inlined call"]
+    costs["executed return"] = costs["shared return"] + costs["$RETURN"] - costs["inlined return"]
+    return costs
+
+
+def calling_convention_report(vm_files: List[Path]) -> str:
+    """
+    Translates the program in both calling conventions and describes the size and cycle tradeoff
+    :param vm_files: List[Path]
+    :return: str
+    """
+    inlined: int = count_instructions(translate(vm_files))
+    shared: int = count_instructions(translate(vm_files, shared_calls=True))
+    costs: Dict[str, int] = calling_convention_costs()
+    return (f"shared calling convention: {shared} instructions instead of {inlined} "
+            f"({(shared - inlined) / inlined:+.1%}), "
+            f"{costs['executed call']:+d} cycles per call, {costs['executed return']:+d} cycles per return")
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description="Translates VM code into Hack assembly")
+    argument_parser.add_argument("path", help="a .vm file or a directory of .vm files")
+    argument_parser.add_argument("--jobs", type=int, default=None,
+                                 help="worker processes for directory mode, defaults to one per core")
+    argument_parser.add_argument("--optimize", action="store_true", help="run the peephole optimizer")
+    argument_parser.add_argument("--shared-calls", action="store_true",
+                                 help="jump to one shared $CALL and $RETURN routine instead of inlining calls and returns")
+    argument_parser.add_argument("--optimize-vm", action="store_true",
+                                 help="optimize the VM commands before translating them")
+    arguments = argument_parser.parse_args()
+    optimizer: Optional[PeepholeOptimizer] = PeepholeOptimizer() if arguments.optimize else None
+    vm_optimizer: Optional[VMOptimizer] = VMOptimizer() if arguments.optimize_vm else None
+
+    path: Path = Path(arguments.path)
+    if path.is_file() and path.suffix == ".vm":
+        output_path: Path = path.with_suffix(".asm")
+        print(f"writing to {output_path}")
+        if optimizer is not None or vm_optimizer is not None:
+            with open(output_path, "w+") as output_file:
+                lines: Iterator[str] = translate([path], False, arguments.shared_calls, vm_optimizer)
+                write_translations([list(lines)], output_file, optimizer)
+        else:
+            with open(path, "r") as input_file:
+                code_writer: CodeWriter = CodeWriter(open(output_path, "w+"), shared_calls=arguments.shared_calls)
+                code_writer.set_file_name(path.name)
+                write_file(input_file, code_writer)
+                if code_writer.uses_shared_routines:
+                    code_writer.write_shared_routines()
+            code_writer.close()
     elif path.is_dir():
-        output_path: str = input_path + f"{path.name}/sys.asm"
-        write_file: TextIO = open(output_path, "w+")
-        code_writer: CodeWriter = CodeWriter(write_file)
+        output_path: Path = path / f"{path.name}.asm"
         print(f"writing to {output_path}")
+        vm_files: List[Path] = sorted(path.glob('**/*.vm'))
+        with open(output_path, "w+") as output_file:
+            translate_directory(vm_files, output_file, arguments.jobs, optimizer, arguments.shared_calls,
+                                vm_optimizer)
+        if arguments.shared_calls:
+            print(calling_convention_report(vm_files))
 
-        vm_files = list(path.glob('**/*.vm'))
-        for vm_file in vm_files:
-            with open(vm_file, "r") as input_file:
-                code_writer.set_file_name(input_file.name)
-                parser: Parser = Parser(input_file)
-                parser.advance()
-
-                while parser.has_more_commands():
-                    match parser.command_type():
-                        case CommandNameEnum.C_ARITHMETIC:
-                            code_writer.write_arithmetic(parser.arg1())
-                        case CommandNameEnum.C_PUSH | CommandNameEnum.C_POP:
-                            code_writer.write_push_pop(parser.command_type(), parser.arg1(), parser.arg2())
-                        case CommandNameEnum.C_RETURN:
-                            code_writer.write_return()
-                        case CommandNameEnum.C_FUNCTION:
-                            code_writer.write_function(parser.arg1(), parser.arg2())
-                        case CommandNameEnum.C_CALL:
-                            code_writer.write_call(parser.arg1(), parser.arg2())
-                        case CommandNameEnum.C_LABEL:
-                            code_writer.write_label(parser.arg1())
-                        case CommandNameEnum.C_IF:
-                            code_writer.write_if(parser.arg1())
-                        case CommandNameEnum.C_GOTO:
-                            code_writer.write_goto(parser.arg1())
-                        case _:
-                            raise Exception
-                    parser.advance()
-        code_writer.close()
+    if optimizer is not None:
+        print(f"peephole optimizer removed {optimizer.removed} instructions")
+    if vm_optimizer is not None:
+        print(f"VM optimizer reduced {vm_optimizer.before} VM commands to {vm_optimizer.after}")
 
 
 if __name__ == "__main__":
@@ -1,9 +1,150 @@
-from typing import TextIO, Optional
+from typing import BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Set, TextIO
 
-from commands import CommandNameEnum
+from hackassembler.assembler import mapped_lines
+from vmtranslator.commands import CommandNameEnum, VMCommand
 
+# Command type of every VM keyword
+COMMAND_TYPES: Dict[str, CommandNameEnum] = {
+    "push": CommandNameEnum.C_PUSH,
+    "pop": CommandNameEnum.C_POP,
+    "add": CommandNameEnum.C_ARITHMETIC,
+    "sub": CommandNameEnum.C_ARITHMETIC,
+    "neg": CommandNameEnum.C_ARITHMETIC,
+    "eq": CommandNameEnum.C_ARITHMETIC,
+    "gt": CommandNameEnum.C_ARITHMETIC,
+    "lt": CommandNameEnum.C_ARITHMETIC,
+    "and": CommandNameEnum.C_ARITHMETIC,
+    "or": CommandNameEnum.C_ARITHMETIC,
+    "not": CommandNameEnum.C_ARITHMETIC,
+    "goto": CommandNameEnum.C_GOTO,
+    "if-goto": CommandNameEnum.C_IF,
+    "label": CommandNameEnum.C_LABEL,
+    "call": CommandNameEnum.C_CALL,
+    "function": CommandNameEnum.C_FUNCTION,
+    "return": CommandNameEnum.C_RETURN,
+}
 
-class Parser:
+# Number of arguments every command type takes
+ARGUMENT_COUNTS: Dict[CommandNameEnum, int] = {
+    CommandNameEnum.C_ARITHMETIC: 0,
+    CommandNameEnum.C_RETURN: 0,
+    CommandNameEnum.C_LABEL: 1,
+    CommandNameEnum.C_GOTO: 1,
+    CommandNameEnum.C_IF: 1,
+    CommandNameEnum.C_PUSH: 2,
+    CommandNameEnum.C_POP: 2,
+    CommandNameEnum.C_FUNCTION: 2,
+    CommandNameEnum.C_CALL: 2,
+}
+
+# Command types whose lines repeat within a file and are parsed once, see iter_commands. Labels, jumps and
+# function declarations are mostly unique, and comments are left out too, so the memo stays small however
+# long the file is.
+MEMOIZED_TYPES: Set[CommandNameEnum] = {
+    CommandNameEnum.C_ARITHMETIC,
+    CommandNameEnum.C_PUSH,
+    CommandNameEnum.C_POP,
+    CommandNameEnum.C_CALL,
+    CommandNameEnum.C_RETURN,
+}
+
+# VM keyword of every command type but C_ARITHMETIC, whose keyword is its arg1
+COMMAND_OPS: Dict[CommandNameEnum, str] = {
+    CommandNameEnum.C_PUSH: "push",
+    CommandNameEnum.C_POP: "pop",
+    CommandNameEnum.C_LABEL: "label",
+    CommandNameEnum.C_GOTO: "goto",
+    CommandNameEnum.C_IF: "if-goto",
+    CommandNameEnum.C_FUNCTION: "function",
+    CommandNameEnum.C_CALL: "call",
+    CommandNameEnum.C_RETURN: "return",
+}
+
+
+class ParsedCommand(NamedTuple):
+    """
+    One VM command, split once. arg1 and arg2 follow arg1 and arg2 of LegacyParser: arg1 of C_ARITHMETIC is
+    the command itself. Arguments a command does not have are "" and 0.
+    """
+    command_type: CommandNameEnum
+    arg1: str
+    arg2: int
+
+
+def parse_line(line: str) -> Optional[ParsedCommand]:
+    """
+    Parses one line of a .vm file
+    :param line: str
+    :return: ParsedCommand, None for blank and comment lines
+    """
+    comment: int = line.find("//")
+    words: List[str] = (line if comment == -1 else line[:comment]).split()
+    if not words:
+        return None
+    command_type: Optional[CommandNameEnum] = COMMAND_TYPES.get(words[0])
+    if command_type is None:
+        raise Exception(f"unimplemented command | {words[0]}")
+    if len(words) != ARGUMENT_COUNTS[command_type] + 1:
+        raise Exception(f"wrong number of arguments | {' '.join(words)}")
+    match len(words):
+        case 1:
+            return ParsedCommand(command_type, words[0] if command_type is CommandNameEnum.C_ARITHMETIC else "", 0)
+        case 2:
+            return ParsedCommand(command_type, words[1], 0)
+        case _:
+            return ParsedCommand(command_type, words[1], int(words[2]))
+
+
+def iter_commands(input_file: TextIO) -> Iterator[ParsedCommand]:
+    """
+    Yields the commands of a .vm source. Lines that repeat, like add or push constant 0, are only parsed once:
+    the records are immutable, so every occurrence can share one, see MEMOIZED_TYPES. An open file is read through its binary buffer,
+    see iter_mapped_commands, other sources like io.StringIO are read in one go.
+    :param input_file: TextIO
+    :return: Iterator[ParsedCommand]
+    """
+    buffer: Optional[BinaryIO] = getattr(input_file, "buffer", None)
+    if buffer is not None:
+        yield from iter_mapped_commands(buffer)
+        return
+
+    parsed: Dict[str, ParsedCommand] = {}
+    for line in input_file.read().splitlines():
+        command: Optional[ParsedCommand] = parsed.get(line)
+        if command is None:
+            command = parse_line(line)
+            if command is None:
+                continue
+            if command.command_type in MEMOIZED_TYPES:
+                parsed[line] = command
+        yield command
+
+
+def iter_mapped_commands(input_file: BinaryIO) -> Iterator[ParsedCommand]:
+    """
+    Yields the commands of a binary .vm file without reading it into memory: its lines come from mapped_lines of
+    the assembler, which maps the file one chunk at a time, and the bytes of a repeating line are only decoded
+    and parsed the first time that line occurs.
+    :param input_file: BinaryIO
+    :return: Iterator[ParsedCommand]
+    """
+    parsed: Dict[bytes, ParsedCommand] = {}
+    for line in mapped_lines(input_file):
+        command: Optional[ParsedCommand] = parsed.get(line)
+        if command is None:
+            command = parse_line(line.decode())
+            if command is None:
+                continue
+            if command.command_type in MEMOIZED_TYPES:
+                parsed[line] = command
+        yield command
+
+
+class LegacyParser:
+    """
+    The original line by line parser, which splits the current command again for every call of command_type, arg1
+    and arg2. Only kept to compare against in vmtranslator.benchmark.
+    """
     input_file: TextIO
     _current_command: Optional[str] = None
     _eof: bool = False
@@ -98,3 +239,13 @@ class Parser:
         if "//" in command:
             command = command.split("//")[0]
         return command.strip().strip("\n")
+
+
+def parse_commands(input_file: TextIO) -> List[VMCommand]:
+    """
+    Parses a whole .vm file into VMCommand tuples
+    :param input_file: TextIO
+    :return: List[VMCommand]
+    """
+    return [(COMMAND_OPS.get(command_type, arg1), arg1 if command_type in COMMAND_OPS else "", arg2)
+            for command_type, arg1, arg2 in iter_commands(input_file)]
@@ -0,0 +1,88 @@
+from typing import Iterable, List, Optional
+
+# push D (*SP = D, SP++) directly followed by pop into D (SP--, D = *SP), after the SP++/SP-- pair cancelled out
+PUSH_THEN_POP: List[str] = ["@SP", "A=M", "M=D", "@SP", "A=M", "D=M"]
+
+# Instructions that undo each other when they follow one another with A unchanged
+CANCELLING_PAIRS: List[List[str]] = [["M=M+1", "M=M-1"], ["M=M-1", "M=M+1"]]
+
+# Binary operations of CodeWriter after SP was pointed at the first operand, keyed by the comp that applies D
+CONSTANT_OPERAND_REWRITES = {
+    ("M=D+M", "0"): [],
+    ("M=M-D", "0"): [],
+    ("M=D+M", "1"): ["M=M+1"],
+    ("M=M-D", "1"): ["M=M-1"],
+}
+
+
+class PeepholeOptimizer:
+    """
+    Optimization pass over the assembly generated by CodeWriter.
+
+    Instructions are appended one at a time and the tail of the output is rewritten as soon as it matches:
+    - an @X that loads the value A already holds is dropped
+    - M=M+1 followed by M=M-1 (and the reverse) is dropped
+    - a push of D followed by a pop into D is dropped; D already holds the value and the stack word above SP is dead
+    - a push of D followed by a binary operation points A at the first operand instead
+    - adding or subtracting constant 0 is dropped, constant 1 becomes M=M+1 / M=M-1
+    Comments and blank lines are removed; labels are kept and no rewrite reaches across them.
+    """
+
+    def __init__(self):
+        self.removed = 0
+
+    def optimize(self, lines: Iterable[str]) -> List[str]:
+        """
+        Returns the optimized instructions and adds the number of instructions it saved to removed.
+        :param lines: assembly lines
+        :return: List[str]
+        """
+        output: List[str] = []
+        original: int = 0
+        for line in lines:
+            instruction: str = line.split("//", 1)[0].strip()
+            if not instruction:
+                continue
+            if instruction[0] != "(":
+                original += 1
+            self._append(output, instruction)
+        self.removed += original - sum(1 for instruction in output if instruction[0] != "(")
+        return output
+
+    def _append(self, output: List[str], instruction: str) -> None:
+        if instruction[0] == "@":
+            if self._known_a(output) == instruction:
+                return
+            if output[-len(PUSH_THEN_POP):] == PUSH_THEN_POP:
+                del output[-len(PUSH_THEN_POP):]
+        elif instruction[0] == "(":
+            if output[-len(PUSH_THEN_POP):] == PUSH_THEN_POP:
+                del output[-len(PUSH_THEN_POP):]
+        elif instruction == "A=A-1" and output[-len(PUSH_THEN_POP):] == PUSH_THEN_POP:
+            del output[-len(PUSH_THEN_POP):]
+            output.append("@SP")
+            output.append("A=M-1")
+            return
+        elif output and [output[-1], instruction] in CANCELLING_PAIRS:
+            output.pop()
+            return
+        elif output[-3:] == ["D=A", "@SP", "A=M-1"] and len(output) >= 4 and output[-4][0] == "@":
+            rewrite: Optional[List[str]] = CONSTANT_OPERAND_REWRITES.get((instruction, output[-4][1:]))
+            if rewrite is not None:
+                del output[-4:]
+                if rewrite:
+                    output.extend(["@SP", "A=M-1"] + rewrite)
+                return
+        output.append(instruction)
+
+    @staticmethod
+    def _known_a(output: List[str]) -> Optional[str]:
+        """
+        Returns the A-instruction whose value A still holds at the end of output, if it is known
+        """
+        for instruction in reversed(output):
+            if instruction[0] == "@":
+                return instruction
+            if instruction[0] == "(" or ("=" in instruction and "A" in instruction.split("=", 1)[0]):
+                return None
+        return None
@@ -0,0 +1,250 @@
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from vmtranslator.commands import VMCommand
+
+# Arithmetic commands evaluated at translation time when their operands are constants, with Hack 16 bit results
+BINARY_OPERATIONS: Dict[str, Callable[[int, int], int]] = {
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "and": lambda a, b: a & b,
+    "or": lambda a, b: a | b,
+    "eq": lambda a, b: -1 if a == b else 0,
+    "gt": lambda a, b: -1 if a > b else 0,
+    "lt": lambda a, b: -1 if a < b else 0,
+}
+UNARY_OPERATIONS: Dict[str, Callable[[int], int]] = {
+    "neg": lambda a: -a,
+    "not": lambda a: ~a,
+}
+
+# Binary commands that leave the other operand unchanged when the constant right operand is 0
+ZERO_IDENTITIES: Set[str] = {"add", "sub", "or"}
+
+# Commands after which execution never falls through to the next command
+UNCONDITIONAL_JUMPS: Set[str] = {"goto", "return"}
+
+# Commands that end the condition of a loop, a condition is plain straight line code
+CONTROL_FLOW: Set[str] = {"label", "goto", "if-goto", "return", "function"}
+
+# Commands that push true (-1) or false (0). if-goto jumps on any value but 0 while not; if-goto only jumps on
+# values but -1, so a not before if-goto can only be dropped when the condition is one of these
+COMPARISONS: Set[str] = {"eq", "gt", "lt"}
+
+# Comparisons translated to D=M-D and a jump on the sign of D, which is wrong when the difference overflows 16 bits
+SIGNED_COMPARISONS: Set[str] = {"gt", "lt"}
+
+
+def to_word(value: int) -> int:
+    """
+    Wraps value to a signed 16 bit Hack word
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+def constant_commands(value: int) -> List[VMCommand]:
+    """
+    Returns the shortest commands that push value, push constant only takes 0 to 32767
+    """
+    if value >= 0:
+        return [("push", "constant", value)]
+    if value == -1:
+        return [("push", "constant", 0), ("not", "", 0)]
+    if value == -0x8000:
+        return [("push", "constant", 0x7FFF), ("not", "", 0)]
+    return [("push", "constant", -value), ("neg", "", 0)]
+
+
+def trailing_constant(commands: List[VMCommand], end: int) -> Optional[Tuple[int, int]]:
+    """
+    Returns (value, number of commands) if commands[:end] ends with code that pushes a constant,
+    i.e. push constant n, optionally followed by neg or not
+    """
+    if end >= 1 and commands[end - 1][0] == "push" and commands[end - 1][1] == "constant":
+        return commands[end - 1][2], 1
+    if end >= 2 and commands[end - 1][0] in UNARY_OPERATIONS and commands[end - 2][0] == "push" \
+            and commands[end - 2][1] == "constant":
+        return to_word(UNARY_OPERATIONS[commands[end - 1][0]](commands[end - 2][2])), 2
+    return None
+
+
+def is_negated_comparison(commands: List[VMCommand], index: int) -> bool:
+    """
+    Returns True if commands[index:] starts with not; if-goto and the not negates a comparison
+    """
+    return (index >= 1 and index + 1 < len(commands) and commands[index][0] == "not"
+            and commands[index + 1][0] == "if-goto" and commands[index - 1][0] in COMPARISONS)
+
+
+def split_functions(commands: List[VMCommand]) -> List[List[VMCommand]]:
+    """
+    Splits commands before every function command. Label names are only unique within a function, the compiler
+    repeats WHILE_EXP0 or IF_TRUE0 in every function, so the passes run on one function at a time.
+    """
+    functions: List[List[VMCommand]] = [[]]
+    for command in commands:
+        if command[0] == "function" and functions[-1]:
+            functions.append([])
+        functions[-1].append(command)
+    return functions
+
+
+def count_instructions(commands: List[VMCommand]) -> int:
+    """
+    Returns the number of commands that generate code, i.e. without labels
+    """
+    return sum(1 for command in commands if command[0] != "label")
+
+
+class VMOptimizer:
+    """
+    Optimization passes over the commands of one .vm file, run until none of them changes anything:
+    - loop inversion: the condition of a while loop moves to its end, so an iteration runs
+      if-goto instead of not, if-goto and goto
+    - branch inversion: not; if-goto ELSE drops the not and swaps the then and else blocks
+    Both inversions only apply to conditions ending in a comparison, see COMPARISONS.
+    - constant folding of arithmetic on constants, and of not; not and neg; neg; gt and lt whose difference
+      overflows are left to run time, see SIGNED_COMPARISONS
+    - push x; pop x is dropped
+    - dead code after goto and return, labels no jump refers to, and goto to the next command are dropped
+    The passes run on every function of the file on its own, see split_functions.
+    before and after count the code generating commands of every optimized file.
+    """
+
+    def __init__(self):
+        self.before = 0
+        self.after = 0
+
+    def optimize(self, commands: List[VMCommand]) -> List[VMCommand]:
+        """
+        Returns the optimized commands
+        :param commands: List[VMCommand] of one .vm file
+        :return: List[VMCommand]
+        """
+        self.before += count_instructions(commands)
+        output: List[VMCommand] = []
+        for function in split_functions(commands):
+            previous: Optional[List[VMCommand]] = None
+            while function != previous:
+                previous = function
+                function = self._invert_loops(function)
+                function = self._invert_branches(function)
+                function = self._fold_constants(function)
+                function = self._remove_push_pop(function)
+                function = self._remove_dead_code(function)
+            output += function
+        self.after += count_instructions(output)
+        return output
+
+    @staticmethod
+    def _invert_loops(commands: List[VMCommand]) -> List[VMCommand]:
+        """
+        label A; condition; not; if-goto B; body; goto A; label B
+        becomes
+        goto A; label A.BODY; body; label A; condition; if-goto A.BODY; label B
+        """
+        labels: Dict[str, int] = {command[1]: index for index, command in enumerate(commands) if command[0] == "label"}
+        for start, command in enumerate(commands):
+            if command[0] != "label":
+                continue
+            test: int = start + 1
+            while test + 1 < len(commands) and commands[test][0] not in CONTROL_FLOW and \
+                    not (commands[test][0] == "not" and commands[test + 1][0] == "if-goto"):
+                test += 1
+            if not is_negated_comparison(commands, test):
+                continue
+            end: int = labels.get(commands[test + 1][1], -1)
+            if end <= test + 1 or commands[end - 1] != ("goto", command[1], 0):
+                continue
+            body_label: str = f"{command[1]}.BODY"
+            if body_label in labels:
+                continue
+            return (commands[:start] + [("goto", command[1], 0), ("label", body_label, 0)] + commands[test + 2:end - 1]
+                    + [command] + commands[start + 1:test] + [("if-goto", body_label, 0)] + commands[end:])
+        return commands
+
+    @staticmethod
+    def _invert_branches(commands: List[VMCommand]) -> List[VMCommand]:
+        """
+        not; if-goto E; then; goto X; label E; else; label X
+        becomes
+        if-goto E.THEN; label E; else; goto X; label E.THEN; then; label X
+        and without an else block, not; if-goto E; then; label E becomes if-goto E.THEN; goto E; label E.THEN; then; label E
+        """
+        labels: Dict[str, int] = {command[1]: index for index, command in enumerate(commands) if command[0] == "label"}
+        for test in range(len(commands) - 1):
+            if not is_negated_comparison(commands, test):
+                continue
+            else_label: str = commands[test + 1][1]
+            then_label: str = f"{else_label}.THEN"
+            else_start: int = labels.get(else_label, -1)
+            if else_start <= test + 1 or then_label in labels:
+                continue
+            jump: VMCommand = commands[else_start - 1]
+            end: int = labels.get(jump[1], -1) if jump[0] == "goto" else -1
+            if end > else_start:
+                return (commands[:test] + [("if-goto", then_label, 0)] + commands[else_start:end] + [jump]
+                        + [("label", then_label, 0)] + commands[test + 2:else_start - 1] + commands[end:])
+            return (commands[:test] + [("if-goto", then_label, 0), ("goto", else_label, 0), ("label", then_label, 0)]
+                    + commands[test + 2:])
+        return commands
+
+    @staticmethod
+    def _fold_constants(commands: List[VMCommand]) -> List[VMCommand]:
+        output: List[VMCommand] = []
+        for command in commands:
+            op: str = command[0]
+            if op in BINARY_OPERATIONS:
+                right: Optional[Tuple[int, int]] = trailing_constant(output, len(output))
+                if right is not None:
+                    left: Optional[Tuple[int, int]] = trailing_constant(output, len(output) - right[1])
+                    if left is not None and not (op in SIGNED_COMPARISONS
+                                                 and to_word(left[0] - right[0]) != left[0] - right[0]):
+                        del output[-(left[1] + right[1]):]
+                        output.extend(constant_commands(to_word(BINARY_OPERATIONS[op](left[0], right[0]))))
+                        continue
+                    if right[0] == 0 and op in ZERO_IDENTITIES:
+                        del output[-right[1]:]
+                        continue
+            elif op in UNARY_OPERATIONS:
+                if output and output[-1] == command:
+                    output.pop()
+                    continue
+                operand: Optional[Tuple[int, int]] = trailing_constant(output, len(output))
+                if operand is not None and operand[1] == 2:
+                    del output[-2:]
+                    output.extend(constant_commands(to_word(UNARY_OPERATIONS[op](operand[0]))))
+                    continue
+            output.append(command)
+        return output
+
+    @staticmethod
+    def _remove_push_pop(commands: List[VMCommand]) -> List[VMCommand]:
+        output: List[VMCommand] = []
+        for command in commands:
+            if command[0] == "pop" and output and output[-1] == ("push", command[1], command[2]):
+                output.pop()
+                continue
+            output.append(command)
+        return output
+
+    @staticmethod
+    def _remove_dead_code(commands: List[VMCommand]) -> List[VMCommand]:
+        targets: Set[str] = {command[1] for command in commands if command[0] in ("goto", "if-goto")}
+        output: List[VMCommand] = []
+        reachable: bool = True
+        for command in commands:
+            op: str = command[0]
+            if op == "label":
+                if command[1] not in targets:
+                    continue
+                if output and output[-1] == ("goto", command[1], 0):
+                    output.pop()
+                reachable = True
+            elif op == "function":
+                reachable = True
+            elif not reachable:
+                continue
+            output.append(command)
+            if op in UNCONDITIONAL_JUMPS:
+                reachable = False
+        return output